@@ -42,9 +42,9 @@ from authentication.views import (
 
 # Import additional API views
 from api_views import (
-    dashboard_stats, recent_activity, available_time_slots,
+    dashboard_stats, recent_activity, available_time_slots, free_physiotherapists,
     exercise_analytics, search_global, quick_actions, health_check,
-    pain_analytics, progress_analytics, unread_notification_count
+    pain_analytics, progress_analytics, unread_notification_count, metrics_report
 )
 
 # Create router and register viewsets
@@ -93,6 +93,7 @@ urlpatterns = [
     path('dashboard/stats/', dashboard_stats, name='dashboard_stats'),
     path('dashboard/activity/', recent_activity, name='recent_activity'),
     path('booking/available-slots/', available_time_slots, name='available_time_slots'),
+    path('booking/free-physiotherapists/', free_physiotherapists, name='free_physiotherapists'),
     path('analytics/exercises/', exercise_analytics, name='exercise_analytics'),
     path('analytics/pain/', pain_analytics, name='pain_analytics'),
     path('analytics/progress/', progress_analytics, name='progress_analytics'),
@@ -100,6 +101,7 @@ urlpatterns = [
     path('search/', search_global, name='search_global'),
     path('actions/', quick_actions, name='quick_actions'),
     path('health/', health_check, name='health_check'),
+    path('metrics/', metrics_report, name='metrics'),
     
     # API Documentation (disabled for now)
     # path('docs/', include_docs_urls(title='Healthcare API Documentation')),
@@ -146,11 +148,13 @@ Physiotherapist Profiles:
 - PATCH /api/physiotherapists/{id}/ - Partial update physiotherapist
 - DELETE /api/physiotherapists/{id}/ - Delete physiotherapist profile
 - GET /api/physiotherapists/available/ - Get available physiotherapists
+- GET /api/physiotherapists/earliest_available/ - Earliest free slots across matching physiotherapists
 - POST /api/physiotherapists/{id}/toggle_availability/ - Toggle availability
 
 Appointments:
 - GET /api/appointments/ - List appointments
 - POST /api/appointments/ - Create appointment
+- POST /api/appointments/series/ - Book a weekly or biweekly series of appointments
 - GET /api/appointments/{id}/ - Get appointment details
 - PUT /api/appointments/{id}/ - Update appointment
 - PATCH /api/appointments/{id}/ - Partial update appointment
@@ -160,6 +164,8 @@ Appointments:
 - POST /api/appointments/{id}/cancel/ - Cancel appointment
 - POST /api/appointments/{id}/confirm/ - Confirm appointment
 - POST /api/appointments/{id}/complete/ - Complete appointment
+- GET /api/appointments/statistics/ - Get appointment counts by status and for the current month and week
+- GET /api/appointments/trends/?months=24 - Get monthly appointment counts by status and revenue by payment status
 
 Appointment Feedback:
 - GET /api/appointment-feedback/ - List feedback
@@ -11,13 +11,24 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Count, Avg
 from django.utils import timezone
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
 # Import models
 from authentication.models import User, PatientProfile, PhysiotherapistProfile
 from appointments.models import Appointment, AppointmentFeedback, AppointmentDocument
-from exercises.models import ExerciseCategory, Exercise, ExercisePlan, ExercisePlanItem, ExerciseProgress
+from exercises.models import (
+    ExerciseCategory, Exercise, ExercisePlan, ExercisePlanItem, ExerciseProgress, ExerciseDailyRollup
+)
 from notifications.models import Notification, NotificationPreference
 from chat.models import Conversation, Message, Attachment
+from exercises.streaks import get_current_streak, get_streak
+from exercises import pain
+from appointments import availability, scheduling
+from notifications import state as notification_state
+from core import counters, health, metrics, search
+from core.activity import get_feed
+from core.dashboard import get_dashboard_stats
+from core.pagination import InvalidCursor
 
 # Import serializers
 from authentication.serializers import (
@@ -26,14 +37,14 @@ from authentication.serializers import (
 )
 from appointments.serializers import (
     AppointmentSerializer, AppointmentFeedbackSerializer, AppointmentDocumentSerializer,
-    AppointmentCreateSerializer, AppointmentUpdateSerializer
+    AppointmentCreateSerializer, AppointmentUpdateSerializer, with_schedule
 )
 from exercises.serializers import (
     ExerciseCategorySerializer, ExerciseSerializer, ExercisePlanSerializer,
     ExercisePlanItemSerializer, ExerciseProgressSerializer
 )
 from notifications.serializers import NotificationSerializer, NotificationPreferenceSerializer
-from chat.serializers import ConversationSerializer, MessageSerializer, AttachmentSerializer
+from chat.serializers import ConversationSerializer, MessageSerializer, AttachmentSerializer, listing_queryset
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -107,12 +118,16 @@ class UserViewSet(viewsets.ModelViewSet):
         if not request.user.is_staff:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
+        values = counters.get_counts(
+            'users.total', 'users.patient', 'users.physiotherapist',
+            'users.verified', 'users.active'
+        )
         stats = {
-            'total_users': User.objects.count(),
-            'patients': User.objects.filter(user_type='patient').count(),
-            'physiotherapists': User.objects.filter(user_type='physiotherapist').count(),
-            'verified_users': User.objects.filter(is_verified=True).count(),
-            'active_users': User.objects.filter(is_active=True).count(),
+            'total_users': values['users.total'],
+            'patients': values['users.patient'],
+            'physiotherapists': values['users.physiotherapist'],
+            'verified_users': values['users.verified'],
+            'active_users': values['users.active'],
         }
         return Response(stats)
 
@@ -203,12 +218,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter appointments based on user role"""
         user = self.request.user
+        # Users and feedback in the same query, schedule flags computed in SQL
+        appointments = with_schedule(
+            Appointment.objects.select_related('patient', 'physiotherapist', 'feedback')
+        )
         if user.is_staff:
-            return Appointment.objects.all()
+            return appointments
         elif user.user_type == 'patient':
-            return Appointment.objects.filter(patient=user)
+            return appointments.filter(patient=user)
         elif user.user_type == 'physiotherapist':
-            return Appointment.objects.filter(physiotherapist=user)
+            return appointments.filter(physiotherapist=user)
         return Appointment.objects.none()
     
     def perform_create(self, serializer):
@@ -539,15 +558,14 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read"""
-        self.get_queryset().filter(is_read=False).update(is_read=True)
+        notification_state.mark_all_read(request.user)
         return Response({'message': 'All notifications marked as read'})
     
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark specific notification as read"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        notification_state.mark_read(notification)
         return Response({'message': 'Notification marked as read'})
 
 
@@ -579,7 +597,9 @@ class ConversationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter conversations for current user"""
-        return Conversation.objects.filter(participants=self.request.user)
+        return listing_queryset(
+            Conversation.objects.filter(participants=self.request.user), self.request.user
+        )
 
 
 class MessageViewSet(viewsets.ModelViewSet):
@@ -617,7 +637,8 @@ class AttachmentViewSet(viewsets.ModelViewSet):
 
 # Additional API Views for Enhanced Frontend Integration
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -625,220 +646,169 @@ def dashboard_stats(request):
     """
     Get dashboard statistics for the current user
     """
-    user = request.user
-    today = timezone.now().date()
-    
-    if user.user_type == 'patient':
-        # Patient dashboard stats
-        upcoming_appointments = Appointment.objects.filter(
-            patient=user,
-            date__gte=today,
-            status__in=['scheduled', 'confirmed']
-        ).count()
-        
-        active_exercise_plans = ExercisePlan.objects.filter(
-            patient=user,
-            status='active'
-        ).count()
-        
-        completed_exercises_today = ExerciseProgress.objects.filter(
-            patient=user,
-            date_completed=today
-        ).count()
-        
-        total_progress_entries = ExerciseProgress.objects.filter(
-            patient=user
-        ).count()
-        
-        # Calculate exercise streak
-        streak = calculate_exercise_streak(user)
-        
-        stats = {
-            'upcoming_appointments': upcoming_appointments,
-            'active_exercise_plans': active_exercise_plans,
-            'completed_exercises_today': completed_exercises_today,
-            'total_progress_entries': total_progress_entries,
-            'exercise_streak': streak,
-            'user_type': 'patient'
-        }
-        
-    elif user.user_type == 'physiotherapist':
-        # Physiotherapist dashboard stats
-        today_appointments = Appointment.objects.filter(
-            physiotherapist=user,
-            date=today
-        ).count()
-        
-        total_patients = Appointment.objects.filter(
-            physiotherapist=user
-        ).values('patient').distinct().count()
-        
-        pending_appointments = Appointment.objects.filter(
-            physiotherapist=user,
-            status='scheduled'
-        ).count()
-        
-        active_exercise_plans = ExercisePlan.objects.filter(
-            created_by=user,
-            status='active'
-        ).count()
-        
-        stats = {
-            'today_appointments': today_appointments,
-            'total_patients': total_patients,
-            'pending_appointments': pending_appointments,
-            'active_exercise_plans': active_exercise_plans,
-            'user_type': 'physiotherapist'
-        }
-        
-    else:
-        # Admin dashboard stats
-        total_users = User.objects.count()
-        total_patients = User.objects.filter(user_type='patient').count()
-        total_physiotherapists = User.objects.filter(user_type='physiotherapist').count()
-        total_appointments = Appointment.objects.count()
-        total_exercises = Exercise.objects.count()
-        
-        stats = {
-            'total_users': total_users,
-            'total_patients': total_patients,
-            'total_physiotherapists': total_physiotherapists,
-            'total_appointments': total_appointments,
-            'total_exercises': total_exercises,
-            'user_type': 'admin'
-        }
-    
-    return Response(stats)
+    return Response(get_dashboard_stats(request.user))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def recent_activity(request):
     """
     Get recent activity for the current user
+
+    Returns one page of the activity feed, newest first. When more entries
+    exist the response carries a ``Link: <...>; rel="next"`` header and an
+    ``X-Next-Cursor`` header; pass the cursor back as ``?cursor=`` to load more.
     """
-    user = request.user
-    limit = int(request.GET.get('limit', 10))
-    
-    activities = []
-    
-    if user.user_type == 'patient':
-        # Recent appointments
-        recent_appointments = Appointment.objects.filter(
-            patient=user
-        ).order_by('-date', '-start_time')[:limit//2]
-        
-        for appointment in recent_appointments:
-            activities.append({
-                'type': 'appointment',
-                'title': f'Appointment with {appointment.physiotherapist.get_full_name()}',
-                'date': appointment.date,
-                'time': appointment.start_time,
-                'status': appointment.status,
-                'id': appointment.id
-            })
-        
-        # Recent exercise progress
-        recent_progress = ExerciseProgress.objects.filter(
-            patient=user
-        ).order_by('-date_completed')[:limit//2]
-        
-        for progress in recent_progress:
-            activities.append({
-                'type': 'exercise',
-                'title': f'Completed {progress.exercise_plan_item.exercise.name}',
-                'date': progress.date_completed,
-                'completion_status': progress.completion_status,
-                'difficulty_rating': progress.difficulty_rating,
-                'id': progress.id
-            })
-    
-    elif user.user_type == 'physiotherapist':
-        # Recent appointments
-        recent_appointments = Appointment.objects.filter(
-            physiotherapist=user
-        ).order_by('-date', '-start_time')[:limit]
-        
-        for appointment in recent_appointments:
-            activities.append({
-                'type': 'appointment',
-                'title': f'Appointment with {appointment.patient.get_full_name()}',
-                'date': appointment.date,
-                'time': appointment.start_time,
-                'status': appointment.status,
-                'id': appointment.id
-            })
-    
-    # Sort activities by date
-    activities.sort(key=lambda x: x['date'], reverse=True)
-    
-    return Response(activities[:limit])
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        activities, next_cursor = get_feed(request.user, request.GET.get('cursor'), limit)
+    except InvalidCursor:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = Response(activities)
+    if next_cursor:
+        next_url = request.build_absolute_uri(
+            f"{request.path}?{urlencode({'limit': limit, 'cursor': next_cursor})}"
+        )
+        response['Link'] = f'<{next_url}>; rel="next"'
+        response['X-Next-Cursor'] = next_cursor
+    return response
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def available_time_slots(request):
     """
     Get available time slots for appointment booking
+
+    Single physiotherapist and day (list of slots):
+        ?physiotherapist_id=1&date=2025-01-31
+    Several physiotherapists over a date range, in one request:
+        ?physiotherapist_ids=1,2,3&start=2025-01-27&end=2025-02-02&duration=45
+
+    Slots follow each physiotherapist's working hours and skip booked
+    appointments; ``duration`` is the slot length in minutes (default 60).
     """
+    try:
+        duration = int(request.GET.get('duration', 60))
+    except ValueError:
+        return Response({'error': 'duration must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not scheduling.MIN_DURATION <= duration <= scheduling.MAX_DURATION:
+        return Response(
+            {'error': f'duration must be between {scheduling.MIN_DURATION} and {scheduling.MAX_DURATION} minutes'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     physiotherapist_id = request.GET.get('physiotherapist_id')
     date_str = request.GET.get('date')
-    
-    if not physiotherapist_id or not date_str:
+    if physiotherapist_id and date_str:
+        try:
+            appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            physiotherapist_id = int(physiotherapist_id)
+        except ValueError:
+            return Response(
+                {'error': 'physiotherapist_id must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        slots = scheduling.day_slots(physiotherapist_id, appointment_date, duration)
+        if slots is None:
+            # For demo purposes, return available slots even if physiotherapist doesn't exist
+            slots = scheduling.default_slots(appointment_date, duration)
+        return Response(slots)
+
+    ids_str = request.GET.get('physiotherapist_ids')
+    start_str = request.GET.get('start')
+    end_str = request.GET.get('end') or start_str
+    if not ids_str or not start_str:
         return Response(
-            {'error': 'physiotherapist_id and date are required'}, 
+            {'error': 'physiotherapist_id and date, or physiotherapist_ids and start, are required'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
+
     try:
-        # Try to get physiotherapist - if none exists, create a mock response
-        try:
-            physiotherapist = User.objects.get(id=physiotherapist_id, user_type='physiotherapist')
-        except User.DoesNotExist:
-            # For demo purposes, return available slots even if physiotherapist doesn't exist
-            physiotherapist = None
-        
-        appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        physiotherapist_ids = sorted({int(value) for value in ids_str.split(',') if value.strip()})
     except ValueError:
         return Response(
-            {'error': 'Invalid date format. Use YYYY-MM-DD'}, 
+            {'error': 'physiotherapist_ids must be a comma-separated list of ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+    except ValueError:
+        return Response(
+            {'error': 'Invalid date format. Use YYYY-MM-DD'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    # Get existing appointments for the date
-    if physiotherapist:
-        existing_appointments = Appointment.objects.filter(
-            physiotherapist=physiotherapist,
-            date=appointment_date,
-            status__in=['scheduled', 'confirmed']
-        ).values_list('start_time', 'end_time')
-    else:
-        # For demo purposes, assume no existing appointments
-        existing_appointments = []
-    
-    # Generate available time slots (9 AM to 5 PM, 1-hour slots)
-    available_slots = []
-    start_hour = 9
-    end_hour = 17
-    
-    for hour in range(start_hour, end_hour):
-        slot_start = f"{hour:02d}:00"
-        slot_end = f"{hour+1:02d}:00"
-        
-        # Check if slot conflicts with existing appointments
-        is_available = True
-        for existing_start, existing_end in existing_appointments:
-            if (slot_start >= str(existing_start) and slot_start < str(existing_end)) or \
-               (slot_end > str(existing_start) and slot_end <= str(existing_end)):
-                is_available = False
-                break
-        
-        if is_available:
-            available_slots.append({
-                'start_time': slot_start,
-                'end_time': slot_end,
-                'display': f"{slot_start} - {slot_end}"
-            })
-    
-    return Response(available_slots)
+
+    if not physiotherapist_ids or len(physiotherapist_ids) > scheduling.MAX_PHYSIOTHERAPISTS:
+        return Response(
+            {'error': f'Provide between 1 and {scheduling.MAX_PHYSIOTHERAPISTS} physiotherapist ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if end_date < start_date or (end_date - start_date).days >= scheduling.MAX_DAYS:
+        return Response(
+            {'error': f'end must be on or after start and the range at most {scheduling.MAX_DAYS} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    slots = scheduling.available_slots(physiotherapist_ids, start_date, end_date, duration)
+    return Response({
+        'start': start_date,
+        'end': end_date,
+        'duration': duration,
+        'physiotherapists': [
+            {
+                'physiotherapist_id': physiotherapist_id,
+                'days': [
+                    {'date': day, 'slots': day_slots}
+                    for day, day_slots in slots[physiotherapist_id].items()
+                ]
+            }
+            for physiotherapist_id in physiotherapist_ids
+            if physiotherapist_id in slots
+        ]
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def free_physiotherapists(request):
+    """
+    Physiotherapists free for a whole time range on one day:
+        ?date=2025-01-28&start_time=14:00&end_time=15:00
+
+    Answered from the precomputed quarter-hour availability bitmaps; a range
+    that does not start or end on a quarter hour needs the whole quarter free.
+    """
+    try:
+        day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+        start_time = datetime.strptime(request.GET.get('start_time', ''), '%H:%M').time()
+        end_time = datetime.strptime(request.GET.get('end_time', ''), '%H:%M').time()
+    except ValueError:
+        return Response(
+            {'error': 'date (YYYY-MM-DD), start_time and end_time (HH:MM) are required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if end_time <= start_time:
+        return Response({'error': 'end_time must be after start_time'}, status=status.HTTP_400_BAD_REQUEST)
+
+    free = availability.free_physiotherapists(day, start_time, end_time)
+    return Response({
+        'date': day,
+        'start_time': start_time.strftime('%H:%M'),
+        'end_time': end_time.strftime('%H:%M'),
+        'physiotherapists': list(
+            User.objects.filter(id__in=free).order_by('id').values('id', 'username', 'first_name', 'last_name')
+        ),
+    })
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -859,63 +829,38 @@ def exercise_analytics(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days)
     
-    # Get exercise progress data
-    progress_data = ExerciseProgress.objects.filter(
+    # Read the per-day rollups instead of every session in the window
+    rollups = ExerciseDailyRollup.objects.filter(
         patient=user,
-        date_completed__gte=start_date,
-        date_completed__lte=end_date
-    ).order_by('date_completed')
-    
-    # Aggregate data by date
-    daily_stats = {}
-    for progress in progress_data:
-        date_str = progress.date_completed.strftime('%Y-%m-%d')
-        if date_str not in daily_stats:
-            daily_stats[date_str] = {
-                'date': date_str,
-                'exercises_completed': 0,
-                'total_duration': 0,
-                'avg_difficulty': 0,
-                'avg_pain_before': 0,
-                'avg_pain_after': 0,
-                'difficulties': [],
-                'pain_before': [],
-                'pain_after': []
-            }
-        
-        daily_stats[date_str]['exercises_completed'] += 1
-        daily_stats[date_str]['total_duration'] += progress.actual_duration
-        daily_stats[date_str]['difficulties'].append(progress.difficulty_rating)
-        daily_stats[date_str]['pain_before'].append(progress.pain_level_before)
-        daily_stats[date_str]['pain_after'].append(progress.pain_level_after)
-    
-    # Calculate averages
-    for date_str, stats in daily_stats.items():
-        if stats['difficulties']:
-            stats['avg_difficulty'] = sum(stats['difficulties']) / len(stats['difficulties'])
-            stats['avg_pain_before'] = sum(stats['pain_before']) / len(stats['pain_before'])
-            stats['avg_pain_after'] = sum(stats['pain_after']) / len(stats['pain_after'])
-        
-        # Remove raw lists
-        del stats['difficulties']
-        del stats['pain_before']
-        del stats['pain_after']
-    
-    # Convert to list and sort by date
-    analytics = list(daily_stats.values())
-    analytics.sort(key=lambda x: x['date'])
+        date__gte=start_date,
+        date__lte=end_date
+    ).order_by('date')
+    
+    analytics = [
+        {
+            'date': rollup.date.strftime('%Y-%m-%d'),
+            'exercises_completed': rollup.session_count,
+            'total_duration': rollup.total_duration,
+            'avg_difficulty': rollup.avg_difficulty,
+            'avg_pain_before': rollup.avg_pain_before,
+            'avg_pain_after': rollup.avg_pain_after,
+        }
+        for rollup in rollups
+    ]
     
     # Calculate summary stats
     total_exercises = sum(day['exercises_completed'] for day in analytics)
     total_duration = sum(day['total_duration'] for day in analytics)
     avg_exercises_per_day = total_exercises / max(len(analytics), 1)
     
+    streak = get_streak(user)
     summary = {
         'total_exercises': total_exercises,
         'total_duration': total_duration,
         'avg_exercises_per_day': round(avg_exercises_per_day, 1),
         'days_with_activity': len(analytics),
-        'streak': calculate_exercise_streak(user)
+        'streak': streak.streak_on(end_date),
+        'longest_streak': streak.longest_streak
     }
     
     return Response({
@@ -927,60 +872,17 @@ def exercise_analytics(request):
 @permission_classes([permissions.IsAuthenticated])
 def search_global(request):
     """
-    Global search across multiple models
+    Global search across appointments, exercises and users
+
+    Results are ranked by the full-text index (see core.search), at most five
+    per type, each with a snippet of the matching text as escaped HTML whose
+    only markup is <mark> around the matches.
     """
     query = request.GET.get('q', '').strip()
     if not query:
         return Response({'results': []})
-    
-    user = request.user
-    results = []
-    
-    # Search appointments
-    appointments = Appointment.objects.filter(
-        Q(patient=user) | Q(physiotherapist=user),
-        Q(notes__icontains=query) | Q(status__icontains=query)
-    )[:5]
-    
-    for appointment in appointments:
-        results.append({
-            'type': 'appointment',
-            'id': appointment.id,
-            'title': f'Appointment on {appointment.date}',
-            'description': f'With {appointment.physiotherapist.get_full_name() if user.user_type == "patient" else appointment.patient.get_full_name()}',
-            'url': f'/appointments/{appointment.id}/'
-        })
-    
-    # Search exercises
-    exercises = Exercise.objects.filter(
-        Q(name__icontains=query) | Q(description__icontains=query)
-    )[:5]
-    
-    for exercise in exercises:
-        results.append({
-            'type': 'exercise',
-            'id': exercise.id,
-            'title': exercise.name,
-            'description': exercise.description[:100] + '...' if len(exercise.description) > 100 else exercise.description,
-            'url': f'/exercises/{exercise.id}/'
-        })
-    
-    # Search users (for physiotherapists and admins)
-    if user.user_type in ['physiotherapist', 'admin']:
-        users = User.objects.filter(
-            Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(email__icontains=query)
-        ).exclude(id=user.id)[:5]
-        
-        for user_obj in users:
-            results.append({
-                'type': 'user',
-                'id': user_obj.id,
-                'title': user_obj.get_full_name(),
-                'description': f'{user_obj.user_type.title()} - {user_obj.email}',
-                'url': f'/users/{user_obj.id}/'
-            })
-    
-    return Response({'results': results})
+
+    return Response({'results': search.search(request.user, query)})
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -991,12 +893,11 @@ def quick_actions(request):
     action = request.data.get('action')
     
     if action == 'mark_all_notifications_read':
-        Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        notification_state.mark_all_read(request.user)
         return Response({'success': True, 'message': 'All notifications marked as read'})
     
     elif action == 'get_unread_count':
-        count = Notification.objects.filter(recipient=request.user, is_read=False).count()
-        return Response({'unread_count': count})
+        return Response({'unread_count': notification_state.unread_count(request.user)})
     
     elif action == 'cancel_appointment':
         appointment_id = request.data.get('appointment_id')
@@ -1020,27 +921,7 @@ def calculate_exercise_streak(user):
     """
     Calculate the current exercise streak for a user
     """
-    today = timezone.now().date()
-    streak = 0
-    current_date = today
-    
-    while True:
-        has_exercise = ExerciseProgress.objects.filter(
-            patient=user,
-            date_completed=current_date
-        ).exists()
-        
-        if has_exercise:
-            streak += 1
-            current_date -= timedelta(days=1)
-        else:
-            break
-        
-        # Prevent infinite loop
-        if streak > 365:
-            break
-    
-    return streak
+    return get_current_streak(user)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -1065,34 +946,105 @@ def health_check(request):
         'version': '1.0.0'
     })
 
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def liveness(request):
+    """
+    Liveness probe: the process is up and serving requests.
+
+    Unauthenticated and touches no backing service.
+    """
+    return Response({'status': 'ok'})
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def readiness(request):
+    """
+    Readiness probe: database, cache, media storage and migration state.
+
+    Unauthenticated. Returns per-check latency in ms and 503 when any check
+    fails; results are reused for HEALTH_CHECK_CACHE_SECONDS.
+    """
+    report, cached = health.readiness()
+    return Response(
+        {**report, 'cached': cached},
+        status=status.HTTP_200_OK if report['status'] == 'ok' else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+@renderer_classes([JSONRenderer, metrics.PrometheusRenderer])
+def metrics_report(request):
+    """
+    Per-route request counts, latency histogram, SQL and serialization time.
+
+    Staff only. Totals are for this process since it started; use
+    ?format=prometheus (or Accept: text/plain) for the Prometheus text format.
+    """
+    return Response(metrics.registry.snapshot())
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def pain_analytics(request):
-    """Get pain tracking analytics"""
-    days = int(request.GET.get('days', 30))
+    """
+    Get pain trend analytics.
+    
+    Patients get their own report. Physiotherapists get the report of one
+    patient with ?patient_id=, or a summary for their whole caseload.
+    """
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if days < 1 or days > pain.MAX_DAYS:
+        return Response(
+            {'error': f'days must be between 1 and {pain.MAX_DAYS}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    user = request.user
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days)
+    patient_id = request.GET.get('patient_id')
+    if patient_id:
+        try:
+            patient_id = int(patient_id)
+        except ValueError:
+            return Response({'error': 'patient_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Mock pain data for now - replace with actual pain tracking model
-    pain_data = {
-        'summary': {
-            'average_pain_level': 4.2,
-            'pain_free_days': 8,
-            'high_pain_days': 3,
-            'improvement_trend': 'improving',
-            'most_common_area': 'lower_back'
-        },
-        'daily_data': [
-            {
-                'date': (start_date + timedelta(days=i)).isoformat(),
-                'pain_level': max(0, min(10, 5 + (i % 7 - 3))),
-                'affected_areas': ['lower_back', 'neck'] if i % 3 == 0 else ['lower_back']
-            }
-            for i in range(days)
-        ]
-    }
+    if user.user_type == 'patient':
+        patients = [user.id]
+    elif user.user_type == 'physiotherapist' or user.is_staff:
+        patients = User.objects.filter(user_type='patient')
+        if not user.is_staff:
+            # Caseload: patients with an appointment or exercise plan from this physiotherapist
+            patients = patients.filter(
+                Q(patient_appointments__physiotherapist=user) |
+                Q(exercise_plans__physiotherapist=user)
+            )
+        if patient_id:
+            patients = patients.filter(id=patient_id)
+        patients = patients.values('id')
+    else:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    single_patient = user.user_type == 'patient' or bool(patient_id)
+    reports = pain.analyze(patients, start_date, end_date, include_daily=single_patient)
+    period = {'start_date': start_date, 'end_date': end_date, 'days': days}
     
-    return Response(pain_data)
+    if single_patient:
+        report = next(iter(reports.values()), {'summary': None, 'daily_data': []})
+        return Response({'period': period, **report})
+    
+    return Response({
+        'period': period,
+        'patients': [
+            {'patient_id': report_patient_id, **report}
+            for report_patient_id, report in reports.items()
+        ]
+    })
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -1102,53 +1054,39 @@ def progress_analytics(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days)
     
-    # Get actual progress data
-    progress_entries = ExerciseProgress.objects.filter(
+    # Read the per-day rollups instead of every session in the window
+    rollups = list(ExerciseDailyRollup.objects.filter(
         patient=request.user,
-        date_completed__gte=start_date,
-        date_completed__lte=end_date
-    ).order_by('date_completed')
+        date__gte=start_date,
+        date__lte=end_date
+    ).order_by('date'))
     
     # Calculate analytics
-    total_sessions = progress_entries.count()
-    completed_exercises = progress_entries.filter(completion_status='completed').count()
+    total_sessions = sum(rollup.session_count for rollup in rollups)
+    completed_exercises = sum(rollup.completed_count for rollup in rollups)
+    total_duration = sum(rollup.total_duration for rollup in rollups)
     completion_rate = (completed_exercises / total_sessions * 100) if total_sessions > 0 else 0
     
-    # Group by date for daily progress
-    daily_progress = {}
-    for entry in progress_entries:
-        date_str = entry.date_completed.isoformat()
-        if date_str not in daily_progress:
-            daily_progress[date_str] = {
-                'date': date_str,
-                'total_exercises': 0,
-                'completed_exercises': 0,
-                'total_duration': 0,
-                'average_difficulty': 0
-            }
-        
-        daily_progress[date_str]['total_exercises'] += 1
-        if entry.completion_status == 'completed':
-            daily_progress[date_str]['completed_exercises'] += 1
-        daily_progress[date_str]['total_duration'] += entry.actual_duration or 0
-        daily_progress[date_str]['average_difficulty'] += entry.difficulty_rating or 0
-    
-    # Calculate averages
-    for day_data in daily_progress.values():
-        if day_data['total_exercises'] > 0:
-            day_data['average_difficulty'] = day_data['average_difficulty'] / day_data['total_exercises']
+    daily_progress = [
+        {
+            'date': rollup.date.isoformat(),
+            'total_exercises': rollup.session_count,
+            'completed_exercises': rollup.completed_count,
+            'total_duration': rollup.total_duration,
+            'average_difficulty': rollup.difficulty_sum / rollup.session_count if rollup.session_count else 0
+        }
+        for rollup in rollups
+    ]
     
     analytics_data = {
         'summary': {
             'total_sessions': total_sessions,
             'completed_exercises': completed_exercises,
             'completion_rate': round(completion_rate, 1),
-            'average_session_duration': round(
-                sum(entry.actual_duration or 0 for entry in progress_entries) / total_sessions, 1
-            ) if total_sessions > 0 else 0,
+            'average_session_duration': round(total_duration / total_sessions, 1) if total_sessions > 0 else 0,
             'streak_days': calculate_exercise_streak(request.user)
         },
-        'daily_data': list(daily_progress.values())
+        'daily_data': daily_progress
     }
     
     return Response(analytics_data)
@@ -1156,14 +1094,12 @@ def progress_analytics(request):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def unread_notification_count(request):
-    """Get unread notification count"""
-    from notifications.models import Notification
-    
-    unread_count = Notification.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).count()
-    
+    """
+    Get unread notification count
+
+    Served from the per-user counter (cached), so frequent polling never
+    counts notification rows.
+    """
     return Response({
-        'unread_count': unread_count
+        'unread_count': notification_state.unread_count(request.user)
     })
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Precomputed physiotherapist availability.
+
+Each ``AvailabilityDay`` row holds the free quarter-hours of one
+physiotherapist on one date as a 96-bit bitmap, split over two BIGINT
+columns (``morning`` and ``afternoon``, 48 quarters each). A quarter is free
+when it lies inside a working-hours shift and overlaps no blocking
+appointment, the rule ``appointments.scheduling`` applies.
+
+Rows are recomputed after a transaction that creates, moves, cancels or
+deletes an appointment commits (``core.signals``), holding the day's
+``BookingLock`` so the last refresh sees every committed booking. A change of
+working hours drops the physiotherapist's rows. Missing rows are computed
+on first use, so ``manage.py rebuild_availability`` (e.g. nightly) only
+keeps the table warm. Inactive physiotherapists and profiles marked
+unavailable are left out when reading, so toggling either keeps the rows.
+
+"Who is free on Tuesday 14:00-15:00" is then one indexed read of that day's
+rows with a bitwise AND per row.
+"""
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from authentication.models import User
+
+from .models import AvailabilityDay, BookingLock
+from .scheduling import _minutes, free_intervals, load_busy, load_schedules
+
+# Appointment fields a change of which can move the physiotherapist's free time
+SCHEDULE_FIELDS = {'physiotherapist', 'physiotherapist_id', 'date', 'start_time', 'end_time', 'status'}
+
+QUARTER = 15
+QUARTERS_PER_COLUMN = 48
+COLUMN_MASK = (1 << QUARTERS_PER_COLUMN) - 1
+
+BATCH_SIZE = 2000
+
+
+def day_mask(windows, busy):
+    """Bitmap of the quarters entirely inside the free part of ``windows`` (minute pairs)"""
+    mask = 0
+    for start, end in free_intervals(windows, busy):
+        first, last = -(-start // QUARTER), end // QUARTER
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << first
+    return mask
+
+
+def range_mask(start_time, end_time):
+    """Bitmap of every quarter that ``start_time``-``end_time`` touches"""
+    first = _minutes(start_time) // QUARTER
+    last = -(-_minutes(end_time) // QUARTER)
+    return ((1 << (last - first)) - 1) << first
+
+
+def _columns(mask):
+    return {'morning': mask & COLUMN_MASK, 'afternoon': mask >> QUARTERS_PER_COLUMN}
+
+
+def compute(schedules, days):
+    """Unsaved AvailabilityDay rows for ``load_schedules()`` output on ``days``"""
+    if not schedules or not days:
+        return []
+    busy = load_busy(list(schedules), min(days), max(days))
+    return [
+        AvailabilityDay(
+            physiotherapist_id=physiotherapist_id, date=day,
+            **_columns(day_mask(schedule.get(day.weekday(), []), busy.get((physiotherapist_id, day), [])))
+        )
+        for physiotherapist_id, schedule in schedules.items()
+        for day in days
+    ]
+
+
+def store(rows):
+    AvailabilityDay.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['physiotherapist', 'date'],
+        update_fields=['morning', 'afternoon'], batch_size=BATCH_SIZE
+    )
+
+
+def refresh(physiotherapist_id, days):
+    """Recompute the stored availability of one physiotherapist on ``days``"""
+    days = sorted(set(days))
+    with transaction.atomic():
+        schedules = load_schedules([physiotherapist_id])
+        if not schedules:
+            return  # e.g. the physiotherapist was deleted along with the appointment
+        BookingLock.lock(physiotherapist_id, days)
+        store(compute(schedules, days))
+
+
+def refresh_on_commit(physiotherapist_id, days):
+    transaction.on_commit(lambda: refresh(physiotherapist_id, days))
+
+
+def bookable(prefix=''):
+    """Active physiotherapists, less those whose profile is marked unavailable (no profile means default hours)"""
+    return Q(**{f'{prefix}is_active': True}) & ~Q(**{f'{prefix}physiotherapist_profile__is_available': False})
+
+
+def forget(physiotherapist_id):
+    """Drop the stored days of a physiotherapist, e.g. after their working hours changed"""
+    AvailabilityDay.objects.filter(physiotherapist_id=physiotherapist_id).delete()
+
+
+def ensure(day):
+    """Compute the rows of physiotherapists that have none for ``day`` yet"""
+    missing = User.objects.filter(bookable(), user_type='physiotherapist').exclude(availability_days__date=day)
+    schedules = load_schedules(missing.values_list('id', flat=True))
+    if schedules:
+        # A concurrent refresh has fresher data than this, so never overwrite
+        AvailabilityDay.objects.bulk_create(compute(schedules, [day]), ignore_conflicts=True)
+
+
+def rebuild(days, batch_size=200):
+    """Recompute every physiotherapist's rows for ``days``; returns the row count"""
+    ids = list(User.objects.filter(user_type='physiotherapist').order_by('id').values_list('id', flat=True))
+    total = 0
+    for offset in range(0, len(ids), batch_size):
+        rows = compute(load_schedules(ids[offset:offset + batch_size]), days)
+        store(rows)
+        total += len(rows)
+    return total
+
+
+def free_physiotherapists(day, start_time, end_time):
+    """Ids of the physiotherapists free for all of ``start_time``-``end_time`` on ``day``"""
+    ensure(day)
+    wanted = _columns(range_mask(start_time, end_time))
+    return list(AvailabilityDay.objects.filter(bookable('physiotherapist__'), date=day).alias(
+        free_morning=F('morning').bitand(wanted['morning']),
+        free_afternoon=F('afternoon').bitand(wanted['afternoon']),
+    ).filter(
+        free_morning=wanted['morning'], free_afternoon=wanted['afternoon']
+    ).order_by('physiotherapist_id').values_list('physiotherapist_id', flat=True))
@@ -0,0 +1,187 @@
+"""
+Race-free appointment booking.
+
+Checking for an overlapping appointment and then inserting is only safe if
+no other booking for the same physiotherapist and day runs in between.
+``book`` therefore holds the physiotherapist-day ``BookingLock`` row
+(``SELECT ... FOR UPDATE``) for the whole check-and-save transaction.
+``book_series`` does the same for every day of a recurring series at once:
+one conflict query for all occurrences and one ``bulk_create`` for those
+that are free.
+
+SQLite has no row locks, so there the same section is additionally guarded
+by a process-wide lock per physiotherapist-day; across processes SQLite's
+database write lock keeps transactions serializable.
+
+On PostgreSQL the ``appointments_no_overlap`` exclusion constraint (installed
+by migration 0003) also rejects overlapping blocking appointments for a
+physiotherapist, whatever code path writes them.
+"""
+
+import threading
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+
+from core.signals import bulk_created
+
+from .models import Appointment, BookingLock
+from .scheduling import BLOCKING_STATUSES, _minutes, _parse_time, available_slots
+
+FREQUENCIES = {'weekly': 7, 'biweekly': 14}
+
+MAX_SERIES_OCCURRENCES = 26
+
+# Alternatives offered for each occurrence of a series that clashes
+MAX_ALTERNATIVES = 3
+
+EXCLUSION_CONSTRAINT = 'appointments_no_overlap'
+
+_statuses = ', '.join(f"'{status}'" for status in BLOCKING_STATUSES)
+
+POSTGRES_INSTALL = (
+    # Lets the gist index compare physiotherapist_id with =
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    f'''
+    ALTER TABLE appointments ADD CONSTRAINT {EXCLUSION_CONSTRAINT} EXCLUDE USING gist (
+        physiotherapist_id WITH =,
+        tsrange(date + start_time, date + end_time) WITH &&
+    ) WHERE (status IN ({_statuses}))
+    ''',
+)
+
+POSTGRES_UNINSTALL = (
+    f'ALTER TABLE appointments DROP CONSTRAINT IF EXISTS {EXCLUSION_CONSTRAINT}',
+)
+
+# Striped rather than one lock per key, so memory stays bounded
+_process_locks = [threading.Lock() for _ in range(64)]
+
+
+class SlotUnavailable(Exception):
+    """The physiotherapist already has a blocking appointment overlapping the requested time"""
+
+
+def install_constraint(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor == 'postgresql':
+        with conn.cursor() as cursor:
+            for statement in POSTGRES_INSTALL:
+                cursor.execute(statement)
+
+
+def uninstall_constraint(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor == 'postgresql':
+        with conn.cursor() as cursor:
+            for statement in POSTGRES_UNINSTALL:
+                cursor.execute(statement)
+
+
+def _process_locks_for(physiotherapist_id, days):
+    stack = ExitStack()
+    if connection.vendor == 'sqlite':
+        # Always in index order, so two series cannot wait on each other
+        stripes = {hash((physiotherapist_id, day)) % len(_process_locks) for day in days}
+        for stripe in sorted(stripes):
+            stack.enter_context(_process_locks[stripe])
+    return stack
+
+
+def _save(save):
+    try:
+        with transaction.atomic():
+            return save()
+    except IntegrityError as exc:
+        if EXCLUSION_CONSTRAINT in str(exc):
+            raise SlotUnavailable from exc
+        raise
+
+
+def conflicts(appointment):
+    """Blocking appointments of the same physiotherapist overlapping ``appointment``"""
+    return Appointment.objects.filter(
+        physiotherapist_id=appointment.physiotherapist_id,
+        date=appointment.date,
+        status__in=BLOCKING_STATUSES,
+    ).filter(
+        Q(start_time__lt=appointment.end_time) & Q(end_time__gt=appointment.start_time)
+    ).exclude(pk=appointment.pk)
+
+
+def book(appointment):
+    """
+    Save ``appointment`` (new or rescheduled) unless it overlaps another
+    blocking appointment of its physiotherapist, raising ``SlotUnavailable``.
+    Appointments in a non-blocking status are saved without a check.
+    """
+    if appointment.status not in BLOCKING_STATUSES:
+        appointment.save()
+        return appointment
+
+    days = [appointment.date]
+    with _process_locks_for(appointment.physiotherapist_id, days), transaction.atomic():
+        BookingLock.lock(appointment.physiotherapist_id, days)
+        if conflicts(appointment).exists():
+            raise SlotUnavailable
+        _save(appointment.save)
+    return appointment
+
+
+def occurrences(first, frequency, count=None, until=None):
+    """Dates of a weekly or biweekly series from ``first``, ``count`` of them or up to ``until``"""
+    step = timedelta(days=FREQUENCIES[frequency])
+    if count is None:
+        count = (until - first) // step + 1 if until >= first else 0
+    return [first + step * index for index in range(count)]
+
+
+def _alternatives(slots, start_time):
+    """The free slots of a day closest to the requested start time"""
+    requested = _minutes(start_time)
+    by_distance = sorted(slots, key=lambda slot: abs(_minutes(_parse_time(slot['start_time'])) - requested))
+    return by_distance[:MAX_ALTERNATIVES]
+
+
+def book_series(days, **fields):
+    """
+    Book one appointment per day in ``days`` with the same ``fields``
+    (physiotherapist, patient, times, ...), skipping days where the
+    physiotherapist is not free.
+
+    Returns one result per day in order: ``{'date', 'status': 'booked',
+    'appointment_id'}`` or ``{'date', 'status': 'conflict', 'alternatives'}``
+    where the alternatives are the free slots of the same length closest to
+    the requested time. Runs the same handful of queries whatever the length
+    of the series.
+    """
+    template = Appointment(date=days[0], **fields)
+    physiotherapist_id = template.physiotherapist_id
+    with _process_locks_for(physiotherapist_id, days), transaction.atomic():
+        BookingLock.lock(physiotherapist_id, days)
+        taken = set(Appointment.objects.filter(
+            physiotherapist_id=physiotherapist_id,
+            date__in=days,
+            status__in=BLOCKING_STATUSES,
+            start_time__lt=template.end_time,
+            end_time__gt=template.start_time,
+        ).values_list('date', flat=True))
+
+        created = [Appointment(date=day, **fields) for day in days if day not in taken]
+        _save(lambda: Appointment.objects.bulk_create(created))
+        bulk_created(created)
+
+        free = {}
+        if taken:
+            free = available_slots(
+                [physiotherapist_id], min(taken), max(taken), template.duration
+            ).get(physiotherapist_id, {})
+
+    booked = {appointment.date: appointment.pk for appointment in created}
+    return [
+        {'date': day, 'status': 'booked', 'appointment_id': booked[day]} if day in booked else
+        {'date': day, 'status': 'conflict', 'alternatives': _alternatives(free.get(day, []), template.start_time)}
+        for day in days
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def install_constraint(apps, schema_editor):
+    from appointments.booking import install_constraint
+    install_constraint(schema_editor)
+
+
+def uninstall_constraint(apps, schema_editor):
+    from appointments.booking import uninstall_constraint
+    uninstall_constraint(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('physiotherapist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_locks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'appointment_booking_locks',
+                'constraints': [models.UniqueConstraint(fields=('physiotherapist', 'date'), name='unique_booking_lock_per_day')],
+            },
+        ),
+        # PostgreSQL only: no overlapping blocking appointments per physiotherapist
+        migrations.RunPython(install_constraint, uninstall_constraint),
+    ]
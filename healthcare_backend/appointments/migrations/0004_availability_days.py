@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_booking_locks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('morning', models.BigIntegerField(default=0)),
+                ('afternoon', models.BigIntegerField(default=0)),
+                ('physiotherapist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'appointment_availability_days',
+                'indexes': [models.Index(fields=['date'], name='availability_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('physiotherapist', 'date'), name='unique_availability_per_day')],
+            },
+        ),
+    ]
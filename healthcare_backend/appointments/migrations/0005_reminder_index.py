@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_availability_days'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['reminder_sent', 'date', 'start_time'], name='appointment_reminder_idx'),
+        ),
+    ]
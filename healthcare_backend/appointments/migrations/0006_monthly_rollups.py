@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_rollups(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    MonthlyAppointmentRollup = apps.get_model('appointments', 'MonthlyAppointmentRollup')
+
+    for role, field in (('physiotherapist', 'physiotherapist_id'), ('patient', 'patient_id')):
+        totals = Appointment.objects.order_by().annotate(month=TruncMonth('date')).values(
+            field, 'month', 'status', 'payment_status'
+        ).annotate(total=Count('id'), cost=Sum('cost'))
+        MonthlyAppointmentRollup.objects.bulk_create(
+            [
+                MonthlyAppointmentRollup(
+                    user_id=row[field], role=role, month=row['month'], status=row['status'],
+                    payment_status=row['payment_status'], count=row['total'], revenue=row['cost']
+                )
+                for row in totals.iterator()
+            ],
+            batch_size=2000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_reminder_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyAppointmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('physiotherapist', 'Physiotherapist'), ('patient', 'Patient')], max_length=20)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('no_show', 'No Show'), ('rescheduled', 'Rescheduled')], max_length=20)),
+                ('payment_status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'appointment_monthly_rollups',
+                'indexes': [models.Index(fields=['role', 'month'], name='rollup_role_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'role', 'month', 'status', 'payment_status'), name='unique_appointment_rollup')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
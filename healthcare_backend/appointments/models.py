@@ -139,6 +139,8 @@ class Appointment(models.Model):
             models.Index(fields=['physiotherapist', 'date']),
             models.Index(fields=['status']),
             models.Index(fields=['appointment_type']),
+            # Reminder dispatch scans unsent reminders in start order
+            models.Index(fields=['reminder_sent', 'date', 'start_time'], name='appointment_reminder_idx'),
         ]
         constraints = [
             models.CheckConstraint(
@@ -305,3 +307,107 @@ class AppointmentDocument(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.appointment}"
+
+class BookingLock(models.Model):
+    """
+    One row per physiotherapist and day that has been booked. Bookings lock it
+    (``appointments.booking``) so conflict checks and inserts for the same
+    physiotherapist-day run one at a time.
+    """
+    physiotherapist = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='booking_locks'
+    )
+    date = models.DateField()
+    
+    class Meta:
+        db_table = 'appointment_booking_locks'
+        constraints = [
+            models.UniqueConstraint(fields=['physiotherapist', 'date'], name='unique_booking_lock_per_day'),
+        ]
+    
+    def __str__(self):
+        return f"Booking lock: {self.physiotherapist_id} on {self.date}"
+    
+    @classmethod
+    def lock(cls, physiotherapist_id, days):
+        """Lock the physiotherapist's rows for ``days`` until the transaction ends"""
+        cls.objects.bulk_create(
+            [cls(physiotherapist_id=physiotherapist_id, date=day) for day in days],
+            ignore_conflicts=True
+        )
+        # Locked in date order, so concurrent bookings cannot deadlock
+        list(cls.objects.select_for_update().filter(
+            physiotherapist_id=physiotherapist_id, date__in=days
+        ).order_by('date').values_list('pk', flat=True))
+
+
+class AvailabilityDay(models.Model):
+    """
+    Free quarter-hours of a physiotherapist on one day, as bitmaps
+    maintained by ``appointments.availability``. Bit ``n`` of ``morning`` is
+    the quarter starting at ``n * 15`` minutes past midnight, bit ``n`` of
+    ``afternoon`` the one ``n * 15`` minutes past noon.
+    """
+    physiotherapist = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='availability_days'
+    )
+    date = models.DateField()
+    morning = models.BigIntegerField(default=0)
+    afternoon = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'appointment_availability_days'
+        constraints = [
+            models.UniqueConstraint(fields=['physiotherapist', 'date'], name='unique_availability_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='availability_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Availability: {self.physiotherapist_id} on {self.date}"
+
+
+class MonthlyAppointmentRollup(models.Model):
+    """
+    Number and total cost of a user's appointments in one month, per status
+    and payment status, maintained by ``appointments.rollups`` for trend
+    charts. Every appointment is counted once for its physiotherapist and
+    once for its patient.
+    """
+    ROLE_CHOICES = (
+        ('physiotherapist', 'Physiotherapist'),
+        ('patient', 'Patient'),
+    )
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='appointment_rollups'
+    )
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    month = models.DateField(help_text="First day of the month")
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'appointment_monthly_rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'role', 'month', 'status', 'payment_status'],
+                name='unique_appointment_rollup'
+            ),
+        ]
+        indexes = [
+            # Site-wide trends read every physiotherapist's rows
+            models.Index(fields=['role', 'month'], name='rollup_role_month_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Rollup: {self.role} {self.user_id} {self.month:%Y-%m} {self.status}"
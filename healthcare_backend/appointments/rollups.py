@@ -0,0 +1,191 @@
+"""
+Monthly appointment rollups.
+
+Each ``MonthlyAppointmentRollup`` row counts a user's appointments in a
+month that share a status and a payment status, and sums their cost; an
+appointment is counted for its physiotherapist and for its patient. A
+month's status counts and its revenue by payment status are sums over a
+handful of rows, so a trend chart over several years reads a few dozen rows
+instead of the appointments table. Site-wide trends add up the
+physiotherapists' rows.
+
+Saves and deletes move the affected rows in the writer's transaction
+(``core.signals``), in a constant number of queries however many rows a
+bulk insert touches. ``QuerySet.update`` bypasses the signals; run
+``manage.py rebuild_appointment_rollups`` after one to recompute the table.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from .models import Appointment, MonthlyAppointmentRollup
+
+# The appointment values a rollup row is keyed on or sums
+FIELDS = ('physiotherapist_id', 'patient_id', 'date', 'status', 'payment_status', 'cost')
+
+# Fields whose change moves an appointment between rollup rows
+TRACKED_FIELDS = set(FIELDS) | {'physiotherapist', 'patient'}
+
+KEY_FIELDS = ('user_id', 'role', 'month', 'status', 'payment_status')
+
+# Rollup role -> the appointment field holding that user
+ROLES = {'physiotherapist': 'physiotherapist_id', 'patient': 'patient_id'}
+
+STATUSES = [status for status, _ in Appointment.STATUS_CHOICES]
+PAYMENT_STATUSES = [status for status, _ in Appointment._meta.get_field('payment_status').choices]
+
+MAX_MONTHS = 120
+
+# Rollup rows moved per UPDATE; each adds a condition to the WHERE and two CASEs
+BATCH_SIZE = 50
+
+BUILD_BATCH_SIZE = 2000
+
+
+def snapshot(instance):
+    """Return the rollup-relevant field values of an appointment"""
+    return {field: getattr(instance, field) for field in FIELDS}
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _keys(values):
+    month = month_of(values['date'])
+    return [
+        (values[field], role, month, values['status'], values['payment_status'])
+        for role, field in ROLES.items()
+    ]
+
+
+def _lookup(key):
+    return dict(zip(KEY_FIELDS, key))
+
+
+def apply(deltas):
+    """
+    Move rollup rows by ``{key: (count, revenue)}``. Rows gaining
+    appointments are created first if missing; then one UPDATE per batch
+    adds every delta through CASE expressions.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    with transaction.atomic():
+        MonthlyAppointmentRollup.objects.bulk_create(
+            [MonthlyAppointmentRollup(**_lookup(key)) for key, (count, _) in deltas.items() if count > 0],
+            ignore_conflicts=True
+        )
+        # Sorted so concurrent writers lock rows in the same order
+        keys = sorted(deltas)
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start:start + BATCH_SIZE]
+            conditions = [Q(**_lookup(key)) for key in batch]
+            MonthlyAppointmentRollup.objects.filter(
+                Q.create(conditions, connector=Q.OR)
+            ).update(
+                count=F('count') + Case(
+                    *[When(condition, then=Value(deltas[key][0])) for condition, key in zip(conditions, batch)],
+                    default=Value(0), output_field=IntegerField()
+                ),
+                revenue=F('revenue') + Case(
+                    *[When(condition, then=Value(deltas[key][1])) for condition, key in zip(conditions, batch)],
+                    default=Value(Decimal(0)), output_field=DecimalField(max_digits=12, decimal_places=2)
+                ),
+            )
+
+
+def _add_to(deltas, values, sign):
+    for key in _keys(values):
+        count, revenue = deltas.get(key, (0, Decimal(0)))
+        deltas[key] = (count + sign, revenue + sign * Decimal(values['cost']))
+
+
+def replace(previous, current):
+    """Move an appointment from its previous to its current values (either may be None)"""
+    deltas = {}
+    if previous is not None:
+        _add_to(deltas, previous, -1)
+    if current is not None:
+        _add_to(deltas, current, 1)
+    apply(deltas)
+
+
+def add(instances):
+    """Count appointments inserted without signals (``bulk_create``)"""
+    deltas = {}
+    for instance in instances:
+        _add_to(deltas, snapshot(instance), 1)
+    apply(deltas)
+
+
+def rebuild():
+    """Recompute the whole table from ``appointments``; returns the number of rows stored"""
+    with transaction.atomic():
+        MonthlyAppointmentRollup.objects.all().delete()
+        stored = 0
+        for role, field in ROLES.items():
+            totals = Appointment.objects.order_by().annotate(month=TruncMonth('date')).values(
+                field, 'month', 'status', 'payment_status'
+            ).annotate(total=Count('id'), cost=Sum('cost'))
+            stored += len(MonthlyAppointmentRollup.objects.bulk_create(
+                [
+                    MonthlyAppointmentRollup(
+                        user_id=row[field], role=role, month=row['month'], status=row['status'],
+                        payment_status=row['payment_status'], count=row['total'], revenue=row['cost']
+                    )
+                    for row in totals.iterator()
+                ],
+                batch_size=BUILD_BATCH_SIZE
+            ))
+    return stored
+
+
+def for_user(user):
+    """The rows behind a user's trends: their own as patient or physiotherapist, else site-wide"""
+    if user.user_type in ROLES:
+        return MonthlyAppointmentRollup.objects.filter(user=user, role=user.user_type)
+    return MonthlyAppointmentRollup.objects.filter(role='physiotherapist')
+
+
+def add_months(month, offset):
+    """The first day of the month ``offset`` months after ``month``"""
+    index = month.year * 12 + month.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def trends(rollups, last_month, months):
+    """
+    Appointments per status and revenue per payment status for each of the
+    ``months`` months up to ``last_month``, read from the ``rollups`` rows
+    (see ``for_user``). Months without appointments are included.
+    """
+    last_month = month_of(last_month)
+    first_month = add_months(last_month, 1 - months)
+    totals = {
+        month: {
+            'month': month.strftime('%Y-%m'),
+            'total': 0,
+            'statuses': dict.fromkeys(STATUSES, 0),
+            'revenue': dict.fromkeys(PAYMENT_STATUSES, Decimal('0.00')),
+        }
+        for month in (add_months(first_month, offset) for offset in range(months))
+    }
+    rows = rollups.filter(month__range=(first_month, last_month)).values(
+        'month', 'status', 'payment_status'
+    ).annotate(total=Sum('count'), cost=Sum('revenue')).order_by()
+    for row in rows:
+        entry = totals[row['month']]
+        entry['total'] += row['total']
+        entry['statuses'][row['status']] = entry['statuses'].get(row['status'], 0) + row['total']
+        entry['revenue'][row['payment_status']] = entry['revenue'].get(
+            row['payment_status'], Decimal('0.00')
+        ) + row['cost']
+    for entry in totals.values():
+        entry['revenue'] = {status: str(amount) for status, amount in entry['revenue'].items()}
+    return list(totals.values())
@@ -0,0 +1,251 @@
+"""
+Appointment slot engine.
+
+Free slots are derived from each physiotherapist's
+``PhysiotherapistProfile.working_hours`` minus their booked appointments.
+Profiles and appointments for any number of physiotherapists and days are
+read in two queries; the free intervals of every (physiotherapist, day) are
+then found with a sorted sweep over the busy intervals.
+
+``earliest_slots`` finds the first free slots across many physiotherapists
+with a k-way merge (``heapq.merge``) of each one's slots in time order, so
+it stops after the requested number instead of listing every slot.
+
+``working_hours`` maps weekday names (``"monday"`` or ``"mon"``) to the
+shifts worked that day, either one ``{"start": "09:00", "end": "17:00"}``
+object or a list of them. A day that is missing, null or empty is a day off.
+Profiles with no working hours configured fall back to
+``DEFAULT_WORKING_HOURS``; a value that is not an object at all (the field
+is client-writable JSON) means no working hours.
+"""
+
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from authentication.models import User
+
+from .models import Appointment
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Applied to physiotherapists who have not set up their schedule (the old fixed hours)
+DEFAULT_WORKING_HOURS = {day: [{'start': '09:00', 'end': '17:00'}] for day in WEEKDAYS}
+
+# Appointments that occupy the physiotherapist's time
+BLOCKING_STATUSES = ('scheduled', 'confirmed', 'in_progress')
+
+MIN_DURATION = 15
+MAX_DURATION = 240
+MAX_DAYS = 31
+MAX_PHYSIOTHERAPISTS = 50
+MAX_EARLIEST = 50
+
+
+def _parse_time(value):
+    if isinstance(value, time):
+        return value
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _format(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def parse_working_hours(working_hours):
+    """
+    Normalize a ``working_hours`` value to ``{weekday index: [(start, end), ...]}``
+    in minutes since midnight, sorted and with overlapping shifts merged.
+
+    Malformed entries are skipped rather than failing the whole schedule; a
+    value that is not a mapping yields an empty schedule.
+    """
+    if not working_hours:
+        working_hours = DEFAULT_WORKING_HOURS
+    if not isinstance(working_hours, dict):
+        return {}
+
+    schedule = {}
+    for key, shifts in working_hours.items():
+        day = str(key).strip().lower()
+        matches = [index for index, name in enumerate(WEEKDAYS) if name == day or name[:3] == day]
+        if not matches or not shifts:
+            continue
+        if isinstance(shifts, dict):
+            shifts = [shifts]
+        elif not isinstance(shifts, list):
+            continue
+
+        intervals = []
+        for shift in shifts:
+            try:
+                start = _minutes(_parse_time(shift['start']))
+                end = _minutes(_parse_time(shift['end']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if start < end:
+                intervals.append((start, end))
+        schedule[matches[0]] = merge_intervals(intervals)
+    return schedule
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching (start, end) intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_intervals(windows, busy):
+    """
+    Subtract busy intervals from working windows.
+
+    Both lists hold (start, end) minute pairs; ``busy`` must be sorted by
+    start. Runs a single sweep over the two lists.
+    """
+    free = []
+    index = 0
+    for window_start, window_end in windows:
+        cursor = window_start
+        # Skip bookings that end before this window
+        while index < len(busy) and busy[index][1] <= cursor:
+            index += 1
+        scan = index
+        while scan < len(busy) and busy[scan][0] < window_end:
+            busy_start, busy_end = busy[scan]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            scan += 1
+        if cursor < window_end:
+            free.append((cursor, window_end))
+    return free
+
+
+def slots_in(intervals, duration):
+    """Cut free intervals into back-to-back slots of ``duration`` minutes"""
+    slots = []
+    for start, end in intervals:
+        while start + duration <= end:
+            slots.append({
+                'start_time': _format(start),
+                'end_time': _format(start + duration),
+                'display': f'{_format(start)} - {_format(start + duration)}'
+            })
+            start += duration
+    return slots
+
+
+def load_busy(physiotherapist_ids, start_date, end_date):
+    """Booked intervals per (physiotherapist id, date), sorted, in one query"""
+    busy = defaultdict(list)
+    rows = Appointment.objects.filter(
+        physiotherapist_id__in=physiotherapist_ids,
+        date__gte=start_date,
+        date__lte=end_date,
+        status__in=BLOCKING_STATUSES
+    ).values_list('physiotherapist_id', 'date', 'start_time', 'end_time').order_by()
+    for physiotherapist_id, day, start, end in rows:
+        busy[physiotherapist_id, day].append((_minutes(start), _minutes(end)))
+    for intervals in busy.values():
+        intervals.sort()
+    return busy
+
+
+def load_schedules(physiotherapist_ids):
+    """Parsed working hours per physiotherapist id, in one query; unknown ids are left out"""
+    physiotherapists = User.objects.filter(
+        id__in=physiotherapist_ids, user_type='physiotherapist'
+    ).select_related('physiotherapist_profile').only(
+        'id', 'physiotherapist_profile__working_hours'
+    )
+    schedules = {}
+    for physiotherapist in physiotherapists:
+        profile = getattr(physiotherapist, 'physiotherapist_profile', None)
+        schedules[physiotherapist.id] = parse_working_hours(profile and profile.working_hours)
+    return schedules
+
+
+def available_slots(physiotherapist_ids, start_date, end_date, duration=60):
+    """
+    Compute free slots for several physiotherapists over a date range.
+
+    Returns ``{physiotherapist id: {date: [slot, ...]}}`` for every
+    physiotherapist that exists; unknown ids are left out.
+    """
+    schedules = load_schedules(physiotherapist_ids)
+    busy = load_busy(list(schedules), start_date, end_date)
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+    result = {}
+    for physiotherapist_id, schedule in schedules.items():
+        result[physiotherapist_id] = {
+            day: slots_in(
+                free_intervals(schedule.get(day.weekday(), []), busy.get((physiotherapist_id, day), [])),
+                duration
+            )
+            for day in days
+        }
+    return result
+
+
+def _slot_stream(physiotherapist_id, schedule, busy, days, duration, not_before):
+    """One physiotherapist's free slots in time order, as (date, start minute, id)"""
+    for day in days:
+        intervals = free_intervals(schedule.get(day.weekday(), []), busy.get((physiotherapist_id, day), []))
+        for start, end in intervals:
+            while start + duration <= end:
+                if (day, start) >= not_before:
+                    yield day, start, physiotherapist_id
+                start += duration
+
+
+def earliest_slots(schedules, start_date, end_date, duration=60, limit=10, not_before=None):
+    """
+    The ``limit`` earliest free slots of any of ``schedules`` (physiotherapist
+    id -> ``parse_working_hours()`` output) between the two dates, earliest
+    first and ties by physiotherapist id. ``not_before`` is a datetime before
+    which slots are skipped, e.g. now.
+
+    Reads the appointments in one query; the merge holds one pending slot
+    per physiotherapist and only walks as far into the range as it needs.
+    """
+    floor = (start_date, 0)
+    if not_before is not None:
+        floor = (not_before.date(), _minutes(not_before))
+    busy = load_busy(list(schedules), start_date, end_date)
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    streams = [
+        _slot_stream(physiotherapist_id, schedule, busy, days, duration, floor)
+        for physiotherapist_id, schedule in schedules.items()
+    ]
+    return [
+        {
+            'physiotherapist_id': physiotherapist_id,
+            'date': day,
+            'start_time': _format(start),
+            'end_time': _format(start + duration),
+        }
+        for day, start, physiotherapist_id in islice(heapq.merge(*streams), limit)
+    ]
+
+
+def day_slots(physiotherapist_id, day, duration=60):
+    """Free slots of one physiotherapist on one day, or None if they do not exist"""
+    days = available_slots([physiotherapist_id], day, day, duration).get(physiotherapist_id)
+    return None if days is None else days[day]
+
+
+def default_slots(day, duration=60):
+    """Slots of an unbooked day under the default working hours"""
+    return slots_in(parse_working_hours(None).get(day.weekday(), []), duration)
+
@@ -1,15 +1,23 @@
 from rest_framework import serializers
+from core.fastpath import (
+    Column, Computed, DateTime, Nested, Shape, date_repr, decimal_repr, time_repr
+)
+from core.fieldsets import DynamicFieldsMixin
+from datetime import timedelta
 from django.utils import timezone
 from django.db import models
-from .models import Appointment, AppointmentFeedback, AppointmentDocument
-from authentication.serializers import UserSerializer
+from django.db.models.functions import Cast, Floor
+from .booking import FREQUENCIES, MAX_SERIES_OCCURRENCES, SlotUnavailable, book, book_series, occurrences
+from .models import Appointment, AppointmentFeedback, AppointmentDocument, validate_business_hours
+from authentication.models import User
+from authentication.serializers import UserSerializer, USER_SHAPE
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     patient = UserSerializer(read_only=True)
     physiotherapist = UserSerializer(read_only=True)
-    duration = serializers.ReadOnlyField()
-    is_upcoming = serializers.ReadOnlyField()
-    can_be_cancelled = serializers.ReadOnlyField()
+    duration = serializers.SerializerMethodField()
+    is_upcoming = serializers.SerializerMethodField()
+    can_be_cancelled = serializers.SerializerMethodField()
     feedback = serializers.SerializerMethodField()
     
     class Meta:
@@ -27,12 +35,116 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'can_be_cancelled', 'feedback'
         ]
     
+    # The with_schedule() annotations when the queryset has them, else the model properties
+
+    def get_duration(self, obj):
+        return obj.duration_minutes if hasattr(obj, 'duration_minutes') else obj.duration
+
+    def get_is_upcoming(self, obj):
+        return obj.upcoming if hasattr(obj, 'upcoming') else obj.is_upcoming
+
+    def get_can_be_cancelled(self, obj):
+        return obj.cancellable if hasattr(obj, 'cancellable') else obj.can_be_cancelled
+
     def get_feedback(self, obj):
         """Get appointment feedback if exists"""
-        try:
-            return AppointmentFeedbackSerializer(obj.feedback).data
-        except AppointmentFeedback.DoesNotExist:
+        descriptor = Appointment.feedback
+        if descriptor.is_cached(obj):
+            # select_related('feedback') caches None for appointments without any,
+            # which obj.feedback would raise DoesNotExist for
+            feedback = descriptor.related.get_cached_value(obj)
+        else:
+            feedback = getattr(obj, 'feedback', None)
+        if feedback is None:
             return None
+        return self.nested_serializer(AppointmentFeedbackSerializer, 'feedback', feedback).data
+
+class _Seconds(models.Func):
+    """
+    Seconds since midnight of a TimeField. Django's Extract* functions run as
+    Python callbacks on SQLite, which cost more than the property they replace.
+    """
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = models.FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # julianday() of a bare time counts from 2000-01-01; time() drops fractions of a second
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(ROUND((julianday(time(%(expressions)s)) - 2451544.5) * 86400) AS INTEGER)',
+            **extra_context
+        )
+
+def _starts_after(moment):
+    """Appointments whose start, in the current time zone, is after ``moment``"""
+    moment = timezone.localtime(moment)
+    return models.Q(date__gt=moment.date()) | models.Q(date=moment.date(), start_time__gt=moment.time())
+
+def with_schedule(queryset):
+    """
+    Annotate what the Appointment ``duration``, ``is_upcoming`` and
+    ``can_be_cancelled`` properties compute, for AppointmentSerializer and
+    APPOINTMENT_SHAPE to read instead of combining dates row by row.
+    """
+    now = timezone.now()
+    return queryset.annotate(
+        duration_minutes=Cast(
+            Floor((_Seconds('end_time') - _Seconds('start_time')) / 60), models.IntegerField()
+        ),
+        upcoming=models.ExpressionWrapper(_starts_after(now), output_field=models.BooleanField()),
+        cancellable=models.ExpressionWrapper(
+            _starts_after(now + timedelta(hours=24)), output_field=models.BooleanField()
+        ),
+    )
+
+FEEDBACK_SHAPE = Shape([
+    ('id', 'id'),
+    ('appointment', 'appointment'),
+    ('rating', 'rating'),
+    ('punctuality_rating', 'punctuality_rating'),
+    ('professionalism_rating', 'professionalism_rating'),
+    ('treatment_effectiveness', 'treatment_effectiveness'),
+    ('comments', 'comments'),
+    ('would_recommend', 'would_recommend'),
+    ('average_rating', Computed(
+        lambda context, *ratings: sum(ratings) / len(ratings),
+        'rating', 'punctuality_rating', 'professionalism_rating', 'treatment_effectiveness'
+    )),
+    ('created_at', DateTime('created_at')),
+    ('updated_at', DateTime('updated_at')),
+])
+
+# AppointmentSerializer output for core.fastpath list endpoints; keep the two in step.
+# Reads the with_schedule() annotations.
+APPOINTMENT_SHAPE = Shape([
+    ('id', 'id'),
+    ('patient', Nested(USER_SHAPE, 'patient')),
+    ('physiotherapist', Nested(USER_SHAPE, 'physiotherapist')),
+    ('date', Column('date', date_repr)),
+    ('start_time', Column('start_time', time_repr)),
+    ('end_time', Column('end_time', time_repr)),
+    ('status', 'status'),
+    ('appointment_type', 'appointment_type'),
+    ('reason', 'reason'),
+    ('symptoms', 'symptoms'),
+    ('notes', 'notes'),
+    ('treatment_plan', 'treatment_plan'),
+    ('prescription', 'prescription'),
+    ('next_appointment_recommended', 'next_appointment_recommended'),
+    ('cost', Column('cost', decimal_repr(2))),
+    ('payment_status', 'payment_status'),
+    ('reminder_sent', 'reminder_sent'),
+    ('cancelled_by', 'cancelled_by'),
+    ('cancellation_reason', 'cancellation_reason'),
+    ('duration', 'duration_minutes'),
+    ('is_upcoming', 'upcoming'),
+    ('can_be_cancelled', 'cancellable'),
+    ('feedback', Nested(FEEDBACK_SHAPE, 'feedback', nullable=True)),
+    ('created_at', DateTime('created_at')),
+    ('updated_at', DateTime('updated_at')),
+])
+
+SLOT_UNAVAILABLE = "Physiotherapist is not available at this time. Please choose a different time slot."
 
 class AppointmentCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,7 +178,7 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         start_time = data['start_time']
         end_time = data['end_time']
         
-        # Check physiotherapist availability
+        # Check physiotherapist availability (early rejection; book() re-checks under the lock)
         conflicting_appointments = Appointment.objects.filter(
             physiotherapist=physiotherapist,
             date=date,
@@ -76,16 +188,92 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         )
         
         if conflicting_appointments.exists():
-            raise serializers.ValidationError(
-                "Physiotherapist is not available at this time. Please choose a different time slot."
-            )
+            raise serializers.ValidationError(SLOT_UNAVAILABLE)
         
         return data
     
     def create(self, validated_data):
         """Create appointment with patient as current user"""
         validated_data['patient'] = self.context['request'].user
-        return super().create(validated_data)
+        try:
+            return book(Appointment(**validated_data))
+        except SlotUnavailable:
+            raise serializers.ValidationError(SLOT_UNAVAILABLE)
+
+class AppointmentSeriesSerializer(serializers.Serializer):
+    """
+    A weekly or biweekly series of appointments at the same time, ending
+    after ``count`` sessions or on ``until``. Patients book for themselves;
+    physiotherapists book their own sessions for a ``patient``.
+    """
+    physiotherapist = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(user_type='physiotherapist'), required=False
+    )
+    patient = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(user_type='patient'), required=False
+    )
+    start_date = serializers.DateField()
+    start_time = serializers.TimeField(validators=[validate_business_hours])
+    end_time = serializers.TimeField()
+    frequency = serializers.ChoiceField(choices=sorted(FREQUENCIES))
+    count = serializers.IntegerField(min_value=1, max_value=MAX_SERIES_OCCURRENCES, required=False)
+    until = serializers.DateField(required=False)
+    appointment_type = serializers.ChoiceField(choices=Appointment.APPOINTMENT_TYPE_CHOICES, default='therapy')
+    reason = serializers.CharField()
+    symptoms = serializers.CharField(required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_start_date(self, value):
+        if value < timezone.now().date():
+            raise serializers.ValidationError("Appointment date cannot be in the past.")
+        return value
+
+    def validate(self, data):
+        user = self.context['request'].user
+        if user.user_type == 'patient':
+            data['patient'] = user
+        elif user.user_type == 'physiotherapist':
+            if data.setdefault('physiotherapist', user) != user:
+                raise serializers.ValidationError("You can only book series of your own appointments.")
+        if 'physiotherapist' not in data:
+            raise serializers.ValidationError({'physiotherapist': 'This field is required.'})
+        if 'patient' not in data:
+            raise serializers.ValidationError({'patient': 'This field is required.'})
+
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("End time must be after start time.")
+        if ('count' in data) == ('until' in data):
+            raise serializers.ValidationError("Give either count or until.")
+
+        days = occurrences(data['start_date'], data['frequency'], data.get('count'), data.get('until'))
+        if not days:
+            raise serializers.ValidationError("The series has no sessions before the until date.")
+        if len(days) > MAX_SERIES_OCCURRENCES:
+            raise serializers.ValidationError(f"A series can have at most {MAX_SERIES_OCCURRENCES} sessions.")
+        if days[-1] > timezone.now().date() + timezone.timedelta(days=180):
+            raise serializers.ValidationError("Appointment date cannot be more than 6 months in the future.")
+        data['days'] = days
+        return data
+
+    def create(self, validated_data):
+        """Book every free occurrence; returns the per-occurrence results"""
+        fields = {
+            name: validated_data[name] for name in (
+                'physiotherapist', 'patient', 'start_time', 'end_time', 'appointment_type', 'reason'
+            )
+        }
+        fields.update(
+            (name, validated_data[name]) for name in ('symptoms', 'notes') if name in validated_data
+        )
+        try:
+            results = book_series(validated_data['days'], **fields)
+        except SlotUnavailable:
+            raise serializers.ValidationError(SLOT_UNAVAILABLE)
+        booked = sum(result['status'] == 'booked' for result in results)
+        return {'booked': booked, 'conflicts': len(results) - booked, 'occurrences': results}
+
+# Changes that can make an appointment overlap another
+SCHEDULE_FIELDS = {'date', 'start_time', 'end_time', 'status'}
 
 class AppointmentUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -124,7 +312,13 @@ class AppointmentUpdateSerializer(serializers.ModelSerializer):
             elif user.user_type == 'physiotherapist':
                 if user != instance.physiotherapist:
                     raise serializers.ValidationError("You can only modify your own appointments.")
-        
+
+        # A partial update may move one end of the slot past the other
+        start_time = data.get('start_time', instance.start_time)
+        end_time = data.get('end_time', instance.end_time)
+        if end_time <= start_time:
+            raise serializers.ValidationError("End time must be after start time.")
+
         return data
     
     def update(self, instance, validated_data):
@@ -135,9 +329,18 @@ class AppointmentUpdateSerializer(serializers.ModelSerializer):
         if validated_data.get('status') == 'cancelled' and instance.status != 'cancelled':
             validated_data['cancelled_by'] = user
         
-        return super().update(instance, validated_data)
+        if not SCHEDULE_FIELDS.intersection(validated_data):
+            return super().update(instance, validated_data)
+        
+        # Moving or reactivating an appointment is a new booking of its slot
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        try:
+            return book(instance)
+        except SlotUnavailable:
+            raise serializers.ValidationError(SLOT_UNAVAILABLE)
 
-class AppointmentFeedbackSerializer(serializers.ModelSerializer):
+class AppointmentFeedbackSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     appointment = serializers.PrimaryKeyRelatedField(read_only=True)
     average_rating = serializers.ReadOnlyField()
     
@@ -173,7 +376,7 @@ class AppointmentFeedbackSerializer(serializers.ModelSerializer):
         
         return data
 
-class AppointmentDocumentSerializer(serializers.ModelSerializer):
+class AppointmentDocumentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     uploaded_by = UserSerializer(read_only=True)
     
     class Meta:
@@ -189,7 +392,7 @@ class AppointmentDocumentSerializer(serializers.ModelSerializer):
         validated_data['uploaded_by'] = self.context['request'].user
         return super().create(validated_data)
 
-class AppointmentListSerializer(serializers.ModelSerializer):
+class AppointmentListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Simplified serializer for appointment lists"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     physiotherapist_name = serializers.CharField(source='physiotherapist.full_name', read_only=True)
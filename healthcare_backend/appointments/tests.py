@@ -1,3 +1,636 @@
-from django.test import TestCase
+import threading
+from importlib import import_module
+from io import StringIO
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import connection
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import PhysiotherapistProfile
+from core.models import ActivityEvent, GlobalCounter, SearchDocument
+from core.testing import QueryBudgetTestCase, create_user
+
+from . import availability, booking, rollups, scheduling
+from .models import (
+    Appointment, AppointmentDocument, AppointmentFeedback, AvailabilityDay, BookingLock, MonthlyAppointmentRollup
+)
+from .serializers import with_schedule
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.user = create_user('budget_patient')
+        self.physiotherapist = create_user('budget_physio', 'physiotherapist')
+
+    def add_appointments(self, number):
+        """Appointments with feedback and a document each, so every relation has rows"""
+        start = timezone.now().date() + timedelta(days=Appointment.objects.count() + 1)
+        for offset in range(number):
+            appointment = Appointment.objects.create(
+                patient=self.user, physiotherapist=self.physiotherapist,
+                date=start + timedelta(days=offset), start_time=time(9), end_time=time(10),
+                reason='Budget'
+            )
+            AppointmentFeedback.objects.create(appointment=appointment, rating=5)
+            AppointmentDocument.objects.create(
+                appointment=appointment, title='Report', file='appointment_documents/report.pdf',
+                uploaded_by=self.physiotherapist
+            )
+
+    def test_appointment_list(self):
+        self.assertQueryBudget(2, '/api/appointments/', self.add_appointments)
+
+    def test_appointment_detail(self):
+        self.assertQueryBudget(1, self.detail_url('/api/appointments/', Appointment), self.add_appointments)
+
+    def test_upcoming_appointments(self):
+        self.assertQueryBudget(1, '/api/appointments/upcoming/', self.add_appointments)
+
+    def test_feedback_list(self):
+        self.assertQueryBudget(2, '/api/appointment-feedback/', self.add_appointments)
+
+    def test_feedback_detail(self):
+        self.assertQueryBudget(
+            1, self.detail_url('/api/appointment-feedback/', AppointmentFeedback), self.add_appointments
+        )
+
+    def test_document_list(self):
+        self.assertQueryBudget(2, '/api/appointment-documents/', self.add_appointments)
+
+    def test_document_detail(self):
+        self.assertQueryBudget(
+            1, self.detail_url('/api/appointment-documents/', AppointmentDocument), self.add_appointments
+        )
+
+
+class ScheduleAnnotationTests(TestCase):
+    """with_schedule() must agree with the model properties it replaces"""
+
+    @classmethod
+    def setUpTestData(cls):
+        patient = create_user('schedule_patient')
+        physiotherapist = create_user('schedule_physio', 'physiotherapist')
+        now = timezone.localtime()
+        starts = [
+            datetime.combine(date(2001, 1, 1), time(9)),
+            datetime.combine(now.date() + timedelta(days=30), time(17, 15, 20)),
+        ]
+        # Either side of now and of the 24 hour cancellation cutoff
+        for base in (now, now + timedelta(hours=24)):
+            for minutes in (-2, 2):
+                starts.append((base + timedelta(minutes=minutes)).replace(tzinfo=None, microsecond=0))
+        for start in starts:
+            Appointment.objects.create(
+                patient=patient, physiotherapist=physiotherapist, date=start.date(),
+                start_time=start.time(), end_time=time(23, 59, 59, 999999), reason='Schedule'
+            )
+        Appointment.objects.filter(date=date(2001, 1, 1)).update(end_time=time(9, 45, 59))
+
+    def assertMatchesProperties(self):
+        for appointment in with_schedule(Appointment.objects.all()):
+            with self.subTest(date=appointment.date, start=appointment.start_time):
+                self.assertEqual(appointment.duration_minutes, appointment.duration)
+                self.assertIs(appointment.upcoming, appointment.is_upcoming)
+                self.assertIs(appointment.cancellable, appointment.can_be_cancelled)
+
+    def test_matches_properties(self):
+        self.assertMatchesProperties()
+
+    def test_matches_properties_in_other_time_zone(self):
+        with timezone.override('Pacific/Kiritimati'):
+            self.assertMatchesProperties()
+
+    def test_list_is_one_query_per_page(self):
+        client = APIClient()
+        client.force_authenticate(Appointment.objects.first().physiotherapist)
+        with self.assertNumQueries(2):  # count, then the page with feedback joined
+            response = client.get('/api/appointments/', {'fields': 'id,duration,is_upcoming,feedback'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel bookings of one slot: exactly one may win"""
+
+    BOOKINGS = 200
+
+    def setUp(self):
+        self.physiotherapist = create_user('booking_physio', 'physiotherapist')
+        self.patients = [create_user(f'booking_patient_{index}') for index in range(self.BOOKINGS)]
+        self.day = timezone.now().date() + timedelta(days=7)
+
+    def book(self, patient, start, end, barrier, results):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(patient)
+        try:
+            barrier.wait()
+            response = client.post('/api/appointments/', {
+                'physiotherapist': self.physiotherapist.pk, 'date': self.day.isoformat(),
+                'start_time': start, 'end_time': end, 'reason': 'Stress test',
+            }, format='json')
+            results.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_one_of_many_parallel_bookings_wins(self):
+        barrier = threading.Barrier(self.BOOKINGS)
+        results = []
+        # Every other request asks for a slot overlapping the first one, not the same one
+        slots = [('10:00', '11:00'), ('10:30', '11:30')]
+        threads = [
+            threading.Thread(target=self.book, args=(patient, *slots[index % 2], barrier, results))
+            for index, patient in enumerate(self.patients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.BOOKINGS)
+        self.assertEqual(results.count(201), 1, results)
+        self.assertEqual(results.count(400), self.BOOKINGS - 1)
+        self.assertEqual(Appointment.objects.filter(physiotherapist=self.physiotherapist).count(), 1)
+        self.assertEqual(BookingLock.objects.count(), 1)
+
+    def test_adjacent_slots_and_reschedules(self):
+        client = APIClient()
+        client.force_authenticate(self.patients[0])
+        for start, end in (('10:00', '11:00'), ('11:00', '12:00')):
+            response = client.post('/api/appointments/', {
+                'physiotherapist': self.physiotherapist.pk, 'date': self.day.isoformat(),
+                'start_time': start, 'end_time': end, 'reason': 'Back to back',
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+
+        client.force_authenticate(self.physiotherapist)
+        first, second = Appointment.objects.order_by('start_time')
+        response = client.patch(f'/api/appointments/{second.pk}/', {'start_time': '10:30'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        second.refresh_from_db()
+        self.assertEqual(second.start_time, time(11))
+
+        # Once the first is cancelled its slot is free again
+        client.patch(f'/api/appointments/{first.pk}/', {'status': 'cancelled'}, format='json')
+        response = client.patch(f'/api/appointments/{second.pk}/', {'start_time': '10:30'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class AppointmentUpdateTests(TestCase):
+
+    def setUp(self):
+        self.physiotherapist = create_user('update_physio', 'physiotherapist')
+        self.appointment = Appointment.objects.create(
+            patient=create_user('update_patient'), physiotherapist=self.physiotherapist,
+            date=timezone.now().date() + timedelta(days=7), start_time=time(10), end_time=time(11),
+            reason='Update'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.physiotherapist)
+
+    def test_partial_update_cannot_invert_the_slot(self):
+        url = f'/api/appointments/{self.appointment.pk}/'
+        for change in ({'start_time': '11:30'}, {'end_time': '09:30'}, {'start_time': '11:00'}):
+            response = self.client.patch(url, change, format='json')
+            self.assertEqual(response.status_code, 400, change)
+        self.appointment.refresh_from_db()
+        self.assertEqual((self.appointment.start_time, self.appointment.end_time), (time(10), time(11)))
+
+        response = self.client.patch(url, {'start_time': '11:30', 'end_time': '12:30'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class SeriesBookingTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('series_patient')
+        self.physiotherapist = create_user('series_physio', 'physiotherapist')
+        # A Monday, so every occurrence falls on a working day
+        today = timezone.now().date()
+        self.start = today + timedelta(days=7 - today.weekday())
+        self.client = APIClient()
+        self.client.force_authenticate(self.physiotherapist)
+
+    def book_series(self, **recurrence):
+        return self.client.post('/api/appointments/series/', {
+            'patient': self.patient.pk, 'start_date': self.start.isoformat(),
+            'start_time': '10:00', 'end_time': '11:00', 'reason': 'Knee rehab', **recurrence,
+        }, format='json')
+
+    def test_books_free_sessions_and_reports_conflicts(self):
+        taken = self.start + timedelta(weeks=2)
+        Appointment.objects.create(
+            patient=create_user('other_patient'), physiotherapist=self.physiotherapist,
+            date=taken, start_time=time(10, 30), end_time=time(11, 30), reason='Existing'
+        )
+        response = self.book_series(frequency='weekly', count=12)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['booked'], 11)
+        self.assertEqual(response.data['conflicts'], 1)
+
+        conflict = response.data['occurrences'][2]
+        self.assertEqual((conflict['date'], conflict['status']), (taken, 'conflict'))
+        # The free hours closest to 10:00 around the 10:30-11:30 appointment
+        self.assertEqual([slot['start_time'] for slot in conflict['alternatives']], ['09:00', '11:30', '12:30'])
+
+        booked = Appointment.objects.filter(patient=self.patient).order_by('date')
+        self.assertEqual(
+            [appointment.pk for appointment in booked],
+            [result['appointment_id'] for result in response.data['occurrences'] if result['status'] == 'booked']
+        )
+        # What the post_save receivers would have done for each row
+        self.assertEqual(GlobalCounter.objects.get(name='appointments.total').value, 12)
+        self.assertEqual(ActivityEvent.objects.filter(user=self.patient).count(), 11)
+        self.assertEqual(SearchDocument.objects.filter(doc_type='appointment').count(), 12)
+
+    def test_query_count_does_not_grow_with_sessions(self):
+        counts = []
+        for count in (2, 12):
+            self.physiotherapist = create_user(f'series_physio_{count}', 'physiotherapist')
+            self.client.force_authenticate(self.physiotherapist)
+            Appointment.objects.create(
+                patient=self.patient, physiotherapist=self.physiotherapist,
+                date=self.start, start_time=time(10), end_time=time(11), reason='Existing'
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.book_series(frequency='biweekly', count=count)
+            self.assertEqual(response.data['booked'], count - 1, response.content)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_until_and_validation(self):
+        response = self.book_series(frequency='biweekly', until=(self.start + timedelta(weeks=5)).isoformat())
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            [result['date'] for result in response.data['occurrences']],
+            [self.start + timedelta(weeks=weeks) for weeks in (0, 2, 4)]
+        )
+
+        response = self.book_series(frequency='weekly', count=3, until=self.start.isoformat())
+        self.assertEqual(response.status_code, 400)
+        response = self.book_series(frequency='weekly', count=30)
+        self.assertEqual(response.status_code, 400)
+
+        # Physiotherapists only book their own sessions
+        other = create_user('series_other_physio', 'physiotherapist')
+        response = self.book_series(frequency='weekly', count=2, physiotherapist=other.pk)
+        self.assertEqual(response.status_code, 400)
+
+
+class AvailabilityBitmapTests(TestCase):
+
+    def setUp(self):
+        today = timezone.now().date()
+        self.tuesday = today + timedelta(days=(1 - today.weekday()) % 7 or 7)
+        self.patient = create_user('availability_patient')
+        # Default hours, 09:00-17:00
+        self.default = create_user('availability_default', 'physiotherapist')
+        self.split = create_user('availability_split', 'physiotherapist')
+        PhysiotherapistProfile.objects.create(user=self.split, license_number='SPLIT', working_hours={
+            'tuesday': [{'start': '08:00', 'end': '12:00'}, {'start': '15:00', 'end': '19:00'}],
+        })
+        self.off = create_user('availability_off', 'physiotherapist')
+        PhysiotherapistProfile.objects.create(user=self.off, license_number='OFF', working_hours={
+            'monday': {'start': '09:00', 'end': '17:00'},
+        })
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def free(self, start, end):
+        return availability.free_physiotherapists(self.tuesday, time(*start), time(*end))
+
+    def test_working_hours(self):
+        self.assertEqual(self.free((9,), (10,)), [self.default.pk, self.split.pk])
+        self.assertEqual(self.free((14,), (15,)), [self.default.pk])
+        self.assertEqual(self.free((17, 30), (18, 45)), [self.split.pk])
+        # 11:50 touches the 11:45 quarter, which is only free for the full 09:00-17:00 day
+        self.assertEqual(self.free((11, 50), (12, 10)), [self.default.pk])
+        self.assertEqual(AvailabilityDay.objects.filter(date=self.tuesday).count(), 3)
+
+    def test_malformed_working_hours_mean_no_hours(self):
+        self.assertEqual(scheduling.parse_working_hours(['monday']), {})
+        self.assertEqual(scheduling.parse_working_hours('09:00-17:00'), {})
+        self.assertEqual(scheduling.parse_working_hours({'tuesday': 9, 'monday': 'all day'}), {})
+
+        # The field is client-writable JSON, so refreshes after a booking must cope with any value
+        PhysiotherapistProfile.objects.filter(user=self.split).update(working_hours=['tuesday'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                patient=self.patient, physiotherapist=self.split, date=self.tuesday,
+                start_time=time(9), end_time=time(10), reason='Malformed hours'
+            )
+        self.assertEqual(self.free((9,), (10,)), [self.default.pk])
+        response = self.client.get('/api/physiotherapists/earliest_available/')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_follows_bookings_cancellations_and_moves(self):
+        self.free((9,), (10,))  # store the day
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/appointments/', {
+                'physiotherapist': self.default.pk, 'date': self.tuesday.isoformat(),
+                'start_time': '09:30', 'end_time': '10:15', 'reason': 'Back pain',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.free((9,), (10,)), [self.split.pk])
+        self.assertEqual(self.free((10, 15), (11,)), [self.default.pk, self.split.pk])
+
+        appointment = Appointment.objects.get()
+        wednesday = self.tuesday + timedelta(days=1)
+        appointment.date = wednesday
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertEqual(self.free((9,), (10,)), [self.default.pk, self.split.pk])
+        self.assertEqual(
+            availability.free_physiotherapists(wednesday, time(9), time(10)), [],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'cancelled'
+            appointment.save()
+        self.assertEqual(availability.free_physiotherapists(wednesday, time(9), time(10)), [self.default.pk])
+
+    def test_working_hours_change_drops_stored_days(self):
+        self.free((9,), (10,))
+        profile = self.split.physiotherapist_profile
+        profile.working_hours = {'tuesday': {'start': '13:00', 'end': '15:00'}}
+        profile.save()
+        self.assertFalse(AvailabilityDay.objects.filter(physiotherapist=self.split).exists())
+        self.assertEqual(self.free((13,), (14,)), [self.default.pk, self.split.pk])
+
+    def test_inactive_and_unavailable_are_not_free(self):
+        self.free((9,), (10,))
+        stored = AvailabilityDay.objects.count()
+        profile = self.split.physiotherapist_profile
+        profile.is_available = False
+        profile.rating = Decimal('4.50')
+        profile.save()
+        # Edits that leave the working hours alone keep the stored days
+        self.assertEqual(AvailabilityDay.objects.count(), stored)
+        self.assertEqual(self.free((9,), (10,)), [self.default.pk])
+
+        self.default.is_active = False
+        self.default.save()
+        response = self.client.get('/api/booking/free-physiotherapists/', {
+            'date': self.tuesday.isoformat(), 'start_time': '09:00', 'end_time': '10:00',
+        })
+        self.assertEqual(response.data['physiotherapists'], [])
+
+        wednesday = self.tuesday + timedelta(days=1)
+        self.assertEqual(availability.free_physiotherapists(wednesday, time(9), time(10)), [])
+        self.assertFalse(AvailabilityDay.objects.filter(
+            date=wednesday, physiotherapist__in=[self.default, self.split]
+        ).exists())
+
+        profile.is_available = True
+        profile.save()
+        self.assertEqual(self.free((9,), (10,)), [self.split.pk])
+
+    def test_endpoint_and_rebuild(self):
+        call_command('rebuild_availability', days=14, stdout=StringIO())
+        self.assertEqual(AvailabilityDay.objects.count(), 3 * 14)
+        with self.assertNumQueries(3):  # missing rows, the bitmap match, names
+            response = self.client.get('/api/booking/free-physiotherapists/', {
+                'date': self.tuesday.isoformat(), 'start_time': '14:00', 'end_time': '15:00',
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['physiotherapists']], [self.default.pk])
+        response = self.client.get('/api/booking/free-physiotherapists/', {'date': self.tuesday.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+
+class AvailableSlotsTests(TestCase):
+
+    def setUp(self):
+        today = timezone.now().date()
+        self.tuesday = today + timedelta(days=(1 - today.weekday()) % 7 or 7)
+        self.wednesday = self.tuesday + timedelta(days=1)
+        self.patient = create_user('slots_patient')
+        self.default = create_user('slots_default', 'physiotherapist')
+        self.split = create_user('slots_split', 'physiotherapist')
+        PhysiotherapistProfile.objects.create(user=self.split, license_number='SLOTS', working_hours={
+            'tuesday': [{'start': '08:00', 'end': '12:00'}, {'start': '15:00', 'end': '19:00'}],
+        })
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def book(self, start, end, status='scheduled', day=None):
+        return Appointment.objects.create(
+            patient=self.patient, physiotherapist=self.default, date=day or self.tuesday,
+            start_time=time(*start), end_time=time(*end), status=status, reason='Slots'
+        )
+
+    def starts(self, slots):
+        return [slot['start_time'] for slot in slots]
+
+    def test_free_intervals(self):
+        windows = [(480, 720), (900, 1140)]
+        busy = [
+            (400, 500),  # starts before the window
+            (600, 660), (650, 700),  # overlapping
+            (720, 900),  # touches both windows
+            (1100, 1200),  # runs past the window
+        ]
+        self.assertEqual(scheduling.free_intervals(windows, busy), [(500, 600), (700, 720), (900, 1100)])
+        # A booking spanning the gap between two windows trims both
+        self.assertEqual(scheduling.free_intervals([(480, 600), (660, 780)], [(540, 700)]), [(480, 540), (700, 780)])
+        self.assertEqual(scheduling.free_intervals([(480, 600)], [(300, 400), (700, 800)]), [(480, 600)])
+        self.assertEqual(scheduling.free_intervals([(480, 600)], [(480, 600)]), [])
+        self.assertEqual(scheduling.free_intervals([], [(480, 600)]), [])
+
+    def test_available_slots(self):
+        self.book((10,), (11, 30))
+        self.book((13,), (14,), status='cancelled')
+        unknown = self.split.pk + 100
+
+        with self.assertNumQueries(2):  # working hours, bookings
+            slots = scheduling.available_slots(
+                [self.default.pk, self.split.pk, unknown], self.tuesday, self.wednesday
+            )
+        self.assertEqual(set(slots), {self.default.pk, self.split.pk})
+        self.assertEqual(
+            self.starts(slots[self.default.pk][self.tuesday]),
+            ['09:00', '11:30', '12:30', '13:30', '14:30', '15:30']
+        )
+        self.assertEqual(len(slots[self.default.pk][self.wednesday]), 8)
+        self.assertEqual(
+            self.starts(slots[self.split.pk][self.tuesday]),
+            ['08:00', '09:00', '10:00', '11:00', '15:00', '16:00', '17:00', '18:00']
+        )
+        self.assertEqual(slots[self.split.pk][self.wednesday], [])
+
+        slots = scheduling.available_slots([self.split.pk], self.tuesday, self.tuesday, duration=150)
+        self.assertEqual(slots[self.split.pk][self.tuesday], [
+            {'start_time': '08:00', 'end_time': '10:30', 'display': '08:00 - 10:30'},
+            {'start_time': '15:00', 'end_time': '17:30', 'display': '15:00 - 17:30'},
+        ])
+
+    def test_range_endpoint(self):
+        self.book((9,), (10,), day=self.wednesday)
+        response = self.client.get('/api/booking/available-slots/', {
+            'physiotherapist_ids': f'{self.split.pk},{self.default.pk},{self.split.pk}',
+            'start': self.tuesday.isoformat(), 'end': self.wednesday.isoformat(), 'duration': 45,
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['duration'], 45)
+        physiotherapists = response.data['physiotherapists']
+        self.assertEqual([entry['physiotherapist_id'] for entry in physiotherapists], [self.default.pk, self.split.pk])
+        default_days, split_days = (entry['days'] for entry in physiotherapists)
+        self.assertEqual([day['date'] for day in default_days], [self.tuesday, self.wednesday])
+        self.assertEqual(len(default_days[0]['slots']), 10)
+        self.assertEqual(self.starts(default_days[1]['slots'])[:2], ['10:00', '10:45'])
+        self.assertEqual(self.starts(split_days[0]['slots']), [
+            '08:00', '08:45', '09:30', '10:15', '11:00', '15:00', '15:45', '16:30', '17:15', '18:00'
+        ])
+        self.assertEqual(split_days[1]['slots'], [])
+
+        # Without ``end`` the range is the start day
+        response = self.client.get('/api/booking/available-slots/', {
+            'physiotherapist_ids': str(self.default.pk), 'start': self.tuesday.isoformat(),
+        })
+        self.assertEqual([day['date'] for day in response.data['physiotherapists'][0]['days']], [self.tuesday])
+
+    def test_single_day_endpoint(self):
+        self.book((9,), (10,))
+        response = self.client.get('/api/booking/available-slots/', {
+            'physiotherapist_id': self.default.pk, 'date': self.tuesday.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.starts(response.data)[0], '10:00')
+
+    def test_bad_parameters(self):
+        tuesday = self.tuesday.isoformat()
+        cases = [
+            ({'physiotherapist_id': self.default.pk, 'date': '31-01-2025'}, 'Invalid date format'),
+            ({'physiotherapist_id': 'abc', 'date': tuesday}, 'physiotherapist_id must be an integer'),
+            ({'physiotherapist_ids': f'{self.default.pk},x', 'start': tuesday}, 'physiotherapist_ids'),
+            ({'physiotherapist_ids': str(self.default.pk), 'start': 'tomorrow'}, 'Invalid date format'),
+            ({'physiotherapist_ids': ',', 'start': tuesday}, 'Provide between'),
+            ({'physiotherapist_ids': ','.join(str(pk) for pk in range(1, 52)), 'start': tuesday}, 'Provide between'),
+            ({'physiotherapist_ids': str(self.default.pk), 'start': tuesday,
+              'end': (self.tuesday - timedelta(days=1)).isoformat()}, 'end must be'),
+            ({'physiotherapist_ids': str(self.default.pk), 'start': tuesday,
+              'end': (self.tuesday + timedelta(days=31)).isoformat()}, 'end must be'),
+            ({'physiotherapist_ids': str(self.default.pk), 'start': tuesday, 'duration': 10}, 'duration'),
+            ({'physiotherapist_ids': str(self.default.pk), 'start': tuesday, 'duration': 'long'}, 'duration'),
+            ({'date': tuesday}, 'are required'),
+        ]
+        for params, message in cases:
+            with self.subTest(params=params):
+                response = self.client.get('/api/booking/available-slots/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.data['error'])
+
+
+class StatisticsAndRollupTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('stats_patient')
+        self.physiotherapist = create_user('stats_physio', 'physiotherapist')
+        PhysiotherapistProfile.objects.create(user=self.physiotherapist, license_number='STATS')
+        self.this_month = timezone.now().date().replace(day=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.physiotherapist)
+
+    def appointment(self, day, hour=9, patient=None, **fields):
+        return Appointment.objects.create(
+            patient=patient or self.patient, physiotherapist=self.physiotherapist, date=day,
+            start_time=time(hour), end_time=time(hour, 45), reason='Statistics', **fields
+        )
+
+    def stored_rows(self):
+        return set(MonthlyAppointmentRollup.objects.filter(count__gt=0).values_list(
+            'user_id', 'role', 'month', 'status', 'payment_status', 'count', 'revenue'
+        ))
+
+    def test_statistics_in_one_query(self):
+        self.appointment(self.this_month - timedelta(days=1), status='completed')
+        self.appointment(self.this_month, status='completed')
+        self.appointment(self.this_month, hour=11, status='cancelled', patient=create_user('stats_other'))
+
+        today = timezone.now().date()
+        week_start = today - timedelta(days=today.weekday())
+        this_week = Appointment.objects.filter(date__range=[week_start, week_start + timedelta(days=6)]).count()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/appointments/statistics/')
+        self.assertEqual(response.data, {
+            'total': 3, 'scheduled': 0, 'confirmed': 0, 'completed': 2, 'cancelled': 1, 'no_show': 0,
+            'current_month': 2, 'current_week': this_week,
+        })
+
+        with self.assertNumQueries(2):  # the profile, then the aggregate
+            response = self.client.get('/api/physiotherapists/statistics/')
+        self.assertEqual(response.data['total_appointments'], 3)
+        self.assertEqual(response.data['completed_appointments'], 2)
+        self.assertEqual(response.data['current_month_appointments'], 2)
+        self.assertEqual(response.data['unique_patients'], 2)
+
+    def test_rollups_follow_saves_deletes_and_series(self):
+        next_month = rollups.add_months(self.this_month, 1)
+        moved = self.appointment(self.this_month, cost=50)
+        paid = self.appointment(self.this_month + timedelta(days=1), cost=70)
+        paid.status, paid.payment_status = 'completed', 'paid'
+        paid.save()
+        moved.date = next_month
+        moved.save()
+        self.appointment(next_month, hour=11, cost=30).delete()
+        today = timezone.now().date()
+        booking.book_series(
+            booking.occurrences(today + timedelta(days=7 - today.weekday()), 'weekly', count=8),
+            patient=self.patient, physiotherapist=self.physiotherapist,
+            start_time=time(14), end_time=time(15), reason='Series', cost=40
+        )
+
+        self.assertIn(
+            (self.physiotherapist.pk, 'physiotherapist', self.this_month, 'completed', 'paid', 1, Decimal('70.00')),
+            self.stored_rows()
+        )
+        stored = self.stored_rows()
+        rollups.rebuild()
+        self.assertEqual(stored, self.stored_rows())
+
+    def test_migration_builds_rollups_for_existing_appointments(self):
+        self.appointment(self.this_month, cost=50, status='completed', payment_status='paid')
+        self.appointment(self.this_month, hour=11, cost=20, patient=create_user('stats_migrated'))
+        self.appointment(rollups.add_months(self.this_month, -2), cost=35)
+        expected = self.stored_rows()
+        MonthlyAppointmentRollup.objects.all().delete()
+
+        import_module('appointments.migrations.0006_monthly_rollups').build_rollups(apps, None)
+
+        self.assertEqual(self.stored_rows(), expected)
+
+    def test_trends(self):
+        previous_month = rollups.add_months(self.this_month, -1)
+        self.appointment(previous_month, cost=50, status='completed', payment_status='paid')
+        self.appointment(previous_month, hour=11, cost=20, status='cancelled', patient=create_user('trend_other'))
+        self.appointment(rollups.add_months(self.this_month, -5), cost=99)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/appointments/trends/?months=3')
+        self.assertEqual(response.status_code, 200)
+        months = response.data['months']
+        self.assertEqual([entry['month'] for entry in months], [
+            f'{month:%Y-%m}' for month in (rollups.add_months(self.this_month, -2), previous_month, self.this_month)
+        ])
+        self.assertEqual(months[1]['total'], 2)
+        self.assertEqual(months[1]['statuses']['completed'], 1)
+        self.assertEqual(months[1]['statuses']['cancelled'], 1)
+        self.assertEqual(months[1]['revenue'], {
+            'pending': '20.00', 'paid': '50.00', 'partial': '0.00', 'refunded': '0.00'
+        })
+        self.assertEqual(months[2]['total'], 0)
+
+        # A patient only sees their own appointments
+        self.client.force_authenticate(self.patient)
+        months = self.client.get('/api/appointments/trends/?months=3').data['months']
+        self.assertEqual(months[1]['total'], 1)
+
+        self.assertEqual(self.client.get('/api/appointments/trends/?months=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/appointments/trends/?months=x').status_code, 400)
 
-# Create your tests here.
@@ -5,30 +5,44 @@ from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.db.models import Q, Count, Avg
 from datetime import datetime, timedelta
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetsMixin
+from core.prefetch import NOTHING, PrefetchPlan, PrefetchPlanMixin
+from . import rollups
 from .models import Appointment, AppointmentFeedback, AppointmentDocument
 from .serializers import (
-    AppointmentSerializer, AppointmentCreateSerializer, AppointmentUpdateSerializer,
-    AppointmentFeedbackSerializer, AppointmentDocumentSerializer
+    AppointmentSerializer, AppointmentCreateSerializer, AppointmentSeriesSerializer, AppointmentUpdateSerializer,
+    AppointmentFeedbackSerializer, AppointmentDocumentSerializer, APPOINTMENT_SHAPE, with_schedule
 )
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(PrefetchPlanMixin, FastListMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointments with CRUD operations
     """
     permission_classes = [IsAuthenticated]
+    fast_shape = APPOINTMENT_SHAPE
+    prefetch_plans = {
+        # feedback is a reverse one-to-one, so it joins like a foreign key
+        'default': PrefetchPlan(select_related=['patient', 'physiotherapist', 'feedback']),
+        'destroy': NOTHING,
+        'series': NOTHING,
+        'statistics': NOTHING,
+        'trends': NOTHING,
+    }
     
     def get_serializer_class(self):
         if self.action == 'create':
             return AppointmentCreateSerializer
+        elif self.action == 'series':
+            return AppointmentSeriesSerializer
         elif self.action in ['update', 'partial_update']:
             return AppointmentUpdateSerializer
         return AppointmentSerializer
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Appointment.objects.select_related(
-            'patient', 'physiotherapist', 'cancelled_by'
-        ).prefetch_related('documents', 'feedback')
+        # Duration and the upcoming/cancellable flags are computed in SQL
+        queryset = with_schedule(self.plan_queryset(Appointment.objects.all()))
         
         if user.user_type == 'patient':
             queryset = queryset.filter(patient=user)
@@ -56,6 +70,17 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         else:
             serializer.save()
     
+    @action(detail=False, methods=['post'])
+    def series(self, request):
+        """Book a recurring series; clashing sessions are reported with alternative slots"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(
+            result,
+            status=status.HTTP_201_CREATED if result['booked'] else status.HTTP_400_BAD_REQUEST
+        )
+    
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
         """Get upcoming appointments"""
@@ -68,16 +93,14 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             Q(date=today, start_time__gt=current_time)
         ).filter(status__in=['scheduled', 'confirmed'])
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(self.fast_data(queryset))
     
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Get today's appointments"""
         today = timezone.now().date()
         queryset = self.get_queryset().filter(date=today)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(self.fast_data(queryset))
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -139,46 +162,51 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get appointment statistics"""
-        queryset = self.get_queryset()
-        
-        stats = {
-            'total': queryset.count(),
-            'scheduled': queryset.filter(status='scheduled').count(),
-            'confirmed': queryset.filter(status='confirmed').count(),
-            'completed': queryset.filter(status='completed').count(),
-            'cancelled': queryset.filter(status='cancelled').count(),
-            'no_show': queryset.filter(status='no_show').count(),
-        }
-        
-        # Monthly statistics
-        now = timezone.now()
-        current_month = queryset.filter(
-            date__year=now.year,
-            date__month=now.month
+        today = timezone.now().date()
+        month_start = today.replace(day=1)
+        week_start = today - timedelta(days=today.weekday())
+        
+        # One conditional aggregate; date ranges rather than year/month lookups keep the date index usable
+        figures = {'total': Count('id')}
+        figures.update({
+            status_value: Count('id', filter=Q(status=status_value))
+            for status_value in ('scheduled', 'confirmed', 'completed', 'cancelled', 'no_show')
+        })
+        figures['current_month'] = Count(
+            'id', filter=Q(date__range=[month_start, rollups.add_months(month_start, 1) - timedelta(days=1)])
         )
-        stats['current_month'] = current_month.count()
+        figures['current_week'] = Count('id', filter=Q(date__range=[week_start, week_start + timedelta(days=6)]))
         
-        # Weekly statistics
-        week_start = now.date() - timedelta(days=now.weekday())
-        week_end = week_start + timedelta(days=6)
-        stats['current_week'] = queryset.filter(
-            date__range=[week_start, week_end]
-        ).count()
+        return Response(self.get_queryset().aggregate(**figures))
+    
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        """Monthly appointment counts by status and revenue by payment status, from the rollups"""
+        try:
+            months = int(request.query_params.get('months', 12))
+        except ValueError:
+            return Response({'error': 'months must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= months <= rollups.MAX_MONTHS:
+            return Response(
+                {'error': f'months must be between 1 and {rollups.MAX_MONTHS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response(stats)
+        rows = rollups.for_user(request.user)
+        return Response({'months': rollups.trends(rows, timezone.now().date(), months)})
 
-class AppointmentFeedbackViewSet(viewsets.ModelViewSet):
+class AppointmentFeedbackViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointment feedback
     """
     serializer_class = AppointmentFeedbackSerializer
     permission_classes = [IsAuthenticated]
+    # The serializer reads nothing beyond the row (the appointment is rendered as its id)
+    prefetch_plans = {'default': NOTHING}
     
     def get_queryset(self):
         user = self.request.user
-        queryset = AppointmentFeedback.objects.select_related(
-            'appointment__patient', 'appointment__physiotherapist'
-        )
+        queryset = self.plan_queryset(AppointmentFeedback.objects.all())
         
         if user.user_type == 'patient':
             queryset = queryset.filter(appointment__patient=user)
@@ -202,18 +230,20 @@ class AppointmentFeedbackViewSet(viewsets.ModelViewSet):
         
         serializer.save()
 
-class AppointmentDocumentViewSet(viewsets.ModelViewSet):
+class AppointmentDocumentViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointment documents
     """
     serializer_class = AppointmentDocumentSerializer
     permission_classes = [IsAuthenticated]
+    prefetch_plans = {
+        'default': PrefetchPlan(select_related=['uploaded_by']),
+        'destroy': NOTHING,
+    }
     
     def get_queryset(self):
         user = self.request.user
-        queryset = AppointmentDocument.objects.select_related(
-            'appointment__patient', 'appointment__physiotherapist', 'uploaded_by'
-        )
+        queryset = self.plan_queryset(AppointmentDocument.objects.all())
         
         if user.user_type == 'patient':
             queryset = queryset.filter(appointment__patient=user)
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from core.fastpath import Column, Computed, DateTime, FileURL, Shape, date_repr
+from core.fieldsets import DynamicFieldsMixin
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
@@ -6,7 +8,7 @@ from .models import PatientProfile, PhysiotherapistProfile, validate_strong_pass
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     full_name = serializers.ReadOnlyField()
     is_patient = serializers.ReadOnlyField()
     is_physiotherapist = serializers.ReadOnlyField()
@@ -30,7 +32,29 @@ class UserSerializer(serializers.ModelSerializer):
             'email': {'required': True},
         }
 
-class UserDetailSerializer(serializers.ModelSerializer):
+# UserSerializer output for core.fastpath list endpoints; keep the two in step
+USER_SHAPE = Shape([
+    ('id', 'id'),
+    ('username', 'username'),
+    ('email', 'email'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('full_name', Computed(lambda context, first, last: f"{first} {last}".strip(), 'first_name', 'last_name')),
+    ('user_type', 'user_type'),
+    ('phone_number', 'phone_number'),
+    ('date_of_birth', Column('date_of_birth', date_repr)),
+    ('address', 'address'),
+    ('profile_picture', FileURL('profile_picture', User._meta.get_field('profile_picture').storage)),
+    ('is_verified', 'is_verified'),
+    ('is_active_session', 'is_active_session'),
+    ('is_patient', Computed(lambda context, user_type: user_type == 'patient', 'user_type')),
+    ('is_physiotherapist', Computed(lambda context, user_type: user_type == 'physiotherapist', 'user_type')),
+    ('is_admin_user', Computed(lambda context, user_type: user_type == 'admin', 'user_type')),
+    ('created_at', DateTime('created_at')),
+    ('updated_at', DateTime('updated_at')),
+])
+
+class UserDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Detailed user serializer with profile information"""
     patient_profile = serializers.SerializerMethodField()
     physiotherapist_profile = serializers.SerializerMethodField()
@@ -57,7 +81,7 @@ class UserDetailSerializer(serializers.ModelSerializer):
             return PhysiotherapistProfileSerializer(obj.physiotherapist_profile).data
         return None
 
-class PatientProfileSerializer(serializers.ModelSerializer):
+class PatientProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     bmi = serializers.SerializerMethodField()
     
@@ -79,7 +103,7 @@ class PatientProfileSerializer(serializers.ModelSerializer):
             return round(float(obj.weight) / (height_m ** 2), 2)
         return None
 
-class PhysiotherapistProfileSerializer(serializers.ModelSerializer):
+class PhysiotherapistProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     specialization_display = serializers.ReadOnlyField()
     
@@ -1,3 +1,127 @@
-from django.test import TestCase
+from datetime import time, timedelta
+from itertools import count
 
-# Create your tests here.
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from appointments.models import Appointment
+from core.testing import QueryBudgetTestCase, create_user
+
+from .models import PatientProfile, PhysiotherapistProfile
+
+_serial = count()
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.user = create_user('budget_admin', 'admin', is_staff=True)
+        self.patient = create_user('budget_patient')
+
+    def add_patients(self, number):
+        for _ in range(number):
+            PatientProfile.objects.create(user=create_user(f'budget_patient_{next(_serial)}'))
+
+    def add_physiotherapists(self, number):
+        for _ in range(number):
+            index = next(_serial)
+            PhysiotherapistProfile.objects.create(
+                user=create_user(f'budget_physio_{index}', 'physiotherapist'),
+                license_number=f'LIC-{index}'
+            )
+
+    def test_user_list(self):
+        self.assertQueryBudget(2, '/api/users/', self.add_patients)
+
+    def test_user_detail(self):
+        self.assertQueryBudget(1, f'/api/users/{self.patient.pk}/', self.add_patients)
+
+    def test_patient_list(self):
+        self.assertQueryBudget(2, '/api/patients/', self.add_patients)
+
+    def test_patient_detail(self):
+        self.assertQueryBudget(1, self.detail_url('/api/patients/', PatientProfile), self.add_patients)
+
+    def test_physiotherapist_list(self):
+        self.assertQueryBudget(2, '/api/physiotherapists/', self.add_physiotherapists, user=self.patient)
+
+    def test_physiotherapist_detail(self):
+        self.assertQueryBudget(
+            1, self.detail_url('/api/physiotherapists/', PhysiotherapistProfile), self.add_physiotherapists,
+            user=self.patient
+        )
+
+    def test_available_physiotherapist_list(self):
+        self.assertQueryBudget(2, '/api/auth/physiotherapists/', self.add_physiotherapists, user=self.patient)
+
+    def test_own_patient_profile(self):
+        PatientProfile.objects.create(user=self.patient)
+        self.assertQueryBudget(1, '/api/auth/patient-profile/', self.add_patients, user=self.patient)
+
+    def test_own_physiotherapist_profile(self):
+        physiotherapist = create_user('budget_own_physio', 'physiotherapist')
+        PhysiotherapistProfile.objects.create(user=physiotherapist, license_number='LIC-OWN')
+        self.assertQueryBudget(
+            1, '/api/auth/physiotherapist-profile/', self.add_physiotherapists, user=physiotherapist
+        )
+
+
+class EarliestAvailableTests(APITestCase):
+
+    def setUp(self):
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.patient = create_user('earliest_patient')
+        self.spanish = self.physiotherapist('spanish', ['orthopedic'], ['Spanish', 'English'], fee=60)
+        self.early = self.physiotherapist(
+            'early', ['orthopedic'], ['spanish'], fee=120, working_hours={'monday': {'start': '08:00', 'end': '09:00'}}
+        )
+        self.physiotherapist('english', ['orthopedic'], ['English'])
+        self.physiotherapist('neuro', ['neurological'], ['Spanish'])
+        # Contains "orthopedic" as text but is not that specialization
+        self.physiotherapist('paediatric', ['pediatric_orthopedic'], ['Spanish'])
+        Appointment.objects.create(
+            patient=self.patient, physiotherapist=self.spanish, date=self.monday,
+            start_time=time(9), end_time=time(11), reason='Existing'
+        )
+        self.client.force_authenticate(self.patient)
+
+    def physiotherapist(self, name, specializations, languages, fee=50, working_hours=None):
+        user = create_user(f'earliest_{name}', 'physiotherapist')
+        PhysiotherapistProfile.objects.create(
+            user=user, license_number=f'EARLY-{name}', specializations=specializations,
+            languages_spoken=languages, consultation_fee=fee, working_hours=working_hours or {}
+        )
+        return user
+
+    def earliest(self, **params):
+        response = self.client.get('/api/physiotherapists/earliest_available/', {
+            'specialization': 'orthopedic', 'language': 'Spanish',
+            'start': self.monday.isoformat(), 'limit': 3, **params,
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(slot['physiotherapist_id'], slot['date'], slot['start_time']) for slot in response.data['slots']]
+
+    def test_merges_slots_of_matching_physiotherapists(self):
+        with self.assertNumQueries(2):  # profiles, then their appointments
+            slots = self.earliest()
+        self.assertEqual(slots, [
+            (self.early.pk, self.monday, '08:00'),
+            (self.spanish.pk, self.monday, '11:00'),
+            (self.spanish.pk, self.monday, '12:00'),
+        ])
+        self.assertEqual(self.earliest(max_fee=100, limit=1), [(self.spanish.pk, self.monday, '11:00')])
+
+    def test_runs_across_days(self):
+        slots = self.earliest(limit=12, duration=120)
+        # Two hours do not fit the 08:00-09:00 shift; after Monday's 11:00, 13:00
+        # and 15:00 comes Tuesday under the default hours
+        self.assertEqual([slot[2] for slot in slots[:4]], ['11:00', '13:00', '15:00', '09:00'])
+        self.assertEqual(slots[3][1], self.monday + timedelta(days=1))
+        self.assertEqual({slot[0] for slot in slots}, {self.spanish.pk})
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'days': 0}, {'limit': 'many'}, {'start': '2000-01-01'}, {'max_fee': 'cheap'},
+                       {'max_fee': 'nan'}, {'min_rating': 'inf'}, {'max_fee': '-Infinity'}):
+            response = self.client.get('/api/physiotherapists/earliest_available/', params)
+            self.assertEqual(response.status_code, 400, params)
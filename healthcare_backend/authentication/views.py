@@ -9,6 +9,10 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.utils import timezone
 from django.db.models import Q, Count, Avg
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from appointments import rollups, scheduling
+from core.fieldsets import SparseFieldsetsMixin
+from core.prefetch import NOTHING, PrefetchPlan, PrefetchPlanMixin
 from .models import PatientProfile, PhysiotherapistProfile
 from .serializers import (
     UserSerializer, PatientProfileSerializer, PhysiotherapistProfileSerializer,
@@ -94,7 +98,7 @@ class PatientProfileView(APIView):
     
     def get(self, request):
         try:
-            profile = PatientProfile.objects.get(user=request.user)
+            profile = PatientProfile.objects.select_related('user').get(user=request.user)
             serializer = PatientProfileSerializer(profile)
             return Response(serializer.data)
         except PatientProfile.DoesNotExist:
@@ -116,7 +120,7 @@ class PhysiotherapistProfileView(APIView):
     
     def get(self, request):
         try:
-            profile = PhysiotherapistProfile.objects.get(user=request.user)
+            profile = PhysiotherapistProfile.objects.select_related('user').get(user=request.user)
             serializer = PhysiotherapistProfileSerializer(profile)
             return Response(serializer.data)
         except PhysiotherapistProfile.DoesNotExist:
@@ -149,9 +153,43 @@ class ChangePasswordView(APIView):
             return Response({'error': 'Incorrect old password'}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class PhysiotherapistListView(generics.ListAPIView):
+# Profile serializers embed the user
+PROFILE_PLANS = {
+    'default': PrefetchPlan(select_related=['user']),
+    'statistics': NOTHING,
+}
+
+def _lists(value):
+    """Lower-cased entries of a JSON list field (specializations, languages)"""
+    return {str(entry).strip().lower() for entry in value} if isinstance(value, list) else set()
+
+def _query_int(request, name, default, low, high):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+    if not low <= value <= high:
+        raise ValueError(f'{name} must be between {low} and {high}')
+    return value
+
+def _query_decimal(request, name):
+    """A finite decimal query parameter, or None when it is absent"""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'{name} must be a number')
+    # NaN and infinities parse but cannot be compared with a column
+    if not value.is_finite():
+        raise ValueError(f'{name} must be a number')
+    return value
+
+class PhysiotherapistListView(PrefetchPlanMixin, SparseFieldsetsMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = PhysiotherapistProfileSerializer
+    prefetch_plans = PROFILE_PLANS
     
     def get_queryset(self):
         queryset = PhysiotherapistProfile.objects.filter(user__is_active=True, is_available=True)
@@ -161,11 +199,11 @@ class PhysiotherapistListView(generics.ListAPIView):
         if specialization:
             queryset = queryset.filter(specializations__icontains=specialization)
             
-        return queryset
+        return self.plan_queryset(queryset)
 
 # ViewSets for comprehensive API management
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing users
     """
@@ -198,27 +236,30 @@ class UserViewSet(viewsets.ModelViewSet):
                           status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class PatientProfileViewSet(viewsets.ModelViewSet):
+class PatientProfileViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing patient profiles
     """
     serializer_class = PatientProfileSerializer
     permission_classes = [IsAuthenticated]
+    prefetch_plans = PROFILE_PLANS
     
     def get_queryset(self):
         user = self.request.user
         if user.user_type == 'patient':
-            return PatientProfile.objects.filter(user=user)
+            queryset = PatientProfile.objects.filter(user=user)
         elif user.user_type == 'physiotherapist':
             # Physiotherapists can see their patients' profiles
             from appointments.models import Appointment
             patient_ids = Appointment.objects.filter(
                 physiotherapist=user
             ).values_list('patient_id', flat=True).distinct()
-            return PatientProfile.objects.filter(user_id__in=patient_ids)
+            queryset = PatientProfile.objects.filter(user_id__in=patient_ids)
         elif user.is_staff:
-            return PatientProfile.objects.all()
-        return PatientProfile.objects.none()
+            queryset = PatientProfile.objects.all()
+        else:
+            queryset = PatientProfile.objects.none()
+        return self.plan_queryset(queryset)
     
     @action(detail=False, methods=['get'])
     def my_profile(self, request):
@@ -265,26 +306,29 @@ class PatientProfileViewSet(viewsets.ModelViewSet):
             'blood_type_distribution': list(blood_type_dist)
         })
 
-class PhysiotherapistProfileViewSet(viewsets.ModelViewSet):
+class PhysiotherapistProfileViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing physiotherapist profiles
     """
     serializer_class = PhysiotherapistProfileSerializer
     permission_classes = [IsAuthenticated]
+    prefetch_plans = PROFILE_PLANS
     
     def get_queryset(self):
         user = self.request.user
         if user.user_type == 'physiotherapist':
-            return PhysiotherapistProfile.objects.filter(user=user)
+            queryset = PhysiotherapistProfile.objects.filter(user=user)
         elif user.user_type == 'patient':
             # Patients can see available physiotherapists
-            return PhysiotherapistProfile.objects.filter(
+            queryset = PhysiotherapistProfile.objects.filter(
                 user__is_active=True, 
                 is_available=True
             )
         elif user.is_staff:
-            return PhysiotherapistProfile.objects.all()
-        return PhysiotherapistProfile.objects.none()
+            queryset = PhysiotherapistProfile.objects.all()
+        else:
+            queryset = PhysiotherapistProfile.objects.none()
+        return self.plan_queryset(queryset)
     
     @action(detail=False, methods=['get'])
     def my_profile(self, request):
@@ -328,6 +372,77 @@ class PhysiotherapistProfileViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def earliest_available(self, request):
+        """
+        The earliest free slots across every matching physiotherapist, e.g. the
+        first orthopedic physiotherapist who speaks Spanish:
+            ?specialization=orthopedic&language=spanish&max_fee=80&min_rating=4
+             &start=2025-01-27&days=14&duration=45&limit=10
+        """
+        try:
+            duration = _query_int(request, 'duration', 60, scheduling.MIN_DURATION, scheduling.MAX_DURATION)
+            days = _query_int(request, 'days', 14, 1, scheduling.MAX_DAYS)
+            limit = _query_int(request, 'limit', 10, 1, scheduling.MAX_EARLIEST)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            max_fee = _query_decimal(request, 'max_fee')
+            min_rating = _query_decimal(request, 'min_rating')
+        except ValueError:
+            return Response({'error': 'max_fee and min_rating must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        today = timezone.localdate()
+        start = request.query_params.get('start')
+        try:
+            start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else today
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if start_date < today:
+            return Response({'error': 'start cannot be in the past'}, status=status.HTTP_400_BAD_REQUEST)
+        end_date = start_date + timedelta(days=days - 1)
+
+        queryset = self.get_queryset().filter(is_available=True, user__is_active=True)
+        if max_fee is not None:
+            queryset = queryset.filter(consultation_fee__lte=max_fee)
+        if min_rating is not None:
+            queryset = queryset.filter(rating__gte=min_rating)
+        # icontains over the JSON text narrows the rows on every database;
+        # the exact, case-insensitive element match is done below
+        wanted = {}
+        for param, field in (('specialization', 'specializations'), ('language', 'languages_spoken')):
+            value = request.query_params.get(param, '').strip().lower()
+            if value:
+                queryset = queryset.filter(**{f'{field}__icontains': value})
+                wanted[field] = value
+
+        profiles = {
+            profile.user_id: profile for profile in queryset
+            if all(value in _lists(getattr(profile, field)) for field, value in wanted.items())
+        }
+        slots = scheduling.earliest_slots(
+            {user_id: scheduling.parse_working_hours(profile.working_hours) for user_id, profile in profiles.items()},
+            start_date, end_date, duration, limit, not_before=timezone.localtime()
+        )
+        for slot in slots:
+            profile = profiles[slot['physiotherapist_id']]
+            slot['physiotherapist'] = {
+                'id': profile.user_id,
+                'profile_id': profile.id,
+                'name': profile.user.get_full_name() or profile.user.username,
+                'specializations': profile.specializations,
+                'languages_spoken': profile.languages_spoken,
+                # As strings, like PhysiotherapistProfileSerializer
+                'consultation_fee': str(profile.consultation_fee),
+                'rating': str(profile.rating),
+            }
+        return Response({
+            'start': start_date,
+            'end': end_date,
+            'duration': duration,
+            'physiotherapists_matched': len(profiles),
+            'slots': slots,
+        })
+    
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get physiotherapist statistics"""
@@ -337,22 +452,21 @@ class PhysiotherapistProfileViewSet(viewsets.ModelViewSet):
         
         profile = PhysiotherapistProfile.objects.get(user=request.user)
         
-        # Get appointment statistics
+        # Get appointment statistics in one conditional aggregate
         from appointments.models import Appointment
-        appointments = Appointment.objects.filter(physiotherapist=request.user)
-        
-        total_appointments = appointments.count()
-        completed_appointments = appointments.filter(status='completed').count()
-        
-        # Monthly statistics
-        now = timezone.now()
-        current_month = appointments.filter(
-            date__year=now.year,
-            date__month=now.month
-        ).count()
-        
-        # Patient count
-        unique_patients = appointments.values('patient').distinct().count()
+        month_start = timezone.now().date().replace(day=1)
+        figures = Appointment.objects.filter(physiotherapist=request.user).aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            current_month=Count(
+                'id', filter=Q(date__range=[month_start, rollups.add_months(month_start, 1) - timedelta(days=1)])
+            ),
+            patients=Count('patient', distinct=True),
+        )
+        total_appointments = figures['total']
+        completed_appointments = figures['completed']
+        current_month = figures['current_month']
+        unique_patients = figures['patients']
         
         return Response({
             'total_appointments': total_appointments,
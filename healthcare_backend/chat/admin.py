@@ -13,7 +13,7 @@ class AttachmentInline(admin.TabularInline):
 
 class ConversationAdmin(admin.ModelAdmin):
     list_display = ('id', 'get_participants', 'created_at', 'updated_at')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('last_message', 'created_at', 'updated_at')
     inlines = [MessageInline]
     
     def get_participants(self, obj):
@@ -21,8 +21,8 @@ class ConversationAdmin(admin.ModelAdmin):
     get_participants.short_description = 'Participants'
 
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'conversation', 'sender', 'content_preview', 'is_read', 'created_at')
-    list_filter = ('is_read', 'created_at')
+    list_display = ('id', 'conversation', 'sender', 'content_preview', 'created_at')
+    list_filter = ('created_at',)
     search_fields = ('content', 'sender__username')
     readonly_fields = ('created_at',)
     inlines = [AttachmentInline]
@@ -0,0 +1,80 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_state(apps, schema_editor):
+    """
+    Derive last_message, read watermarks and unread counts from the
+    per-message is_read flags: a participant has read everything before the
+    first unread message someone else sent them.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    Message = apps.get_model('chat', 'Message')
+
+    for conversation in Conversation.objects.all().iterator():
+        messages = Message.objects.filter(conversation=conversation)
+        last_message = messages.order_by('-id').first()
+        conversation.last_message = last_message
+        conversation.save(update_fields=['last_message'])
+
+        for participant in ConversationParticipant.objects.filter(conversation=conversation):
+            from_others = messages.exclude(sender_id=participant.user_id)
+            first_unread = from_others.filter(is_read=False).order_by('id').first()
+            if first_unread is None:
+                participant.last_read_message = last_message
+                participant.unread_count = 0
+            else:
+                participant.last_read_message = messages.filter(id__lt=first_unread.id).order_by('-id').first()
+                participant.unread_count = from_others.filter(id__gte=first_unread.id).count()
+            participant.save(update_fields=['last_read_message', 'unread_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Adopt the table of the automatic participants M2M as an explicit model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.conversation')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='chat.ConversationParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, help_text='Most recent message, maintained when messages are created or deleted', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.RunPython(backfill_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_last_read_at(apps, schema_editor):
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    Message = apps.get_model('chat', 'Message')
+    ConversationParticipant.objects.filter(last_read_message__isnull=False).update(
+        last_read_at=Subquery(
+            Message.objects.filter(pk=OuterRef('last_read_message_id')).values('created_at')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Per-participant watermarks (derived from Message.is_read in 0002) replace
+    the per-message flag.
+    """
+
+    dependencies = [
+        ('chat', '0002_conversationparticipant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_last_read_at, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
@@ -2,7 +2,19 @@ from django.db import models
 from django.conf import settings
 
 class Conversation(models.Model):
-    participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='conversations')
+    participants = models.ManyToManyField(
+        settings.AUTH_USER_MODEL,
+        related_name='conversations',
+        through='ConversationParticipant'
+    )
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="Most recent message, maintained when messages are created or deleted"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -16,7 +28,6 @@ class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField()
-    is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -24,6 +35,10 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of a conversation's transcript
+            models.Index(fields=['conversation', 'created_at', 'id']),
+        ]
 
 class Attachment(models.Model):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='attachments')
@@ -34,3 +49,32 @@ class Attachment(models.Model):
     
     def __str__(self):
         return self.file_name
+
+
+class ConversationParticipant(models.Model):
+    """
+    Membership of a user in a conversation with their read state.
+
+    ``last_read_message`` is the user's read watermark: every message up to
+    and including it has been read. ``unread_count`` is the number of
+    messages from other participants after it. Both are maintained by
+    ``chat.state``, so read receipts and conversation lists need no
+    per-message state.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversation_memberships'
+    )
+    last_read_message = models.ForeignKey(
+        Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # The table Django created for the original automatic M2M
+        db_table = 'chat_conversation_participants'
+        unique_together = ['conversation', 'user']
+
+    def __str__(self):
+        return f"{self.user} in conversation {self.conversation_id}"
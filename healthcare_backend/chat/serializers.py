@@ -1,25 +1,68 @@
 from rest_framework import serializers
+from core.fieldsets import DynamicFieldsMixin
+from core.prefetch import PrefetchPlan
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message, Attachment
+from django.db import models
+from django.db.models import Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from . import state
+from .models import Conversation, ConversationParticipant, Message, Attachment
 from authentication.serializers import UserSerializer
 
 User = get_user_model()
 
-class AttachmentSerializer(serializers.ModelSerializer):
+class AttachmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Attachment
         fields = ['id', 'file', 'file_name', 'file_type', 'created_at']
         read_only_fields = ['created_at']
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageListSerializer(serializers.ListSerializer):
+    """Loads the read watermarks of every conversation on the page in one query"""
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request is not None:
+            read_state = self.context.setdefault('read_state', {})
+            messages = data.all() if isinstance(data, models.manager.BaseManager) else data
+            missing = {message.conversation_id for message in messages} - read_state.keys()
+            if missing:
+                # Conversations without participants have no watermarks at all
+                read_state.update(dict.fromkeys(missing, (0, 0)))
+                read_state.update(state.read_state(request.user, missing))
+            data = messages
+        return super().to_representation(data)
+
+class MessageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    ``is_read`` is derived from the read watermarks: a message from someone
+    else is read once the viewer's watermark reaches it, the viewer's own
+    message once every other participant's does. Pass ``read_state`` (see
+    ``chat.state.read_state``) in the context to avoid a lookup per
+    conversation.
+    """
     sender = UserSerializer(read_only=True)
     attachments = AttachmentSerializer(many=True, read_only=True)
+    is_read = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
         fields = ['id', 'conversation', 'sender', 'content', 
                   'is_read', 'created_at', 'attachments']
         read_only_fields = ['created_at']
+        list_serializer_class = MessageListSerializer
+    
+    def get_is_read(self, obj):
+        request = self.context.get('request')
+        if request is None:
+            return None
+        read_state = self.context.setdefault('read_state', {})
+        if obj.conversation_id not in read_state:
+            read_state.update(state.read_state(request.user, [obj.conversation_id]))
+        own, others = read_state.get(obj.conversation_id, (0, 0))
+        if obj.sender_id == request.user.pk:
+            return obj.id <= others
+        return obj.id <= own
 
 class MessageCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,7 +74,12 @@ class MessageCreateSerializer(serializers.ModelSerializer):
         validated_data['sender'] = self.context['request'].user
         return super().create(validated_data)
 
-class ConversationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Reads the denormalized conversation state. Querysets built with
+    ``listing_queryset`` serialize any number of conversations in a fixed
+    number of queries.
+    """
     participants = UserSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
@@ -43,14 +91,49 @@ class ConversationSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
     
     def get_last_message(self, obj):
-        last_message = obj.messages.order_by('-created_at').first()
-        if last_message:
-            return MessageSerializer(last_message).data
-        return None
+        if obj.last_message is None:
+            return None
+        context = self.context
+        if hasattr(obj, 'viewer_last_read_id'):
+            context = {**context, 'read_state': {
+                obj.id: (obj.viewer_last_read_id or 0, obj.others_last_read_id or 0)
+            }}
+        return self.nested_serializer(MessageSerializer, 'last_message', obj.last_message, context=context).data
     
     def get_unread_count(self, obj):
+        if hasattr(obj, 'viewer_unread_count'):
+            return obj.viewer_unread_count or 0
         user = self.context.get('request').user
-        return obj.messages.filter(is_read=False).exclude(sender=user).count()
+        return ConversationParticipant.objects.filter(
+            conversation=obj, user=user
+        ).values_list('unread_count', flat=True).first() or 0
+
+
+# The related rows ConversationSerializer reads
+LISTING_PLAN = PrefetchPlan(
+    select_related=['last_message__sender'],
+    prefetch_related=['participants', 'last_message__attachments']
+)
+
+
+def listing_queryset(queryset, user):
+    """Load everything ConversationSerializer reads, for ``user`` as the viewer"""
+    return with_viewer_state(LISTING_PLAN.apply(queryset), user)
+
+
+def with_viewer_state(queryset, user):
+    """Annotate the viewer's unread count and the read watermarks ConversationSerializer reads"""
+    memberships = ConversationParticipant.objects.filter(conversation=OuterRef('pk'))
+    return queryset.annotate(
+        viewer_unread_count=Subquery(memberships.filter(user=user).values('unread_count')[:1]),
+        viewer_last_read_id=Subquery(memberships.filter(user=user).values('last_read_message_id')[:1]),
+        # Lowest watermark among the others: the last message is read by all once it is reached
+        others_last_read_id=Subquery(
+            memberships.exclude(user=user).order_by().values('conversation').annotate(
+                lowest=Min(Coalesce('last_read_message_id', Value(0)))
+            ).values('lowest')
+        ),
+    )
 
 class ConversationCreateSerializer(serializers.ModelSerializer):
     participants = serializers.PrimaryKeyRelatedField(
@@ -0,0 +1,35 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import state
+from .models import Conversation, Message
+
+
+@receiver(post_save, sender=Message)
+def update_conversation_on_message(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    state.message_created(instance)
+
+
+@receiver(pre_delete, sender=Message)
+def move_watermarks_off_message(sender, instance, **kwargs):
+    state.message_deleting(instance)
+
+
+@receiver(post_delete, sender=Message)
+def update_conversation_on_message_delete(sender, instance, **kwargs):
+    state.refresh(instance.conversation_id)
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def count_unread_for_new_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    """New participants start with every earlier message unread"""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # user.conversations.add(...): pk_set holds conversation ids
+        for conversation_id in pk_set:
+            state.refresh(conversation_id, [instance.pk])
+    else:
+        state.refresh(instance.pk, pk_set)
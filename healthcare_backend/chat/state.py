@@ -0,0 +1,144 @@
+"""
+Denormalized conversation state.
+
+``Conversation.last_message`` and each participant's ``last_read_message``
+and ``unread_count`` are updated with single UPDATE statements when messages
+are created, read or deleted, so conversation lists read them directly.
+``unread_count`` is the number of messages from other participants newer
+than the participant's ``last_read_message``.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Conversation, ConversationParticipant, Message
+
+
+def _unread_subquery():
+    """Messages from others after the participant's watermark, per participant row"""
+    unread = Message.objects.filter(
+        conversation_id=OuterRef('conversation_id')
+    ).exclude(
+        sender_id=OuterRef('user_id')
+    ).filter(
+        # Nothing read yet (no watermark): every message counts
+        id__gt=Coalesce(OuterRef('last_read_message_id'), Value(0))
+    ).order_by().values('conversation_id').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(unread, output_field=IntegerField()), 0)
+
+
+def message_created(message):
+    """Advance the conversation for a new message"""
+    with transaction.atomic():
+        Conversation.objects.filter(pk=message.conversation_id).update(
+            last_message=message, updated_at=timezone.now()
+        )
+        memberships = ConversationParticipant.objects.filter(conversation_id=message.conversation_id)
+        memberships.exclude(user_id=message.sender_id).update(unread_count=F('unread_count') + 1)
+        # Senders have seen everything up to their own message
+        memberships.filter(user_id=message.sender_id).update(
+            last_read_message=message, last_read_at=message.created_at, unread_count=0
+        )
+
+
+def mark_read(conversation_id, user, up_to_message_id=None):
+    """
+    Move the user's read watermark forward with a single UPDATE.
+
+    Without ``up_to_message_id`` everything up to the conversation's latest
+    message is read; otherwise the watermark moves to that message (never
+    backwards) and the messages after it are recounted.
+    """
+    memberships = ConversationParticipant.objects.filter(conversation_id=conversation_id, user=user)
+    now = timezone.now()
+    if up_to_message_id is None:
+        return memberships.filter(
+            Q(unread_count__gt=0) | Q(last_read_message__isnull=True)
+        ).update(
+            last_read_message_id=Subquery(
+                Conversation.objects.filter(pk=conversation_id).values('last_message_id')[:1]
+            ),
+            last_read_at=now,
+            unread_count=0
+        )
+    return memberships.filter(
+        Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=up_to_message_id)
+    ).update(
+        last_read_message_id=up_to_message_id,
+        last_read_at=now,
+        unread_count=Coalesce(Subquery(
+            Message.objects.filter(
+                conversation_id=conversation_id, id__gt=up_to_message_id
+            ).exclude(sender=user).order_by().values('conversation_id').annotate(
+                total=Count('id')
+            ).values('total'),
+            output_field=IntegerField()
+        ), 0)
+    )
+
+
+def mark_all_read(user):
+    """Mark every conversation of the user as read in one statement"""
+    ConversationParticipant.objects.filter(user=user, unread_count__gt=0).update(
+        last_read_message_id=Subquery(
+            Conversation.objects.filter(pk=OuterRef('conversation_id')).values('last_message_id')[:1]
+        ),
+        last_read_at=timezone.now(),
+        unread_count=0
+    )
+
+
+def unread_messages(queryset, user):
+    """Restrict a Message queryset to messages from others after the user's watermark"""
+    return queryset.filter(
+        conversation__memberships__user=user,
+        id__gt=Coalesce(F('conversation__memberships__last_read_message_id'), Value(0))
+    ).exclude(sender=user)
+
+
+def read_state(user, conversation_ids):
+    """
+    Watermarks needed to derive per-message read flags for ``user``.
+
+    Returns ``{conversation id: (own watermark, lowest watermark of the
+    other participants)}`` from one query; ids are 0 when nothing was read.
+    """
+    watermarks = {}
+    rows = ConversationParticipant.objects.filter(
+        conversation_id__in=conversation_ids
+    ).values_list('conversation_id', 'user_id', 'last_read_message_id')
+    for conversation_id, user_id, watermark in rows:
+        own, others = watermarks.get(conversation_id, (0, None))
+        watermark = watermark or 0
+        if user_id == user.pk:
+            own = watermark
+        else:
+            others = watermark if others is None else min(others, watermark)
+        watermarks[conversation_id] = (own, others)
+    return {key: (own, others or 0) for key, (own, others) in watermarks.items()}
+
+
+def refresh(conversation_id, user_ids=None):
+    """Recompute the last message and unread counts of a conversation from its messages"""
+    with transaction.atomic():
+        Conversation.objects.filter(pk=conversation_id).update(
+            last_message_id=Subquery(
+                Message.objects.filter(conversation_id=OuterRef('pk')).order_by('-id').values('id')[:1]
+            )
+        )
+        memberships = ConversationParticipant.objects.filter(conversation_id=conversation_id)
+        if user_ids is not None:
+            memberships = memberships.filter(user_id__in=user_ids)
+        memberships.update(unread_count=_unread_subquery())
+
+
+def message_deleting(message):
+    """Step watermarks that point at a message about to be deleted back to the previous one"""
+    previous = Message.objects.filter(
+        conversation_id=message.conversation_id, id__lt=message.id
+    ).order_by('-id').values_list('id', flat=True).first()
+    ConversationParticipant.objects.filter(last_read_message_id=message.id).update(
+        last_read_message_id=previous
+    )
@@ -1,3 +1,249 @@
-from django.test import TestCase
+from importlib import import_module
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from core.testing import QueryBudgetTestCase, create_user
+
+from . import state
+from .models import Attachment, Conversation, ConversationParticipant, Message
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.user = create_user('budget_patient')
+        self.other = create_user('budget_physio', 'physiotherapist')
+        self.conversation = self.create_conversation()
+
+    def create_conversation(self):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(self.user, self.other)
+        return conversation
+
+    def send(self, conversation, sender):
+        message = Message.objects.create(conversation=conversation, sender=sender, content='Budget')
+        Attachment.objects.create(
+            message=message, file='chat_attachments/scan.png', file_name='scan.png', file_type='image/png'
+        )
+
+    def add_rows(self, number):
+        """
+        Per row: a new conversation with a message from the other participant,
+        and a message from each side in ``self.conversation``.
+        """
+        for _ in range(number):
+            self.send(self.create_conversation(), self.other)
+            self.send(self.conversation, self.user)
+            self.send(self.conversation, self.other)
+
+    def test_conversation_list(self):
+        self.assertQueryBudget(4, '/api/conversations/', self.add_rows)
+
+    def test_conversation_detail(self):
+        self.assertQueryBudget(3, f'/api/conversations/{self.conversation.pk}/', self.add_rows)
+
+    def test_conversation_messages(self):
+        self.assertQueryBudget(5, f'/api/conversations/{self.conversation.pk}/messages/', self.add_rows)
+
+    def test_message_list(self):
+        self.assertQueryBudget(3, '/api/messages/', self.add_rows)
+
+    def test_message_detail(self):
+        self.assertQueryBudget(3, self.detail_url('/api/messages/', Message), self.add_rows)
+
+    def test_unread_messages(self):
+        self.assertQueryBudget(3, '/api/messages/unread/', self.add_rows)
+
+    def test_attachment_list(self):
+        self.assertQueryBudget(2, '/api/attachments/', self.add_rows)
+
+    def test_attachment_detail(self):
+        self.assertQueryBudget(1, self.detail_url('/api/attachments/', Attachment), self.add_rows)
+
+
+class ConversationStateTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('state_patient')
+        self.physiotherapist = create_user('state_physio', 'physiotherapist')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.patient, self.physiotherapist)
+
+    def send(self, sender, content='Hello'):
+        return Message.objects.create(conversation=self.conversation, sender=sender, content=content)
+
+    def membership(self, user):
+        return ConversationParticipant.objects.get(conversation=self.conversation, user=user)
+
+    def assertUnread(self, expected):
+        self.assertEqual({user: self.membership(user).unread_count for user in expected}, expected)
+
+    def test_created_messages_advance_the_conversation(self):
+        self.send(self.patient)
+        second = self.send(self.patient)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message, second)
+        self.assertUnread({self.patient: 0, self.physiotherapist: 2})
+
+        reply = self.send(self.physiotherapist)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message, reply)
+        # Replying reads everything before the reply
+        self.assertUnread({self.patient: 1, self.physiotherapist: 0})
+        self.assertEqual(self.membership(self.physiotherapist).last_read_message, reply)
+
+    def test_deleted_messages_are_recounted(self):
+        first = self.send(self.patient)
+        read = self.send(self.physiotherapist)
+        latest = self.send(self.patient)
+        self.assertUnread({self.patient: 0, self.physiotherapist: 1})
+
+        latest.delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message, read)
+        # The sender's watermark was on the deleted message and steps back with it
+        self.assertEqual(self.membership(self.patient).last_read_message, read)
+        self.assertUnread({self.patient: 0, self.physiotherapist: 0})
+
+        read.delete()
+        self.assertEqual(self.membership(self.physiotherapist).last_read_message, first)
+        self.assertUnread({self.patient: 0, self.physiotherapist: 0})
+
+        first.delete()
+        self.conversation.refresh_from_db()
+        self.assertIsNone(self.conversation.last_message)
+        self.assertIsNone(self.membership(self.physiotherapist).last_read_message)
+
+    def test_new_participants_start_with_earlier_messages_unread(self):
+        self.send(self.patient)
+        self.send(self.physiotherapist)
+        colleague = create_user('state_colleague', 'physiotherapist')
+        self.conversation.participants.add(colleague)
+        self.assertUnread({colleague: 2})
+
+        # Adding from the user's side counts the same way
+        relative = create_user('state_relative')
+        relative.conversations.add(self.conversation)
+        self.assertUnread({relative: 2})
+
+        self.send(relative)
+        self.assertUnread({self.patient: 2, self.physiotherapist: 1, colleague: 3, relative: 0})
+
+
+class ReadWatermarkTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('watermark_patient')
+        self.physiotherapist = create_user('watermark_physio', 'physiotherapist')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.patient, self.physiotherapist)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.physiotherapist, content=str(number))
+            for number in range(5)
+        ]
+
+    def membership(self, user):
+        return ConversationParticipant.objects.get(conversation=self.conversation, user=user)
+
+    def test_mark_read_up_to_a_message_recounts(self):
+        state.mark_read(self.conversation.pk, self.patient, self.messages[2].pk)
+        membership = self.membership(self.patient)
+        self.assertEqual(membership.last_read_message, self.messages[2])
+        self.assertEqual(membership.unread_count, 2)
+        self.assertIsNotNone(membership.last_read_at)
+
+        # The watermark never moves backwards
+        self.assertEqual(state.mark_read(self.conversation.pk, self.patient, self.messages[0].pk), 0)
+        self.assertEqual(self.membership(self.patient).last_read_message, self.messages[2])
+
+        state.mark_read(self.conversation.pk, self.patient)
+        membership = self.membership(self.patient)
+        self.assertEqual((membership.last_read_message, membership.unread_count), (self.messages[4], 0))
+
+    def test_reading_is_one_update(self):
+        for number in range(50):
+            Message.objects.create(conversation=self.conversation, sender=self.physiotherapist, content=str(number))
+        with self.assertNumQueries(1):
+            state.mark_read(self.conversation.pk, self.patient)
+        self.assertEqual(self.membership(self.patient).unread_count, 0)
+
+        other = Conversation.objects.create()
+        other.participants.add(self.patient, self.physiotherapist)
+        Message.objects.create(conversation=other, sender=self.physiotherapist, content='Other')
+        Message.objects.create(conversation=self.conversation, sender=self.physiotherapist, content='Again')
+        with self.assertNumQueries(1):
+            state.mark_all_read(self.patient)
+        self.assertFalse(ConversationParticipant.objects.filter(user=self.patient, unread_count__gt=0).exists())
+
+    def test_is_read_for_sender_and_recipient(self):
+        url = f'/api/messages/{self.messages[1].pk}/'
+        sender, recipient = APIClient(), APIClient()
+        sender.force_authenticate(self.physiotherapist)
+        recipient.force_authenticate(self.patient)
+        self.assertIs(sender.get(url).data['is_read'], False)
+        self.assertIs(recipient.get(url).data['is_read'], False)
+
+        response = recipient.post(f'{url}mark_read/')
+        self.assertIs(response.data['is_read'], True)
+        self.assertIs(sender.get(url).data['is_read'], True)
+        # Later messages stay unread on both sides
+        later = f'/api/messages/{self.messages[2].pk}/'
+        self.assertIs(sender.get(later).data['is_read'], False)
+        self.assertIs(recipient.get(later).data['is_read'], False)
+
+
+class ReadStateMigrationTests(TransactionTestCase):
+    """0002 derives the watermarks from Message.is_read, which 0003 then drops"""
+
+    migration = ('chat', '0002_conversationparticipant')
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.migration])
+        self.addCleanup(self.migrate_forward)
+        self.apps = executor.loader.project_state(self.migration).apps
+
+    def migrate_forward(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_from_is_read(self):
+        User = self.apps.get_model('authentication', 'User')
+        Conversation = self.apps.get_model('chat', 'Conversation')
+        Membership = self.apps.get_model('chat', 'ConversationParticipant')
+        Message = self.apps.get_model('chat', 'Message')
+
+        patient = User.objects.create(username='backfill_patient', email='patient@example.com')
+        physiotherapist = User.objects.create(username='backfill_physio', email='physio@example.com')
+        conversation = Conversation.objects.create()
+        for user in (patient, physiotherapist):
+            Membership.objects.create(conversation=conversation, user=user)
+        sent = [
+            Message.objects.create(conversation=conversation, sender=sender, content='Backfill', is_read=is_read)
+            for sender, is_read in (
+                (physiotherapist, True), (physiotherapist, True), (physiotherapist, False),
+                (physiotherapist, False), (patient, False),
+            )
+        ]
+
+        import_module('chat.migrations.0002_conversationparticipant').backfill_state(self.apps, None)
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.last_message_id, sent[4].pk)
+        memberships = {
+            membership.user_id: (membership.last_read_message_id, membership.unread_count)
+            for membership in Membership.objects.all()
+        }
+        # The patient has read up to just before their first unread message
+        self.assertEqual(memberships[patient.pk], (sent[1].pk, 2))
+        self.assertEqual(memberships[physiotherapist.pk], (sent[3].pk, 1))
+
+        # 0003 dates the watermarks from the messages they point at
+        self.migrate_forward()
+        membership = ConversationParticipant.objects.select_related('last_read_message').get(
+            user_id=patient.pk
+        )
+        self.assertEqual(membership.last_read_at, membership.last_read_message.created_at)
@@ -7,19 +7,29 @@ from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.db.models import Q, Count
 from datetime import timedelta
-from .models import Conversation, Message, Attachment
+from core.fieldsets import SparseFieldsetsMixin
+from core.pagination import KeysetPagination
+from core.prefetch import NOTHING, PrefetchPlan, PrefetchPlanMixin
+from . import state
+from .models import Conversation, ConversationParticipant, Message, Attachment
 from .serializers import (
     ConversationSerializer, ConversationCreateSerializer,
     MessageSerializer, MessageCreateSerializer,
-    AttachmentSerializer
+    AttachmentSerializer, LISTING_PLAN, listing_queryset, with_viewer_state
 )
 
+class TranscriptPagination(KeysetPagination):
+    """Pages of a conversation, each in reading order (oldest message first)"""
+    newest_first = False
+
 class ConversationListCreateView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         # Get all conversations where the current user is a participant
-        conversations = Conversation.objects.filter(participants=request.user)
+        conversations = listing_queryset(
+            Conversation.objects.filter(participants=request.user), request.user
+        )
         serializer = ConversationSerializer(
             conversations, 
             many=True, 
@@ -79,17 +89,25 @@ class MessageListCreateView(APIView):
             participants=request.user
         )
         
-        # Get all messages in the conversation
-        messages = conversation.messages.all()
+        # One page of the conversation, latest messages first loaded
+        paginator = TranscriptPagination()
+        messages = paginator.paginate_queryset(
+            conversation.messages.select_related('sender').prefetch_related('attachments'),
+            request, view=self
+        )
         
-        # Mark messages as read if they were sent by other users
-        unread_messages = messages.filter(is_read=False).exclude(sender=request.user)
-        for message in unread_messages:
-            message.is_read = True
-            message.save()
+        # Opening the conversation reads everything: one watermark UPDATE
+        state.mark_read(conversation.id, request.user)
         
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        serializer = MessageSerializer(
+            messages,
+            many=True,
+            context={
+                'request': request,
+                'read_state': state.read_state(request.user, [conversation.id])
+            }
+        )
+        return paginator.get_paginated_response(serializer.data)
     
     def post(self, request, conversation_id):
         # Ensure the conversation exists and user is a participant
@@ -108,13 +126,11 @@ class MessageListCreateView(APIView):
         )
         
         if serializer.is_valid():
+            # The post_save handler advances the conversation (last message, unread counts)
             message = serializer.save()
             
-            # Update conversation's updated_at timestamp
-            conversation.save()  # This will update the auto_now field
-            
             return Response(
-                MessageSerializer(message).data, 
+                MessageSerializer(message, context={'request': request}).data, 
                 status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -148,11 +164,18 @@ class AttachmentUploadView(APIView):
 
 # ViewSets for comprehensive API management
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing conversations
     """
     permission_classes = [IsAuthenticated]
+    prefetch_plans = {
+        'default': LISTING_PLAN,
+        # Loads the transcript page itself
+        'messages': NOTHING,
+        'statistics': NOTHING,
+        'destroy': NOTHING,
+    }
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -160,8 +183,9 @@ class ConversationViewSet(viewsets.ModelViewSet):
         return ConversationSerializer
     
     def get_queryset(self):
-        return Conversation.objects.filter(
-            participants=self.request.user
+        return with_viewer_state(
+            self.plan_queryset(Conversation.objects.filter(participants=self.request.user)),
+            self.request.user
         ).order_by('-updated_at')
     
     def perform_create(self, serializer):
@@ -179,14 +203,24 @@ class ConversationViewSet(viewsets.ModelViewSet):
     def messages(self, request, pk=None):
         """Get messages for a conversation"""
         conversation = self.get_object()
-        messages = conversation.messages.all().order_by('created_at')
+        paginator = TranscriptPagination()
+        messages = paginator.paginate_queryset(
+            conversation.messages.select_related('sender').prefetch_related('attachments'),
+            request, view=self
+        )
         
         # Mark messages as read
-        unread_messages = messages.filter(is_read=False).exclude(sender=request.user)
-        unread_messages.update(is_read=True)
+        state.mark_read(conversation.id, request.user)
         
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        serializer = MessageSerializer(
+            messages,
+            many=True,
+            context={
+                'request': request,
+                'read_state': state.read_state(request.user, [conversation.id])
+            }
+        )
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
@@ -196,9 +230,9 @@ class ConversationViewSet(viewsets.ModelViewSet):
         total_conversations = queryset.count()
         
         # Conversations with unread messages
-        unread_conversations = queryset.filter(
-            messages__is_read=False
-        ).exclude(messages__sender=request.user).distinct().count()
+        unread_conversations = ConversationParticipant.objects.filter(
+            user=request.user, unread_count__gt=0
+        ).count()
         
         # Recent conversations (last 7 days)
         week_ago = timezone.now() - timedelta(days=7)
@@ -210,11 +244,16 @@ class ConversationViewSet(viewsets.ModelViewSet):
             'recent_conversations': recent_conversations
         })
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing messages
     """
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    prefetch_plans = {
+        'default': PrefetchPlan(select_related=['sender'], prefetch_related=['attachments']),
+        'destroy': NOTHING,
+    }
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -224,9 +263,9 @@ class MessageViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Only show messages from conversations the user participates in
         user_conversations = Conversation.objects.filter(participants=self.request.user)
-        return Message.objects.filter(
+        return self.plan_queryset(Message.objects.filter(
             conversation__in=user_conversations
-        ).order_by('-created_at')
+        ).order_by('-created_at'))
     
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
@@ -234,18 +273,14 @@ class MessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread(self, request):
         """Get unread messages"""
-        queryset = self.get_queryset().filter(
-            is_read=False
-        ).exclude(sender=request.user)
+        queryset = state.unread_messages(self.get_queryset(), request.user)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all messages as read"""
-        self.get_queryset().filter(
-            is_read=False
-        ).exclude(sender=request.user).update(is_read=True)
+        state.mark_all_read(request.user)
         return Response({'message': 'All messages marked as read'})
     
     @action(detail=True, methods=['post'])
@@ -253,24 +288,25 @@ class MessageViewSet(viewsets.ModelViewSet):
         """Mark specific message as read"""
         message = self.get_object()
         if message.sender != request.user:
-            message.is_read = True
-            message.save()
+            state.mark_read(message.conversation_id, request.user, message.id)
         serializer = self.get_serializer(message)
         return Response(serializer.data)
 
-class AttachmentViewSet(viewsets.ModelViewSet):
+class AttachmentViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing attachments
     """
     serializer_class = AttachmentSerializer
     permission_classes = [IsAuthenticated]
+    # AttachmentSerializer reads only the attachment row
+    prefetch_plans = {'default': NOTHING}
     
     def get_queryset(self):
         # Only show attachments from messages in conversations the user participates in
         user_conversations = Conversation.objects.filter(participants=self.request.user)
-        return Attachment.objects.filter(
+        return self.plan_queryset(Attachment.objects.filter(
             message__conversation__in=user_conversations
-        ).order_by('-created_at')
+        ).order_by('-created_at'))
     
     @action(detail=False, methods=['get'])
     def recent(self, request):
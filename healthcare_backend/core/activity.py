@@ -0,0 +1,202 @@
+"""
+Recent-activity feed.
+
+Changes to appointments, exercise progress, appointment feedback and
+documents are fanned out on write to an ActivityEvent per interested user,
+with the title and description rendered once. Reading a feed is then a
+keyset range read over the (user, occurred_at, id) index.
+
+``manage.py rebuild_activity_feed`` regenerates the events from the source
+tables, e.g. after bulk imports; migration 0006 backfilled existing data.
+"""
+
+from datetime import datetime, time
+
+from django.db import transaction
+from django.utils import timezone
+
+from appointments.models import Appointment, AppointmentDocument, AppointmentFeedback
+from exercises.models import ExerciseProgress
+
+from .models import ActivityEvent
+from .pagination import keyset_page
+
+MAX_PAGE_SIZE = 100
+
+
+def _at(day, at=None):
+    return timezone.make_aware(datetime.combine(day, at or time.min))
+
+
+def _name(user):
+    # get_full_name() spelled out, so migrations' historical users work too
+    return f'{user.first_name} {user.last_name}'.strip() or user.username
+
+
+def appointment_events(appointment):
+    """Feed entries for both participants of an appointment"""
+    common = {
+        'description': appointment.get_appointment_type_display(),
+        'status': appointment.status,
+        'date': appointment.date,
+        'time': appointment.start_time,
+        'occurred_at': _at(appointment.date, appointment.start_time),
+    }
+    return {
+        appointment.patient_id: {
+            'title': f'Appointment with {_name(appointment.physiotherapist)}', **common
+        },
+        appointment.physiotherapist_id: {
+            'title': f'Appointment with {_name(appointment.patient)}', **common
+        },
+    }
+
+
+def progress_events(progress):
+    exercise = progress.exercise_plan_item.exercise
+    return {
+        progress.patient_id: {
+            'title': f'Completed {exercise.name}',
+            'description': progress.get_completion_status_display(),
+            'status': progress.completion_status,
+            'date': progress.date_completed,
+            'time': None,
+            'occurred_at': _at(progress.date_completed),
+            'extra': {
+                'completion_status': progress.completion_status,
+                'difficulty_rating': progress.difficulty_rating,
+            },
+        },
+    }
+
+
+def feedback_events(feedback):
+    appointment = feedback.appointment
+    common = {
+        'description': feedback.comments[:500] if feedback.comments else '',
+        'date': timezone.localdate(feedback.created_at),
+        'time': None,
+        'occurred_at': feedback.created_at,
+        'extra': {'appointment_id': appointment.pk, 'rating': feedback.rating},
+    }
+    return {
+        appointment.patient_id: {
+            'title': f'You rated your appointment {feedback.rating}/5', **common
+        },
+        appointment.physiotherapist_id: {
+            'title': f'Feedback from {_name(appointment.patient)}: {feedback.rating}/5', **common
+        },
+    }
+
+
+def document_events(document):
+    appointment = document.appointment
+    event = {
+        'title': f'Document uploaded: {document.title}',
+        'description': document.get_document_type_display(),
+        'date': timezone.localdate(document.created_at),
+        'time': None,
+        'occurred_at': document.created_at,
+        'extra': {'appointment_id': appointment.pk, 'document_type': document.document_type},
+    }
+    return {appointment.patient_id: event, appointment.physiotherapist_id: event}
+
+
+# Source model -> (event type, builder)
+SOURCES = {
+    Appointment: ('appointment', appointment_events),
+    ExerciseProgress: ('exercise', progress_events),
+    AppointmentFeedback: ('feedback', feedback_events),
+    AppointmentDocument: ('document', document_events),
+}
+
+
+def publish(instance):
+    """Write or refresh the feed entries of a source row"""
+    event_type, build = SOURCES[type(instance)]
+    events = build(instance)
+    with transaction.atomic():
+        # Drop entries of users no longer involved (e.g. a reassigned physiotherapist)
+        ActivityEvent.objects.filter(
+            event_type=event_type, object_id=instance.pk
+        ).exclude(user_id__in=events).delete()
+        for user_id, fields in events.items():
+            ActivityEvent.objects.update_or_create(
+                user_id=user_id, event_type=event_type, object_id=instance.pk,
+                defaults={'status': '', 'extra': {}, **fields}
+            )
+
+
+def publish_new(instances):
+    """Feed entries of rows inserted with ``bulk_create``, which have none yet, in one insert"""
+    events = []
+    for instance in instances:
+        event_type, build = SOURCES[type(instance)]
+        events.extend(
+            ActivityEvent(user_id=user_id, event_type=event_type, object_id=instance.pk,
+                          **{'status': '', 'extra': {}, **fields})
+            for user_id, fields in build(instance).items()
+        )
+    ActivityEvent.objects.bulk_create(events)
+
+
+def retract(instance):
+    """Remove the feed entries of a deleted source row"""
+    event_type, _ = SOURCES[type(instance)]
+    ActivityEvent.objects.filter(event_type=event_type, object_id=instance.pk).delete()
+
+
+def serialize(event):
+    item = {
+        'type': event.event_type,
+        'title': event.title,
+        'description': event.description,
+        'date': event.date,
+        'id': event.object_id,
+    }
+    if event.time is not None:
+        item['time'] = event.time
+    if event.status:
+        item['status'] = event.status
+    item.update(event.extra)
+    return item
+
+
+def get_feed(user, cursor=None, limit=10):
+    """Return ``(items, next_cursor)`` for one page of the user's feed"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    events, next_cursor = keyset_page(
+        ActivityEvent.objects.filter(user=user), 'occurred_at', cursor, limit
+    )
+    return [serialize(event) for event in events], next_cursor
+
+
+def rebuild(apps=None):
+    """
+    Regenerate every feed entry from the source tables; returns the number
+    of source rows. Migrations pass their ``apps`` to use historical models.
+    """
+    event_model = apps.get_model('core', 'ActivityEvent') if apps else ActivityEvent
+    related = {
+        Appointment: ('patient', 'physiotherapist'),
+        ExerciseProgress: ('exercise_plan_item__exercise',),
+        AppointmentFeedback: ('appointment__patient', 'appointment__physiotherapist'),
+        AppointmentDocument: ('appointment',),
+    }
+    total = 0
+    with transaction.atomic():
+        event_model.objects.all().delete()
+        for model, (event_type, build) in SOURCES.items():
+            source = apps.get_model(model._meta.label) if apps else model
+            batch = []
+            for instance in source.objects.select_related(*related[model]).iterator(chunk_size=2000):
+                for user_id, fields in build(instance).items():
+                    batch.append(event_model(
+                        user_id=user_id, event_type=event_type, object_id=instance.pk, **fields
+                    ))
+                total += 1
+                if len(batch) >= 2000:
+                    event_model.objects.bulk_create(batch)
+                    batch = []
+            event_model.objects.bulk_create(batch)
+    return total
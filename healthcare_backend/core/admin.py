@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import GlobalCounter
+
+
+@admin.register(GlobalCounter)
+class GlobalCounterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value', 'updated_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'value', 'updated_at')
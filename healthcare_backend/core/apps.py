@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+    verbose_name = 'Core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .metrics import instrument
+        instrument()
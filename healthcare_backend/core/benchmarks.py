@@ -0,0 +1,110 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks seed their data inside a transaction that is always rolled back,
+so they can be pointed at a development database without leaving rows behind.
+"""
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import time as dt_time, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointments.models import Appointment
+from authentication.models import User
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is rolled back when it exits"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """Execute wrapper counting statements without the DEBUG query log limits"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func, iterations=50, setup=None):
+    """Time ``func`` and count its queries over several iterations"""
+    timings = []
+    query_counts = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        query_counts.append(counter.count)
+    return {
+        'queries': statistics.mean(query_counts),
+        'mean_ms': statistics.mean(timings),
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+    }
+
+
+def format_result(label, result):
+    return (
+        f"{label:<32} queries/call={result['queries']:>7.1f}  "
+        f"p50={result['p50_ms']:>9.3f}ms  p95={result['p95_ms']:>9.3f}ms"
+    )
+
+
+def create_users(prefix, user_type, count):
+    """Bulk create benchmark users and return them with primary keys"""
+    User.objects.bulk_create([
+        User(username=f'{prefix}_{index}', email=f'{prefix}_{index}@bench.local', user_type=user_type)
+        for index in range(count)
+    ], batch_size=1000)
+    return list(User.objects.filter(username__startswith=f'{prefix}_').order_by('id'))
+
+
+def seed_appointments(total, patients, physiotherapists, days=365, batch_size=5000):
+    """
+    Bulk create ``total`` appointments spread over the given users and days.
+
+    Half of the window lies in the past and half in the future so date
+    filters on either side have realistic selectivity.
+    """
+    rng = random.Random(42)
+    today = timezone.now().date()
+    statuses = [choice for choice, _ in Appointment.STATUS_CHOICES]
+    batch = []
+    for _ in range(total):
+        hour = rng.randint(8, 17)
+        batch.append(Appointment(
+            patient=rng.choice(patients),
+            physiotherapist=rng.choice(physiotherapists),
+            date=today + timedelta(days=rng.randint(-days // 2, days // 2)),
+            start_time=dt_time(hour, 0),
+            end_time=dt_time(hour, 45),
+            status=rng.choice(statuses),
+            reason='Benchmark appointment',
+        ))
+        if len(batch) >= batch_size:
+            Appointment.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Appointment.objects.bulk_create(batch)
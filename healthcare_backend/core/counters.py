@@ -0,0 +1,133 @@
+"""
+Site-wide counters.
+
+Each counter in ``DEFINITIONS`` is the number of rows of a model matching a
+fixed set of field values. Saves and deletes move the affected counters by
++1/-1 with F() expressions in the writer's transaction, so admin figures are
+read from a handful of GlobalCounter rows instead of COUNTs over whole tables.
+
+Bulk writes (``bulk_create``, ``QuerySet.update``) bypass the signals; run
+``manage.py reconcile_counters`` after them to correct any drift.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from appointments.models import Appointment
+from authentication.models import User
+from exercises.models import Exercise
+
+from .models import GlobalCounter
+
+
+def _definitions():
+    definitions = {
+        'users.total': (User, {}),
+        'users.verified': (User, {'is_verified': True}),
+        'users.active': (User, {'is_active': True}),
+        'appointments.total': (Appointment, {}),
+        'exercises.total': (Exercise, {}),
+        'exercises.active': (Exercise, {'is_active': True}),
+    }
+    for user_type, _ in User.USER_TYPES:
+        definitions[f'users.{user_type}'] = (User, {'user_type': user_type})
+    for status, _ in Appointment.STATUS_CHOICES:
+        definitions[f'appointments.{status}'] = (Appointment, {'status': status})
+    return definitions
+
+
+# name -> (model, field values a row must have to be counted)
+DEFINITIONS = _definitions()
+
+# model -> fields whose changes can move one of its counters
+TRACKED_FIELDS = {}
+for _model, _filters in DEFINITIONS.values():
+    TRACKED_FIELDS.setdefault(_model, set()).update(_filters)
+
+
+def snapshot(instance):
+    """Return the counter-relevant field values of an instance"""
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS[type(instance)]}
+
+
+def memberships(model, values):
+    """Names of the counters a row with the given field values belongs to"""
+    return {
+        name for name, (counter_model, filters) in DEFINITIONS.items()
+        if counter_model is model
+        and all(values.get(field) == expected for field, expected in filters.items())
+    }
+
+
+def true_value(name):
+    """Count the rows behind a counter from the source table"""
+    model, filters = DEFINITIONS[name]
+    return model.objects.filter(**filters).count()
+
+
+def apply(deltas):
+    """Move counters by the given amounts; a missing counter is seeded from its table"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for name, delta in sorted(deltas.items()):
+            updated = GlobalCounter.objects.filter(name=name).update(value=F('value') + delta)
+            if not updated:
+                # The source table already reflects this write, so the count is final
+                GlobalCounter.objects.get_or_create(name=name, defaults={'value': true_value(name)})
+
+
+def replace(model, previous, current):
+    """Move a row's counters from its previous to its current values (either may be None)"""
+    before = memberships(model, previous) if previous is not None else set()
+    after = memberships(model, current) if current is not None else set()
+    deltas = {name: -1 for name in before - after}
+    deltas.update({name: 1 for name in after - before})
+    apply(deltas)
+
+
+def add(model, instances):
+    """Count rows inserted without signals (``bulk_create``), one update per counter"""
+    deltas = {}
+    for instance in instances:
+        for name in memberships(model, snapshot(instance)):
+            deltas[name] = deltas.get(name, 0) + 1
+    apply(deltas)
+
+
+def get_counts(*names):
+    """Read counters in one query, seeding any that do not exist yet"""
+    values = dict(GlobalCounter.objects.filter(name__in=names).values_list('name', 'value'))
+    for name in names:
+        if name not in values:
+            counter, _ = GlobalCounter.objects.get_or_create(
+                name=name, defaults={'value': true_value(name)}
+            )
+            values[name] = counter.value
+    return values
+
+
+def reconcile(fix=True):
+    """
+    Compare every counter with its source table.
+
+    Returns ``{name: (stored, actual)}`` for counters that drifted (or were
+    missing, stored as None) and corrects them unless ``fix`` is False. The
+    counter rows are locked while counting so concurrent writers apply their
+    deltas after the corrected value instead of being overwritten.
+    """
+    with transaction.atomic():
+        counters = GlobalCounter.objects.all()
+        if fix:
+            counters = counters.select_for_update()
+        stored = dict(counters.values_list('name', 'value'))
+        drift = {}
+        for name in DEFINITIONS:
+            actual = true_value(name)
+            if stored.get(name) != actual:
+                drift[name] = (stored.get(name), actual)
+        if fix:
+            for name, (_, actual) in drift.items():
+                GlobalCounter.objects.update_or_create(name=name, defaults={'value': actual})
+    return drift
@@ -0,0 +1,159 @@
+"""
+Dashboard statistics.
+
+Each role's numbers are gathered in a single SQL statement. Patient and
+physiotherapist figures are COUNTs over filtered querysets, wrapped as scalar
+subqueries on the user's own row; filters stay in the WHERE clause so each
+subquery can use an index. Admin figures are read from ``core.counters``.
+Results are cached per user and per day; the signal handlers in
+``core.signals`` drop the affected entries whenever appointments, exercise
+plans or exercise progress change.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Func, IntegerField, Subquery
+from django.utils import timezone
+
+from appointments.models import Appointment
+from authentication.models import User
+from exercises.models import ExercisePlan, ExerciseProgress
+from exercises.streaks import get_streak
+
+from . import counters
+
+ADMIN_CACHE_KEY = 'dashboard_stats:admin'
+
+
+def cache_key(user_id, day):
+    return f'dashboard_stats:{user_id}:{day.isoformat()}'
+
+
+class _Count(Func):
+    # A plain function rather than an Aggregate so Django adds no GROUP BY
+    function = 'COUNT'
+    output_field = IntegerField()
+
+    def __init__(self, field=None, distinct=False):
+        if field is None:
+            # COUNT(*) lets the database count index entries without reading rows
+            self.template = '%(function)s(*)'
+            field = 'pk'
+        elif distinct:
+            self.template = '%(function)s(DISTINCT %(expressions)s)'
+        super().__init__(F(field))
+
+
+def count(queryset, field=None, distinct=False):
+    """Wrap a COUNT over the whole queryset as a scalar subquery"""
+    return Subquery(
+        queryset.order_by().annotate(value=_Count(field, distinct)).values('value'),
+        output_field=IntegerField()
+    )
+
+
+def _single_row(user, **figures):
+    """Evaluate all figures in one statement anchored on the user's row"""
+    return User.objects.filter(pk=user.pk).annotate(**figures).values(*figures).get()
+
+
+def patient_stats(user, today):
+    progress = ExerciseProgress.objects.filter(patient=user)
+    row = _single_row(
+        user,
+        upcoming_appointments=count(Appointment.objects.filter(
+            patient=user, date__gte=today, status__in=['scheduled', 'confirmed']
+        )),
+        active_exercise_plans=count(ExercisePlan.objects.filter(patient=user, status='active')),
+        completed_exercises_today=count(progress.filter(date_completed=today)),
+        total_progress_entries=count(progress),
+        streak_date=F('exercise_streak__last_activity_date'),
+        streak_current=F('exercise_streak__current_streak'),
+        streak_longest=F('exercise_streak__longest_streak'),
+    )
+
+    if row['streak_longest'] is None:
+        # No streak record yet (legacy data); build it once
+        streak = get_streak(user)
+        row['streak_date'] = streak.last_activity_date
+        row['streak_current'] = streak.current_streak
+        row['streak_longest'] = streak.longest_streak
+
+    return {
+        'upcoming_appointments': row['upcoming_appointments'],
+        'active_exercise_plans': row['active_exercise_plans'],
+        'completed_exercises_today': row['completed_exercises_today'],
+        'total_progress_entries': row['total_progress_entries'],
+        'exercise_streak': row['streak_current'] if row['streak_date'] == today else 0,
+        'longest_exercise_streak': row['streak_longest'],
+        'user_type': 'patient'
+    }
+
+
+def physiotherapist_stats(user, today):
+    appointments = Appointment.objects.filter(physiotherapist=user)
+    row = _single_row(
+        user,
+        today_appointments=count(appointments.filter(date=today)),
+        total_patients=count(appointments, 'patient', distinct=True),
+        pending_appointments=count(appointments.filter(status='scheduled')),
+        active_exercise_plans=count(
+            ExercisePlan.objects.filter(physiotherapist=user, status='active')
+        ),
+    )
+    return {**row, 'user_type': 'physiotherapist'}
+
+
+def admin_stats(user, today):
+    # Site-wide totals come from the denormalized counters, one indexed read
+    values = counters.get_counts(
+        'users.total', 'users.patient', 'users.physiotherapist',
+        'appointments.total', 'exercises.total'
+    )
+    return {
+        'total_users': values['users.total'],
+        'total_patients': values['users.patient'],
+        'total_physiotherapists': values['users.physiotherapist'],
+        'total_appointments': values['appointments.total'],
+        'total_exercises': values['exercises.total'],
+        'user_type': 'admin'
+    }
+
+
+def compute_dashboard_stats(user, today=None):
+    """Compute the role-specific dashboard numbers without the cache"""
+    today = today or timezone.now().date()
+    if user.user_type == 'patient':
+        return patient_stats(user, today)
+    if user.user_type == 'physiotherapist':
+        return physiotherapist_stats(user, today)
+    return admin_stats(user, today)
+
+
+def get_dashboard_stats(user):
+    """Return dashboard numbers for the user, served from the cache when possible"""
+    today = timezone.now().date()
+    is_admin = user.user_type not in ('patient', 'physiotherapist')
+    key = ADMIN_CACHE_KEY if is_admin else cache_key(user.pk, today)
+
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(user, today)
+        cache.set(key, stats, settings.DASHBOARD_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate(*user_ids):
+    """
+    Drop cached dashboard entries for the given users and the shared admin entry.
+
+    Runs after the surrounding transaction commits so a concurrent request
+    cannot re-cache the pre-write numbers.
+    """
+    def drop():
+        today = timezone.now().date()
+        keys = [cache_key(user_id, today) for user_id in set(user_ids) if user_id]
+        cache.delete_many(keys + [ADMIN_CACHE_KEY])
+
+    transaction.on_commit(drop)
@@ -0,0 +1,241 @@
+"""
+Fast read path for hot list endpoints.
+
+A ``Shape`` declares the JSON a serializer produces, field by field, as
+columns to read with ``.values_list()`` plus the conversion DRF would apply
+to each value. Rendering a page then builds plain dicts straight from row
+tuples, skipping serializer and field instantiation, and
+``ORJSONRenderer`` encodes them with orjson. The output is byte for byte
+what the serializer and ``JSONRenderer`` produce; ``core.tests`` holds the
+parity tests, so a change to a serializer needs the same change to its
+shape.
+
+Viewsets opt in with ``FastListMixin`` and a ``fast_shape``. Requests for a
+sparse fieldset (``?fields=`` and friends) still go through the serializer.
+"""
+
+from decimal import Decimal
+from operator import itemgetter
+
+from django.utils import timezone
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+
+from .fieldsets import parse_fieldsets
+from .metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+# Conversions matching the DRF fields' to_representation with the default settings
+
+def date_repr(value):
+    return value.isoformat() if value else None
+
+
+def time_repr(value):
+    return value.isoformat() if value is not None else None
+
+
+def decimal_repr(places):
+    exponent = Decimal('.1') ** places
+
+    def convert(value):
+        if value is None:
+            return ''
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent))
+    return convert
+
+
+class Columns(list):
+    """The lookups a shape reads, each selected once"""
+
+    def add(self, lookup):
+        if lookup not in self:
+            self.append(lookup)
+        return self.index(lookup)
+
+
+class Column:
+    """One column of the row, optionally converted"""
+
+    def __init__(self, lookup, convert=None):
+        self.lookup = lookup
+        self.convert = convert
+
+    def reader(self, prefix, columns, context):
+        get = itemgetter(columns.add(prefix + self.lookup))
+        if self.convert is None:
+            return get
+        convert = self.convert
+        return lambda row: convert(get(row))
+
+
+class DateTime(Column):
+    """
+    A DateTimeField column in the current time zone, as DRF renders it. The
+    zone is looked up once per render rather than once per value.
+    """
+
+    def reader(self, prefix, columns, context):
+        get = super().reader(prefix, columns, context)
+        tz = context['timezone']
+
+        def read(row):
+            value = get(row)
+            if not value:
+                return None
+            value = value.astimezone(tz) if timezone.is_aware(value) else value.replace(tzinfo=tz)
+            value = value.isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return read
+
+
+class FileURL(Column):
+    """A FileField column rendered as DRF's FileField/ImageField would (absolute URL)"""
+
+    def __init__(self, lookup, storage):
+        super().__init__(lookup)
+        self.storage = storage
+
+    def reader(self, prefix, columns, context):
+        get = super().reader(prefix, columns, context)
+        url = self.storage.url
+        request = context.get('request')
+
+        def read(row):
+            name = get(row)
+            if not name:
+                return None
+            return request.build_absolute_uri(url(name)) if request is not None else url(name)
+        return read
+
+
+class Computed:
+    """
+    A value derived from several columns, for serializer fields backed by
+    model properties. ``func`` receives the render context (which includes
+    the current ``timezone``) then the column values.
+    """
+
+    def __init__(self, func, *lookups):
+        self.func = func
+        self.lookups = lookups
+
+    def reader(self, prefix, columns, context):
+        get = itemgetter(*[columns.add(prefix + lookup) for lookup in self.lookups])
+        func = self.func
+        if len(self.lookups) == 1:
+            return lambda row: func(context, get(row))
+        return lambda row: func(context, *get(row))
+
+
+class Nested:
+    """
+    Another shape read through a relation. With ``nullable`` the nested
+    object is rendered as null when the related row is missing (reverse
+    one-to-one relations and nullable foreign keys).
+    """
+
+    def __init__(self, shape, lookup, nullable=False):
+        self.shape = shape
+        self.lookup = lookup
+        self.nullable = nullable
+
+    def reader(self, prefix, columns, context):
+        nested_prefix = f'{prefix}{self.lookup}__'
+        presence = itemgetter(columns.add(nested_prefix + 'pk')) if self.nullable else None
+        build = self.shape.builder(nested_prefix, columns, context)
+        if presence is None:
+            return build
+        return lambda row: build(row) if presence(row) is not None else None
+
+
+class Shape:
+    """
+    Ordered output fields of a serializer: ``(name, field)`` pairs where a
+    field is a lookup string, a ``Column``, ``DateTime``, ``FileURL``,
+    ``Computed`` or ``Nested``.
+    """
+
+    def __init__(self, fields):
+        self.fields = [
+            (name, Column(field) if isinstance(field, str) else field) for name, field in fields
+        ]
+
+    def builder(self, prefix, columns, context):
+        readers = [(name, field.reader(prefix, columns, context)) for name, field in self.fields]
+        return lambda row: {name: read(row) for name, read in readers}
+
+    def compile(self, context):
+        """Return ``(columns, build)``: the lookups to read and the row -> dict function"""
+        columns = Columns(['pk'])  # so keyset pagination can read row.pk
+        context = {**context, 'timezone': timezone.get_current_timezone()}
+        build = self.builder('', columns, context)
+        return columns, build
+
+    def queryset(self, queryset, context):
+        """Row tuples for ``queryset``, named so paginators can read their keys"""
+        columns, _ = self.compile(context)
+        return queryset.prefetch_related(None).values_list(*columns, named=True)
+
+    @timed_serialization
+    def render(self, rows, context):
+        _, build = self.compile(context)
+        return [build(row) for row in rows]
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same bytes through orjson.
+
+    Values orjson does not encode natively (Decimal, datetime, lazy strings,
+    querysets...) go through DRF's JSONEncoder. Two differences remain:
+    floats below 1e-4 or from 1e16 up are written without the exponent
+    padding Python uses (``1e16`` rather than ``1e+16``), and NaN is written
+    as null instead of being rejected. Indented output falls back to json.
+    """
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        # Match JSONRenderer, which escapes these so the output is a JavaScript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastListMixin:
+    """
+    ViewSet mixin serving ``list`` from ``fast_shape`` instead of the
+    serializer, rendered with ``ORJSONRenderer``.
+    """
+    fast_shape = None
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        if self.fast_shape is None or parse_fieldsets(request.query_params) is not None:
+            return super().list(request, *args, **kwargs)
+
+        context = self.get_serializer_context()
+        queryset = self.fast_shape.queryset(self.filter_queryset(self.get_queryset()), context)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.fast_shape.render(page, context))
+        return Response(self.fast_shape.render(queryset, context))
+
+    def fast_data(self, queryset):
+        """Render a whole queryset as ``list`` would, without pagination"""
+        if self.fast_shape is None or parse_fieldsets(self.request.query_params) is not None:
+            return self.get_serializer(queryset, many=True).data
+        context = self.get_serializer_context()
+        return self.fast_shape.render(self.fast_shape.queryset(queryset, context), context)
@@ -0,0 +1,239 @@
+"""
+Sparse fieldsets and embed control.
+
+Views using ``SparseFieldsetsMixin`` read three optional query parameters
+and hand them to serializers using ``DynamicFieldsMixin``:
+
+* ``?fields=id,date,patient.first_name`` renders only the listed fields.
+  Dotted names select fields of a nested serializer (and imply it).
+* ``?omit=notes,patient.email`` renders everything except the listed fields.
+* ``?expand=patient`` embeds only the listed nested serializers; every other
+  nested serializer is rendered as its primary key (or list of keys). An
+  empty ``?expand=`` collapses them all. Without the parameter nested
+  serializers are embedded as before.
+
+Names that are not fields of the serializer they address are rejected with a
+400 listing the valid ones.
+
+The view also drops the ``select_related`` / ``prefetch_related`` lookups
+that only fed fields left out of the response, so trimming the payload trims
+the joins and prefetch queries with it. Lookups that no serializer field
+accounts for are left alone.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+PARAMETERS = ('fields', 'omit', 'expand')
+
+
+def parse_fieldsets(params):
+    """Return ``{'fields': [...] | None, 'omit': [...], 'expand': [...] | None}`` or None"""
+    if not any(name in params for name in PARAMETERS):
+        return None
+
+    def names(value):
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    return {
+        'fields': (names(params['fields']) or None) if 'fields' in params else None,
+        'omit': names(params.get('omit', '')),
+        'expand': names(params['expand']) if 'expand' in params else None,
+    }
+
+
+def _split(names):
+    """Split dotted names into the names at this level and the rest per nested field"""
+    here, nested = set(), defaultdict(list)
+    for name in names or ():
+        head, _, rest = name.partition('.')
+        if rest:
+            nested[head].append(rest)
+        else:
+            here.add(head)
+    return here, nested
+
+
+def _source_root(field, name):
+    """First attribute a field reads; method fields (source ``*``) go by their name"""
+    source = field.source or name
+    return name if source == '*' else source.split('.')[0]
+
+
+def _nested(field):
+    """The nested serializer behind a field, if it is one"""
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def _collapse(field):
+    """Replace a nested serializer with its primary key(s)"""
+    kwargs = {'read_only': True}
+    if field.source:
+        kwargs['source'] = field.source
+    if isinstance(field, serializers.ListSerializer):
+        kwargs['many'] = True
+    collapsed = serializers.PrimaryKeyRelatedField(**kwargs)
+    collapsed._collapsed = True
+    return collapsed
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin applying the requested sparse fieldset (see module
+    docstring). Only the serializer the view asked for reads the request;
+    nested ones receive their part of the dotted names from their parent.
+    """
+
+    def _requested_fieldsets(self):
+        if hasattr(self, '_fieldsets'):
+            return self._fieldsets
+        requested = self.context.get('fieldsets')
+        is_root = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+        )
+        if requested and is_root and requested[0] is type(self):
+            return requested[1]
+        return None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        self._relation_roots = {_source_root(field, name) for name, field in fields.items()}
+        self._child_fieldsets = {}
+        spec = self._requested_fieldsets()
+        if spec is None:
+            return fields
+
+        only, only_nested = _split(spec['fields'])
+        omit, omit_nested = _split(spec['omit'])
+        expand, expand_nested = _split(spec['expand'])
+        for param, here, nested in (
+            ('fields', only, only_nested), ('omit', omit, omit_nested), ('expand', expand, expand_nested)
+        ):
+            unknown = sorted((here | nested.keys()) - fields.keys())
+            if unknown:
+                raise serializers.ValidationError({param: (
+                    f"Unknown field(s): {', '.join(unknown)}. Valid fields: {', '.join(fields)}"
+                )})
+
+        for name in list(fields):
+            selected = spec['fields'] is None or name in only or name in only_nested
+            if not selected or name in omit:
+                del fields[name]
+                continue
+
+            self._child_fieldsets[name] = {
+                'fields': only_nested.get(name) or None,
+                'omit': omit_nested.get(name, []),
+                'expand': None if spec['expand'] is None else expand_nested.get(name, []),
+            }
+            child = _nested(fields[name])
+            if child is None:
+                continue
+            expanded = spec['expand'] is None or name in expand or name in expand_nested or name in only_nested
+            if not expanded:
+                fields[name] = _collapse(fields[name])
+            elif isinstance(child, DynamicFieldsMixin):
+                child._fieldsets = self._child_fieldsets[name]
+                if name in only_nested or name in omit_nested or name in expand_nested:
+                    child.fields  # check the nested names even when no row is rendered
+        return fields
+
+    def nested_serializer(self, serializer_class, name, *args, **kwargs):
+        """
+        Build the serializer a method field ``name`` returns, passing it the
+        part of the requested fieldset addressed to ``name``.
+        """
+        kwargs.setdefault('context', self.context)
+        serializer = serializer_class(*args, **kwargs)
+        self.fields  # populate the nested fieldsets
+        serializer._fieldsets = self._child_fieldsets.get(name)
+        return serializer
+
+    def keeps_lookup(self, path):
+        """Whether the rendered fields still read the relation ``path`` (a list of names)"""
+        fields = self.fields
+        root, rest = path[0], path[1:]
+        if root not in self._relation_roots:
+            # Not loaded for a field of ours; the view may need it for something else
+            return True
+        for name, field in fields.items():
+            if _source_root(field, name) != root:
+                continue
+            if getattr(field, '_collapsed', False):
+                # A foreign key id is on the row; a list of ids still needs the relation itself
+                if not rest and isinstance(field, serializers.ManyRelatedField):
+                    return True
+                continue
+            child = _nested(field)
+            if not rest or not isinstance(child, DynamicFieldsMixin) or child.keeps_lookup(rest):
+                return True
+        return False
+
+    def _kept_prefix(self, lookup):
+        """The longest prefix of a ``__`` lookup the rendered fields still read"""
+        parts = lookup.split('__')
+        kept = 0
+        while kept < len(parts) and self.keeps_lookup(parts[:kept + 1]):
+            kept += 1
+        return '__'.join(parts[:kept])
+
+    def prune_queryset(self, queryset):
+        """Drop select_related and prefetch_related lookups only needed by omitted fields"""
+        if self._requested_fieldsets() is None:
+            return queryset
+
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            paths = []
+
+            def walk(tree, prefix):
+                for name, subtree in tree.items():
+                    if subtree:
+                        walk(subtree, f'{prefix}{name}__')
+                    else:
+                        paths.append(f'{prefix}{name}')
+
+            walk(select_related, '')
+            kept = {self._kept_prefix(path) for path in paths} - {''}
+            queryset = queryset.select_related(None)
+            if kept:
+                # select_related() without arguments would follow every foreign key
+                queryset = queryset.select_related(*kept)
+
+        lookups = []
+        for lookup in queryset._prefetch_related_lookups:
+            if isinstance(lookup, Prefetch):
+                # Custom querysets are kept or dropped whole
+                if self._kept_prefix(lookup.prefetch_to) == lookup.prefetch_to:
+                    lookups.append(lookup)
+            else:
+                prefix = self._kept_prefix(lookup)
+                if prefix and prefix not in lookups:
+                    lookups.append(prefix)
+        return queryset.prefetch_related(None).prefetch_related(*lookups)
+
+
+class SparseFieldsetsMixin:
+    """
+    Generic view mixin passing ``?fields=`` / ``?omit=`` / ``?expand=`` to
+    the serializer and pruning the queryset's related lookups to match.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        request = getattr(self, 'request', None)
+        spec = parse_fieldsets(request.query_params) if request is not None else None
+        if spec is not None:
+            context['fieldsets'] = (self.get_serializer_class(), spec)
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer = self.get_serializer()
+        if isinstance(serializer, DynamicFieldsMixin):
+            queryset = serializer.prune_queryset(queryset)
+        return queryset
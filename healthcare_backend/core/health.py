@@ -0,0 +1,104 @@
+"""
+Readiness checks.
+
+Each check exercises one subsystem the API depends on and reports its
+latency. Results are memoized per process for HEALTH_CHECK_CACHE_SECONDS so a
+burst of load balancer probes triggers a single real check; concurrent
+probes wait for the check in flight instead of starting their own.
+
+The report is public, so failures are logged with their exception and only
+reported as an error status; exception text can name hosts and credentials.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_memo = {'expires': 0.0, 'result': None}
+
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_cache():
+    key = f'readyz:{uuid.uuid4().hex}'
+    cache.set(key, '1', 10)
+    value = cache.get(key)
+    cache.delete(key)
+    if value != '1':
+        raise RuntimeError('cache did not return the value written')
+
+
+def check_storage():
+    name = default_storage.save(f'healthchecks/readyz-{uuid.uuid4().hex}.txt', ContentFile(b'ok'))
+    default_storage.delete(name)
+
+
+def check_migrations():
+    executor = MigrationExecutor(connection)
+    pending = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if pending:
+        raise RuntimeError(f'{len(pending)} unapplied migrations')
+
+
+CHECKS = (
+    ('database', check_database),
+    ('cache', check_cache),
+    ('storage', check_storage),
+    ('migrations', check_migrations),
+)
+
+
+def run_checks():
+    """Run every check and return the readiness report"""
+    results = {}
+    for name, check in CHECKS:
+        start = time.perf_counter()
+        try:
+            check()
+            result = {'status': 'ok'}
+        except Exception:
+            logger.exception(f"Readiness check failed: {name}")
+            result = {'status': 'error'}
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        results[name] = result
+
+    healthy = all(result['status'] == 'ok' for result in results.values())
+    return {
+        'status': 'ok' if healthy else 'unavailable',
+        'checked_at': timezone.now().isoformat(),
+        'checks': results,
+    }
+
+
+def readiness():
+    """Return ``(report, cached)``, running the checks at most once per TTL"""
+    ttl = getattr(settings, 'HEALTH_CHECK_CACHE_SECONDS', 5)
+    now = time.monotonic()
+    if _memo['result'] is not None and now < _memo['expires']:
+        return _memo['result'], True
+
+    with _lock:
+        # Another thread may have refreshed the result while we waited
+        now = time.monotonic()
+        if _memo['result'] is not None and now < _memo['expires']:
+            return _memo['result'], True
+        result = run_checks()
+        _memo['result'] = result
+        _memo['expires'] = time.monotonic() + ttl
+        return result, False
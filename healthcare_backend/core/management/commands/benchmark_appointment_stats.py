@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from appointments import rollups
+from appointments.models import Appointment
+from authentication.models import User
+from core import benchmarks
+
+STATUSES = ('scheduled', 'confirmed', 'completed', 'cancelled', 'no_show')
+
+
+def legacy_statistics(queryset):
+    """The original one-COUNT-per-figure implementation of AppointmentViewSet.statistics"""
+    now = timezone.now()
+    stats = {'total': queryset.count()}
+    for status in STATUSES:
+        stats[status] = queryset.filter(status=status).count()
+    stats['current_month'] = queryset.filter(date__year=now.year, date__month=now.month).count()
+    week_start = now.date() - timedelta(days=now.weekday())
+    stats['current_week'] = queryset.filter(date__range=[week_start, week_start + timedelta(days=6)]).count()
+    return stats
+
+
+def single_pass_statistics(queryset):
+    today = timezone.now().date()
+    month_start = today.replace(day=1)
+    week_start = today - timedelta(days=today.weekday())
+    figures = {'total': Count('id')}
+    figures.update({status: Count('id', filter=Q(status=status)) for status in STATUSES})
+    figures['current_month'] = Count(
+        'id', filter=Q(date__range=[month_start, rollups.add_months(month_start, 1) - timedelta(days=1)])
+    )
+    figures['current_week'] = Count('id', filter=Q(date__range=[week_start, week_start + timedelta(days=6)]))
+    return queryset.aggregate(**figures)
+
+
+def scanned_trends(queryset, months):
+    """Monthly figures grouped straight from the appointments table"""
+    first_month = rollups.add_months(timezone.now().date().replace(day=1), 1 - months)
+    return list(queryset.filter(date__gte=first_month).order_by().annotate(
+        month=TruncMonth('date')
+    ).values('month', 'status', 'payment_status').annotate(total=Count('id'), cost=Sum('cost')))
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark appointment statistics (separate COUNTs against one conditional '
+        'aggregate) and monthly trends (grouping appointments against reading the '
+        'rollups). Data is seeded in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=100_000)
+        parser.add_argument('--years', type=int, default=4, help='Years of appointments to seed')
+        parser.add_argument('--months', type=int, default=36, help='Months of trends to read')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmarks.rolled_back():
+            patients = benchmarks.create_users('bench_stats_patient', 'patient', 2000)
+            physiotherapists = benchmarks.create_users('bench_stats_physio', 'physiotherapist', 20)
+            benchmarks.seed_appointments(
+                options['appointments'], patients, physiotherapists, days=options['years'] * 365
+            )
+            # bulk_create bypasses the rollup signals
+            stored = rollups.rebuild()
+            self.stdout.write(f"Seeded {options['appointments']} appointments, {stored} rollup rows\n")
+
+            scopes = (
+                (physiotherapists[0], Appointment.objects.filter(physiotherapist=physiotherapists[0])),
+                (patients[0], Appointment.objects.filter(patient=patients[0])),
+                (User(user_type='admin'), Appointment.objects.all()),
+            )
+            for user, appointments in scopes:
+                rows = rollups.for_user(user)
+                self.stdout.write(self.style.MIGRATE_HEADING(user.user_type))
+                results = (
+                    ('statistics: separate COUNTs', benchmarks.measure(
+                        lambda: legacy_statistics(appointments), options['iterations']
+                    )),
+                    ('statistics: one aggregate', benchmarks.measure(
+                        lambda: single_pass_statistics(appointments), options['iterations']
+                    )),
+                    ('trends: grouped appointments', benchmarks.measure(
+                        lambda: scanned_trends(appointments, options['months']), options['iterations']
+                    )),
+                    ('trends: rollups', benchmarks.measure(
+                        lambda: rollups.trends(rows, timezone.now().date(), options['months']),
+                        options['iterations']
+                    )),
+                )
+                for name, result in results:
+                    self.stdout.write(benchmarks.format_result(name, result))
+                self.stdout.write('')
@@ -0,0 +1,95 @@
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointments import availability, scheduling
+from authentication.models import PhysiotherapistProfile
+from core import benchmarks
+
+# (start, end) of the ranges asked for, e.g. "who is free 14:00-15:00"
+RANGES = ((time(9), time(10)), (time(14), time(15)), (time(16, 30), time(17, 15)))
+
+
+def slot_search(physiotherapist_ids, day, start_time, end_time):
+    """The available_time_slots way: compute every physiotherapist's free slots of that length"""
+    duration = scheduling._minutes(end_time) - scheduling._minutes(start_time)
+    wanted = start_time.strftime('%H:%M')
+    slots = scheduling.available_slots(physiotherapist_ids, day, day, duration)
+    return sorted(
+        physiotherapist_id for physiotherapist_id, days in slots.items()
+        if any(slot['start_time'] == wanted for slot in days[day])
+    )
+
+
+def interval_search(physiotherapist_ids, day, start_time, end_time):
+    """Free intervals from working hours minus appointments, the same engine without slot cutting"""
+    start, end = scheduling._minutes(start_time), scheduling._minutes(end_time)
+    schedules = scheduling.load_schedules(physiotherapist_ids)
+    busy = scheduling.load_busy(list(schedules), day, day)
+    return sorted(
+        physiotherapist_id for physiotherapist_id, schedule in schedules.items()
+        if any(
+            free_start <= start and end <= free_end
+            for free_start, free_end in scheduling.free_intervals(
+                schedule.get(day.weekday(), []), busy.get((physiotherapist_id, day), [])
+            )
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark "which physiotherapists are free at this time": the slot engine '
+        'behind available_time_slots versus the precomputed availability bitmaps. '
+        'Data is seeded in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--physiotherapists', type=int, default=300)
+        parser.add_argument('--appointments', type=int, default=20_000)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with benchmarks.rolled_back():
+            patients = benchmarks.create_users('bench_availability_patient', 'patient', 100)
+            physiotherapists = benchmarks.create_users(
+                'bench_availability_physio', 'physiotherapist', options['physiotherapists']
+            )
+            PhysiotherapistProfile.objects.bulk_create([
+                PhysiotherapistProfile(
+                    user=physiotherapist, license_number=f'BENCH-{physiotherapist.pk}',
+                    working_hours={
+                        day: [{'start': '08:00', 'end': '12:00'}, {'start': '13:00', 'end': '18:00'}]
+                        for day in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday')
+                    }
+                )
+                for physiotherapist in physiotherapists
+            ])
+            benchmarks.seed_appointments(options['appointments'], patients, physiotherapists, days=60)
+            ids = [physiotherapist.pk for physiotherapist in physiotherapists]
+
+            today = timezone.now().date()
+            day = today + timedelta(days=(1 - today.weekday()) % 7 or 7)  # next Tuesday
+            stored = availability.rebuild([day])
+            self.stdout.write(f'{len(ids)} physiotherapists, {stored} availability rows for {day}\n')
+
+            for start_time, end_time in RANGES:
+                label = f'{start_time:%H:%M}-{end_time:%H:%M}'
+                expected = interval_search(ids, day, start_time, end_time)
+                found = availability.free_physiotherapists(day, start_time, end_time)
+                if found != expected:
+                    self.stdout.write(self.style.ERROR(f'{label}: bitmaps disagree with the slot engine'))
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({len(found)} free)'))
+                for name, search in (
+                    ('slot engine (available_slots)', slot_search),
+                    ('free intervals', interval_search),
+                ):
+                    result = benchmarks.measure(lambda: search(ids, day, start_time, end_time), options['iterations'])
+                    self.stdout.write(benchmarks.format_result(name, result))
+                result = benchmarks.measure(
+                    lambda: availability.free_physiotherapists(day, start_time, end_time), options['iterations']
+                )
+                self.stdout.write(benchmarks.format_result('availability bitmaps', result))
+                self.stdout.write('')
@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointments.models import Appointment
+from authentication.models import User
+from core import benchmarks, counters
+from core.dashboard import compute_dashboard_stats, get_dashboard_stats
+from exercises.models import (
+    Exercise, ExerciseCategory, ExercisePlan, ExercisePlanItem, ExerciseProgress
+)
+
+
+def legacy_exercise_streak(user):
+    """The original one-query-per-day streak loop"""
+    today = timezone.now().date()
+    streak = 0
+    current_date = today
+    while True:
+        if not ExerciseProgress.objects.filter(patient=user, date_completed=current_date).exists():
+            break
+        streak += 1
+        current_date -= timedelta(days=1)
+        if streak > 365:
+            break
+    return streak
+
+
+def legacy_dashboard_stats(user):
+    """The original separate-COUNT implementation of dashboard_stats"""
+    today = timezone.now().date()
+    if user.user_type == 'patient':
+        return {
+            'upcoming_appointments': Appointment.objects.filter(
+                patient=user, date__gte=today, status__in=['scheduled', 'confirmed']
+            ).count(),
+            'active_exercise_plans': ExercisePlan.objects.filter(patient=user, status='active').count(),
+            'completed_exercises_today': ExerciseProgress.objects.filter(
+                patient=user, date_completed=today
+            ).count(),
+            'total_progress_entries': ExerciseProgress.objects.filter(patient=user).count(),
+            'exercise_streak': legacy_exercise_streak(user),
+        }
+    if user.user_type == 'physiotherapist':
+        return {
+            'today_appointments': Appointment.objects.filter(physiotherapist=user, date=today).count(),
+            'total_patients': Appointment.objects.filter(
+                physiotherapist=user
+            ).values('patient').distinct().count(),
+            'pending_appointments': Appointment.objects.filter(
+                physiotherapist=user, status='scheduled'
+            ).count(),
+            'active_exercise_plans': ExercisePlan.objects.filter(
+                physiotherapist=user, status='active'
+            ).count(),
+        }
+    return {
+        'total_users': User.objects.count(),
+        'total_patients': User.objects.filter(user_type='patient').count(),
+        'total_physiotherapists': User.objects.filter(user_type='physiotherapist').count(),
+        'total_appointments': Appointment.objects.count(),
+        'total_exercises': Exercise.objects.count(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark dashboard_stats before and after the single-query/cached rewrite. '
+        'Data is seeded in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=100_000)
+        parser.add_argument('--patients', type=int, default=2_000)
+        parser.add_argument('--physiotherapists', type=int, default=50)
+        parser.add_argument('--streak-days', type=int, default=365)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with benchmarks.rolled_back():
+            patient, physiotherapist, admin = self.seed(options)
+            self.stdout.write(
+                f"Seeded {options['appointments']} appointments, "
+                f"{options['streak_days']}-day streak for the benchmark patient\n"
+            )
+            for user in (patient, physiotherapist, admin):
+                self.run_role(user, options['iterations'])
+
+    def seed(self, options):
+        patients = benchmarks.create_users('bench_patient', 'patient', options['patients'])
+        physiotherapists = benchmarks.create_users(
+            'bench_physio', 'physiotherapist', options['physiotherapists']
+        )
+        admin = User.objects.create(username='bench_admin', user_type='admin', is_staff=True)
+        benchmarks.seed_appointments(options['appointments'], patients, physiotherapists)
+
+        # Give one patient an unbroken streak so the legacy loop shows its worst case
+        patient, physiotherapist = patients[0], physiotherapists[0]
+        today = timezone.now().date()
+        category = ExerciseCategory.objects.create(name='Benchmark category')
+        exercise = Exercise.objects.create(
+            name='Benchmark exercise', description='Benchmark', category=category, duration=10
+        )
+        plan = ExercisePlan.objects.create(
+            name='Benchmark plan', description='Benchmark', patient=patient,
+            physiotherapist=physiotherapist, status='active',
+            start_date=today - timedelta(days=400), end_date=today + timedelta(days=30)
+        )
+        item = ExercisePlanItem.objects.create(exercise_plan=plan, exercise=exercise, day_of_week=0)
+        ExerciseProgress.objects.bulk_create([
+            ExerciseProgress(
+                patient=patient, exercise_plan_item=item,
+                date_completed=today - timedelta(days=offset)
+            )
+            for offset in range(options['streak_days'])
+        ])
+        # bulk_create bypasses the counter signals
+        counters.reconcile()
+        return patient, physiotherapist, admin
+
+    def run_role(self, user, iterations):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{user.user_type} ({user.username})'))
+        results = [
+            ('before: separate COUNTs', benchmarks.measure(
+                lambda: legacy_dashboard_stats(user), iterations
+            )),
+            ('after: single query, cold cache', benchmarks.measure(
+                lambda: compute_dashboard_stats(user), iterations
+            )),
+        ]
+        cache.clear()
+        get_dashboard_stats(user)
+        results.append(('after: cached', benchmarks.measure(
+            lambda: get_dashboard_stats(user), iterations
+        )))
+        for label, result in results:
+            self.stdout.write(benchmarks.format_result(label, result))
+        self.stdout.write('')
@@ -0,0 +1,94 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from core import benchmarks
+from exercises.models import Exercise, ExerciseCategory
+from notifications.models import Notification
+
+METRICS_MIDDLEWARE = 'core.metrics.MetricsMiddleware'
+
+ENDPOINTS = (
+    '/api/appointments/',
+    '/api/exercises/',
+    '/api/notifications/',
+    '/api/dashboard/stats/',
+)
+
+
+def client_for(user, middleware):
+    """An authenticated client whose handler is built with ``middleware``"""
+    client = APIClient()
+    client.force_authenticate(user)
+    with override_settings(MIDDLEWARE=middleware):
+        client.get('/healthz')  # builds and keeps the middleware chain
+    return client
+
+
+def timed_get(client, path):
+    start = time.perf_counter()
+    response = client.get(path)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, f'{path} returned {response.status_code}'
+    return elapsed * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the request time core.metrics.MetricsMiddleware adds by '
+        'serving the same requests with and without it, interleaved. Data is '
+        'seeded in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=300, help='Requests per endpoint and side')
+        parser.add_argument('--max-overhead', type=float, default=2.0, help='Overhead budget in percent')
+
+    def handle(self, *args, **options):
+        middleware = list(settings.MIDDLEWARE)
+        without = [entry for entry in middleware if entry != METRICS_MIDDLEWARE]
+        if METRICS_MIDDLEWARE not in middleware:
+            middleware.insert(0, METRICS_MIDDLEWARE)
+
+        with benchmarks.rolled_back():
+            patients = benchmarks.create_users('bench_metrics_patient', 'patient', 20)
+            physios = benchmarks.create_users('bench_metrics_physio', 'physiotherapist', 5)
+            benchmarks.seed_appointments(2000, patients, physios)
+            category = ExerciseCategory.objects.create(name='Benchmark')
+            Exercise.objects.bulk_create([
+                Exercise(name=f'Exercise {index}', description='Benchmark exercise',
+                         category=category, duration=30)
+                for index in range(200)
+            ])
+            Notification.objects.bulk_create([
+                Notification(recipient=patients[0], notification_type='system',
+                             title='Benchmark', message='Benchmark notification')
+                for _ in range(200)
+            ])
+
+            plain = client_for(patients[0], without)
+            instrumented = client_for(patients[0], middleware)
+            totals = {'off': 0.0, 'on': 0.0}
+            for path in ENDPOINTS:
+                for client in (plain, instrumented):
+                    timed_get(client, path)  # warm up
+                off, on = [], []
+                for _ in range(options['iterations']):
+                    off.append(timed_get(plain, path))
+                    on.append(timed_get(instrumented, path))
+                off_ms, on_ms = statistics.median(off), statistics.median(on)
+                totals['off'] += off_ms
+                totals['on'] += on_ms
+                self.stdout.write(
+                    f'{path:<32} without={off_ms:>8.3f}ms  with={on_ms:>8.3f}ms  '
+                    f'overhead={(on_ms - off_ms) / off_ms * 100:>6.2f}%'
+                )
+
+        overhead = (totals['on'] - totals['off']) / totals['off'] * 100
+        message = f'Overall overhead {overhead:.2f}% (budget {options["max_overhead"]:.1f}%)'
+        style = self.style.SUCCESS if overhead <= options['max_overhead'] else self.style.ERROR
+        self.stdout.write(style(message))
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from authentication.models import User
+from chat.models import Conversation, Message
+from chat.views import TranscriptPagination
+from core import benchmarks
+from core.pagination import KeysetPagination, encode_cursor
+from notifications.models import Notification
+
+PAGE_SIZE = 20
+
+
+def _request(**params):
+    return Request(APIRequestFactory().get('/bench/', params))
+
+
+def page_number(queryset, page):
+    """One page through the previous default: COUNT(*) plus OFFSET"""
+    paginator = PageNumberPagination()
+    paginator.page_size = PAGE_SIZE
+    return paginator.paginate_queryset(queryset, _request(page=page))
+
+
+def keyset(paginator_class, queryset, **cursor):
+    return paginator_class().paginate_queryset(queryset, _request(limit=PAGE_SIZE, **cursor))
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark page-number versus keyset pagination of notifications and '
+        'messages at the first and a deep page. Data is seeded in a transaction '
+        'that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5000, help='Depth of the deep page')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        pages = options['pages']
+        rows = pages * PAGE_SIZE
+        with benchmarks.rolled_back():
+            recipient, other = benchmarks.create_users('bench_page', 'patient', 2)
+            conversation = Conversation.objects.create()
+            self.seed(recipient, other, conversation, rows)
+
+            cases = (
+                ('notifications', Notification.objects.filter(recipient=recipient),
+                 KeysetPagination, '-created_at'),
+                ('messages', Message.objects.filter(conversation=conversation),
+                 TranscriptPagination, 'created_at'),
+            )
+            for label, queryset, paginator_class, ordering in cases:
+                # Cursor of the last row before the deep page, as a client would hold it
+                previous = queryset.order_by('-created_at', '-pk')[(pages - 1) * PAGE_SIZE - 1]
+                cursor = encode_cursor(previous.created_at, previous.pk)
+                ordered = queryset.order_by(ordering)
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({rows} rows)'))
+                for name, func in (
+                    ('page number: page 1', lambda: page_number(ordered, 1)),
+                    (f'page number: page {pages}', lambda: page_number(ordered, pages)),
+                    ('keyset: page 1', lambda: keyset(paginator_class, queryset)),
+                    (f'keyset: page {pages}', lambda: keyset(paginator_class, queryset, before=cursor)),
+                ):
+                    result = benchmarks.measure(func, options['iterations'])
+                    self.stdout.write(benchmarks.format_result(name, result))
+                self.stdout.write('')
+
+    def seed(self, recipient, other, conversation, rows, batch_size=10_000):
+        """Bulk create ``rows`` notifications and messages, one second apart"""
+        conversation.participants.add(recipient, other)
+        start = timezone.now() - timedelta(seconds=rows)
+        for offset in range(0, rows, batch_size):
+            count = min(batch_size, rows - offset)
+            stamps = [start + timedelta(seconds=offset + index) for index in range(count)]
+            notifications = Notification.objects.bulk_create([
+                Notification(
+                    recipient=recipient, notification_type='system',
+                    title='Benchmark', message='Benchmark notification'
+                )
+                for _ in stamps
+            ])
+            messages = Message.objects.bulk_create([
+                Message(conversation=conversation, sender=other, content='Benchmark message')
+                for _ in stamps
+            ])
+            # auto_now_add ignores explicit values on create, so spread the timestamps afterwards
+            for notification, message, stamp in zip(notifications, messages, stamps):
+                notification.created_at = message.created_at = stamp
+            Notification.objects.bulk_update(notifications, ['created_at'])
+            Message.objects.bulk_update(messages, ['created_at'])
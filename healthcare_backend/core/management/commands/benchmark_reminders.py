@@ -0,0 +1,67 @@
+import random
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from appointments.models import Appointment
+from core import benchmarks
+from notifications import reminders
+from notifications.models import Notification, NotificationPreference
+
+LATEST_START = dt_time(23, 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time send_appointment_reminders over many due appointments. Data is '
+        'seeded in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=100_000)
+        parser.add_argument('--chunk-size', type=int, default=reminders.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        with benchmarks.rolled_back():
+            patients = benchmarks.create_users('bench_reminder_patient', 'patient', 2000)
+            physiotherapists = benchmarks.create_users('bench_reminder_physio', 'physiotherapist', 100)
+            # A tenth of the patients turned reminders off
+            NotificationPreference.objects.bulk_create([
+                NotificationPreference(user=patient, appointment_reminders=False) for patient in patients[::10]
+            ])
+
+            rng = random.Random(42)
+            now = timezone.localtime()
+            batch = []
+            for _ in range(options['appointments']):
+                start = now + timedelta(minutes=rng.randint(1, 23 * 60))
+                # Keep the appointment within its day
+                start_time = min(start.time().replace(second=0, microsecond=0), LATEST_START)
+                batch.append(Appointment(
+                    patient=rng.choice(patients), physiotherapist=rng.choice(physiotherapists),
+                    date=start.date(), start_time=start_time,
+                    end_time=(datetime.combine(start.date(), start_time) + timedelta(minutes=45)).time(),
+                    reason='Benchmark appointment',
+                ))
+            Appointment.objects.bulk_create(batch, batch_size=5000)
+            self.stdout.write(f'Seeded {Appointment.objects.filter(reminder_sent=False).count()} appointments')
+
+            counter = benchmarks.QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                totals = reminders.dispatch(chunk_size=options['chunk_size'])
+                elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"Handled {totals['appointments']} appointments and created "
+                f"{Notification.objects.filter(title=reminders.TITLE).count()} reminders in {elapsed:.2f}s "
+                f'({counter.count} queries, {totals["appointments"] / elapsed:,.0f} appointments/s)'
+            )
+
+            start = time.perf_counter()
+            again = reminders.dispatch(chunk_size=options['chunk_size'])
+            self.stdout.write(
+                f"Second run: {again['appointments']} appointments in {time.perf_counter() - start:.3f}s"
+            )
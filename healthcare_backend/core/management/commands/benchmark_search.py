@@ -0,0 +1,80 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from authentication.models import User
+from core import benchmarks, search
+from exercises.models import Exercise, ExerciseCategory
+
+VOCABULARY = (
+    'knee shoulder hip ankle wrist spine neck elbow hamstring quadriceps calf glute '
+    'stretch strengthen mobility balance stability rotation flexion extension '
+    'resistance band foam roller seated standing supine prone isometric eccentric '
+    'rehabilitation posture core breathing endurance range motion control gentle '
+    'progressive hold repeat slowly lower raise bend straighten squeeze release'
+).split()
+
+QUERIES = ('knee', 'hamstring stretch', 'resistance band shoulder', 'eccentr', 'posture core control')
+
+
+def legacy_search(user, query):
+    """The original icontains scan over exercises"""
+    return list(Exercise.objects.filter(
+        Q(name__icontains=query) | Q(description__icontains=query)
+    )[:5])
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark search_global: icontains scans versus the full-text index. '
+        'Data is seeded in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Exercises to index')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmarks.rolled_back():
+            user = User.objects.create(username='bench_search_physio', user_type='physiotherapist')
+            self.seed(options['rows'])
+
+            start = time.perf_counter()
+            indexed = search.rebuild()
+            self.stdout.write(f'Indexed {indexed} documents in {time.perf_counter() - start:.1f}s\n')
+
+            for query in QUERIES:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'q={query!r}'))
+                before = benchmarks.measure(lambda: legacy_search(user, query), options['iterations'])
+                after = benchmarks.measure(lambda: search.search(user, query), options['iterations'])
+                self.stdout.write(benchmarks.format_result('before: icontains scan', before))
+                self.stdout.write(benchmarks.format_result('after: full-text index', after))
+                self.stdout.write('')
+
+    def seed(self, rows, batch_size=10_000):
+        """
+        Bulk create exercises whose text follows a Zipf-like word distribution,
+        so query terms range from common to rare as in real descriptions.
+        """
+        rng = random.Random(42)
+        filler = [f'term{index}' for index in range(5_000)]
+        words = list(VOCABULARY) + filler
+        rng.shuffle(words)
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+
+        category = ExerciseCategory.objects.create(name='Benchmark category')
+        batch = []
+        for index in range(rows):
+            batch.append(Exercise(
+                name=' '.join(rng.choices(words, weights, k=3)).capitalize() + f' {index}',
+                description=' '.join(rng.choices(words, weights, k=40)),
+                instructions='Benchmark',
+                category=category,
+                duration=10,
+            ))
+            if len(batch) >= batch_size:
+                Exercise.objects.bulk_create(batch)
+                batch = []
+        Exercise.objects.bulk_create(batch)
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from appointments.models import Appointment
+from appointments.serializers import APPOINTMENT_SHAPE, AppointmentSerializer, with_schedule
+from core import benchmarks
+from core.fastpath import ORJSONRenderer
+from exercises.models import Exercise, ExerciseCategory
+from exercises.serializers import EXERCISE_SHAPE, ExerciseSerializer
+from notifications.models import Notification
+from notifications.serializers import NOTIFICATION_SHAPE, NotificationSerializer
+
+
+def serializer_path(serializer_class, queryset, context):
+    """The default list path: model instances, ModelSerializer, JSONRenderer"""
+    return JSONRenderer().render(serializer_class(queryset.all(), many=True, context=context).data)
+
+
+def fast_path(shape, queryset, context):
+    """The core.fastpath list path: values_list rows, shape, ORJSONRenderer"""
+    return ORJSONRenderer().render(shape.render(shape.queryset(queryset.all(), context), context))
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark rendering list pages through the serializers versus the '
+        'core.fastpath shapes, in rows per second (query time included). Data '
+        'is seeded in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows rendered per call')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        request = Request(APIRequestFactory().get('/bench/'))
+        context = {'request': request}
+        with benchmarks.rolled_back():
+            patients = benchmarks.create_users('bench_render_patient', 'patient', 50)
+            physios = benchmarks.create_users('bench_render_physio', 'physiotherapist', 10)
+            benchmarks.seed_appointments(rows, patients, physios)
+            category = ExerciseCategory.objects.create(name='Benchmark')
+            Exercise.objects.bulk_create([
+                Exercise(name=f'Exercise {index}', description='Benchmark exercise',
+                         category=category, duration=30)
+                for index in range(rows)
+            ])
+            Notification.objects.bulk_create([
+                Notification(recipient=patients[index % len(patients)], notification_type='system',
+                             title='Benchmark', message='Benchmark notification')
+                for index in range(rows)
+            ])
+
+            cases = (
+                ('AppointmentSerializer', AppointmentSerializer, APPOINTMENT_SHAPE,
+                 with_schedule(Appointment.objects.select_related('patient', 'physiotherapist', 'feedback'))
+                 .order_by('id')),
+                ('ExerciseSerializer', ExerciseSerializer, EXERCISE_SHAPE,
+                 Exercise.objects.select_related('category').order_by('id')),
+                ('NotificationSerializer', NotificationSerializer, NOTIFICATION_SHAPE,
+                 Notification.objects.select_related('recipient').order_by('id')),
+            )
+            for label, serializer_class, shape, queryset in cases:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({rows} rows per call)'))
+                for name, func in (
+                    ('serializer', lambda: serializer_path(serializer_class, queryset, context)),
+                    ('fast path', lambda: fast_path(shape, queryset, context)),
+                ):
+                    result = benchmarks.measure(func, options['iterations'])
+                    rate = rows / (result['p50_ms'] / 1000)
+                    self.stdout.write(f'{benchmarks.format_result(name, result)}  rows/sec={rate:>10,.0f}')
+                self.stdout.write('')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import activity
+
+
+class Command(BaseCommand):
+    help = 'Regenerate every recent-activity feed entry from appointments, progress, feedback and documents'
+
+    def handle(self, *args, **options):
+        total = activity.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt activity for {total} source rows'))
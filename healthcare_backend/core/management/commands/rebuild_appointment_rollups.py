@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from appointments import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the monthly appointment rollups from the appointments table, '
+        'e.g. after appointments were changed with QuerySet.update'
+    )
+
+    def handle(self, *args, **options):
+        total = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} monthly rollup rows'))
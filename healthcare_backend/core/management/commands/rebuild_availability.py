@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointments import availability
+from appointments.models import AvailabilityDay
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the availability bitmaps of every physiotherapist from today '
+        'on and drop those of past days'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180, help='Days from today to precompute')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        pruned, _ = AvailabilityDay.objects.filter(date__lt=today).delete()
+        days = [today + timedelta(days=offset) for offset in range(options['days'])]
+        total = availability.rebuild(days)
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} availability days, dropped {pruned} past ones'))
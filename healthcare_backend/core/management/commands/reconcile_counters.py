@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the global counters from their source tables and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drift without correcting it'
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile(fix=not options['dry_run'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('All counters are accurate'))
+            return
+        for name, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f'{name}: stored={stored} actual={actual}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} counters drifted (not fixed)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(drift)} counters'))
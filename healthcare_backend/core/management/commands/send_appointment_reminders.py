@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications import reminders
+
+
+class Command(BaseCommand):
+    help = (
+        'Notify patients of appointments starting within the reminder lead time. '
+        'Safe to run from cron or as a worker (--interval) on several nodes at once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lead-hours', type=int, default=settings.APPOINTMENT_REMINDER_LEAD_HOURS,
+            help='Remind of appointments starting within this many hours'
+        )
+        parser.add_argument('--chunk-size', type=int, default=reminders.CHUNK_SIZE)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running, dispatching every this many seconds (0 runs once)'
+        )
+
+    def handle(self, *args, **options):
+        lead = timedelta(hours=options['lead_hours'])
+        while True:
+            start = time.perf_counter()
+            totals = reminders.dispatch(lead=lead, chunk_size=options['chunk_size'])
+            self.stdout.write(
+                f"Handled {totals['appointments']} appointments, sent {totals['notifications']} "
+                f"reminders in {time.perf_counter() - start:.2f}s"
+            )
+            if not options['interval']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
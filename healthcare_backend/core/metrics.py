@@ -0,0 +1,254 @@
+"""
+Per-route request metrics.
+
+``MetricsMiddleware`` times every request and the SQL it runs; queries are
+counted by an execute wrapper added to each database connection as it is
+opened, which records into the current request's ``RequestMetrics`` (entering
+``connection.execute_wrapper()`` per request cost more than the rest of the
+middleware together). Serialization time is the time spent in serializers'
+``.data``, in ``core.fastpath`` shapes and in rendering the response; nested
+serializers are only counted once.
+
+Totals are kept per resolved route name and method in this process (each
+worker reports its own) and served at ``/api/metrics/`` as JSON or, with
+``?format=prometheus``, in the Prometheus text format. ``benchmark_metrics``
+measures what the instrumentation costs per request.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent"""
+    __slots__ = ('queries', 'sql_time', 'serialization_time', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialization_time = 0.0
+        self.serializing = False
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper adding the statement to the current request's metrics"""
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.sql_time += time.perf_counter() - start
+        recorder.queries += 1
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_serialization(func):
+    """Add the time spent in ``func`` to the current request's serialization time"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        recorder = _current.get()
+        if recorder is None or recorder.serializing:
+            return func(*args, **kwargs)
+        recorder.serializing = True
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recorder.serialization_time += time.perf_counter() - start
+            recorder.serializing = False
+    wrapper.timed_serialization = True
+    return wrapper
+
+
+def instrument():
+    """
+    Wrap new database connections with ``record_query`` and time
+    ``BaseSerializer.data``, which ``Serializer.data`` and
+    ``ListSerializer.data`` both go through. Called from ``CoreConfig.ready``.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    if not getattr(settings, 'API_METRICS_ENABLED', True):
+        return
+    connection_created.connect(install_query_wrapper, dispatch_uid='core.metrics')
+    data = BaseSerializer.data
+    if not getattr(data.fget, 'timed_serialization', False):
+        BaseSerializer.data = property(timed_serialization(data.fget), doc=data.__doc__)
+
+
+class RouteMetrics:
+    __slots__ = ('requests', 'buckets', 'latency', 'queries', 'sql_time', 'serialization_time')
+
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialization_time = 0.0
+
+
+class Registry:
+    """Thread-safe per-process totals keyed by ``(route, method)``"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+            self.started_at = timezone.now()
+
+    def record(self, route, method, latency, recorder):
+        bucket = bisect_left(LATENCY_BUCKETS, latency)
+        with self._lock:
+            metrics = self._routes.get((route, method))
+            if metrics is None:
+                metrics = self._routes[(route, method)] = RouteMetrics()
+            metrics.requests += 1
+            metrics.buckets[bucket] += 1
+            metrics.latency += latency
+            metrics.queries += recorder.queries
+            metrics.sql_time += recorder.sql_time
+            metrics.serialization_time += recorder.serialization_time
+
+    def snapshot(self):
+        """The totals as JSON-ready data; histogram buckets are cumulative"""
+        with self._lock:
+            routes = [
+                (route, method, metrics.requests, list(metrics.buckets), metrics.latency,
+                 metrics.queries, metrics.sql_time, metrics.serialization_time)
+                for (route, method), metrics in sorted(self._routes.items())
+            ]
+            started_at = self.started_at
+
+        report = []
+        for route, method, requests, buckets, latency, queries, sql_time, serialization_time in routes:
+            cumulative = 0
+            histogram = []
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                cumulative += count
+                histogram.append({'le': bound, 'count': cumulative})
+            report.append({
+                'route': route,
+                'method': method,
+                'requests': requests,
+                'latency_seconds': {'sum': latency, 'buckets': histogram},
+                'sql_queries': queries,
+                'sql_seconds': sql_time,
+                'serialization_seconds': serialization_time,
+                'mean_latency_ms': round(latency / requests * 1000, 3),
+                'mean_sql_queries': round(queries / requests, 2),
+                'mean_sql_ms': round(sql_time / requests * 1000, 3),
+                'mean_serialization_ms': round(serialization_time / requests * 1000, 3),
+            })
+        return {'started_at': started_at.isoformat(), 'routes': report}
+
+
+registry = Registry()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    """Records latency, SQL and serialization time per route; goes first in MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = RequestMetrics()
+        token = _current.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        registry.record(route_name(request), request.method, time.perf_counter() - start, recorder)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; count that as serialization
+        response.render = timed_serialization(response.render)
+        return response
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+PROMETHEUS_COUNTERS = (
+    ('api_sql_queries_total', 'sql_queries', 'SQL statements executed while serving the route'),
+    ('api_sql_duration_seconds_total', 'sql_seconds', 'Time spent executing SQL'),
+    ('api_serialization_duration_seconds_total', 'serialization_seconds',
+     'Time spent in serializers and response rendering'),
+)
+
+
+def prometheus_text(snapshot):
+    """A ``Registry.snapshot()`` in the Prometheus text exposition format"""
+    lines = [
+        '# HELP api_request_duration_seconds Request latency by route.',
+        '# TYPE api_request_duration_seconds histogram',
+    ]
+    for route in snapshot['routes']:
+        labels = f'route="{_label(route["route"])}",method="{_label(route["method"])}"'
+        for bucket in route['latency_seconds']['buckets']:
+            lines.append(
+                f'api_request_duration_seconds_bucket{{{labels},le="{bucket["le"]}"}} {bucket["count"]}'
+            )
+        lines.append(f'api_request_duration_seconds_sum{{{labels}}} {_number(route["latency_seconds"]["sum"])}')
+        lines.append(f'api_request_duration_seconds_count{{{labels}}} {route["requests"]}')
+    for name, key, help_text in PROMETHEUS_COUNTERS:
+        lines.append(f'# HELP {name} {help_text}.')
+        lines.append(f'# TYPE {name} counter')
+        for route in snapshot['routes']:
+            labels = f'route="{_label(route["route"])}",method="{_label(route["method"])}"'
+            lines.append(f'{name}{{{labels}}} {_number(route[key])}')
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or 'routes' not in data:
+            # Error responses (e.g. a 403) carry a detail message instead
+            return f'# {data}\n'
+        return prometheus_text(data)
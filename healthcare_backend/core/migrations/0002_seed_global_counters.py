@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+def seed_counters(apps, schema_editor):
+    # The counters as core.counters.DEFINITIONS had them when this migration was written
+    User = apps.get_model('authentication', 'User')
+    Appointment = apps.get_model('appointments', 'Appointment')
+    Exercise = apps.get_model('exercises', 'Exercise')
+    GlobalCounter = apps.get_model('core', 'GlobalCounter')
+
+    definitions = {
+        'users.total': (User, {}),
+        'users.verified': (User, {'is_verified': True}),
+        'users.active': (User, {'is_active': True}),
+        'appointments.total': (Appointment, {}),
+        'exercises.total': (Exercise, {}),
+        'exercises.active': (Exercise, {'is_active': True}),
+    }
+    for user_type, _ in User._meta.get_field('user_type').choices:
+        definitions[f'users.{user_type}'] = (User, {'user_type': user_type})
+    for status, _ in Appointment._meta.get_field('status').choices:
+        definitions[f'appointments.{status}'] = (Appointment, {'status': status})
+
+    for name, (model, filters) in definitions.items():
+        GlobalCounter.objects.update_or_create(
+            name=name, defaults={'value': model.objects.filter(**filters).count()}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('appointments', '0002_initial'),
+        ('authentication', '0002_physiotherapistprofile_certificate'),
+        ('exercises', '0003_exercisedailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_seed_global_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('appointment', 'Appointment'), ('exercise', 'Exercise'), ('feedback', 'Feedback'), ('document', 'Document')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField(help_text='Primary key of the source row')),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.CharField(blank=True, max_length=500)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('date', models.DateField(help_text='Date shown for the event')),
+                ('time', models.TimeField(blank=True, null=True)),
+                ('extra', models.JSONField(blank=True, default=dict, help_text='Type-specific fields of the feed item')),
+                ('occurred_at', models.DateTimeField(help_text='Feed ordering key')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'activity_events',
+                'ordering': ['-occurred_at', '-id'],
+                'indexes': [models.Index(fields=['user', '-occurred_at', '-id'], name='activity_feed_idx'), models.Index(fields=['event_type', 'object_id'], name='activity_source_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'event_type', 'object_id'), name='unique_activity_event_per_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_activityevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('appointment', 'Appointment'), ('exercise', 'Exercise'), ('user', 'User')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('summary', models.CharField(blank=True, help_text='Short description shown with results', max_length=255)),
+                ('extra', models.JSONField(blank=True, default=dict)),
+                ('visibility', models.CharField(choices=[('public', 'Any authenticated user'), ('participants', 'Patient and physiotherapist'), ('staff', 'Physiotherapists and admins')], max_length=20)),
+                ('patient_id', models.BigIntegerField(blank=True, null=True)),
+                ('physiotherapist_id', models.BigIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'search_documents',
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'object_id'), name='unique_search_document')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install_index(apps, schema_editor):
+    from core.search import install_index
+    install_index(schema_editor)
+
+
+def uninstall_index(apps, schema_editor):
+    from core.search import uninstall_index
+    uninstall_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_searchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, uninstall_index),
+    ]
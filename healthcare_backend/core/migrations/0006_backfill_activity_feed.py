@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def backfill_feed(apps, schema_editor):
+    from core.activity import rebuild
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search_index'),
+        ('appointments', '0006_monthly_rollups'),
+        ('exercises', '0005_build_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_feed, migrations.RunPython.noop),
+    ]
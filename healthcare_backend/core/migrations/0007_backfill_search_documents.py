@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def backfill_documents(apps, schema_editor):
+    from core.search import rebuild
+    rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_backfill_activity_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import models
+
+
+class GlobalCounter(models.Model):
+    """
+    Denormalized row count for a site-wide figure (users by type, appointments
+    by status, ...). Maintained by the signal handlers in ``core.signals`` and
+    repaired by the ``reconcile_counters`` management command.
+    """
+    name = models.CharField(max_length=64, unique=True, help_text="Counter key, e.g. users.patient")
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'global_counters'
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class ActivityEvent(models.Model):
+    """
+    One entry of a user's recent-activity feed.
+
+    Events are written when the underlying appointment, progress entry,
+    feedback or document changes, with the display text already rendered, so
+    reading a feed is a single range scan over (user, occurred_at, id).
+    """
+    EVENT_TYPES = (
+        ('appointment', 'Appointment'),
+        ('exercise', 'Exercise'),
+        ('feedback', 'Feedback'),
+        ('document', 'Document'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='activity_events'
+    )
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    object_id = models.PositiveBigIntegerField(help_text="Primary key of the source row")
+    title = models.CharField(max_length=255)
+    description = models.CharField(max_length=500, blank=True)
+    status = models.CharField(max_length=20, blank=True)
+    date = models.DateField(help_text="Date shown for the event")
+    time = models.TimeField(blank=True, null=True)
+    extra = models.JSONField(default=dict, blank=True, help_text="Type-specific fields of the feed item")
+    occurred_at = models.DateTimeField(help_text="Feed ordering key")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'activity_events'
+        ordering = ['-occurred_at', '-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'event_type', 'object_id'], name='unique_activity_event_per_user'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-occurred_at', '-id'], name='activity_feed_idx'),
+            models.Index(fields=['event_type', 'object_id'], name='activity_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.title}"
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of an appointment, exercise or user.
+
+    The full-text index over ``title`` and ``body`` lives outside the ORM:
+    an FTS5 table kept in sync by triggers on SQLite, a generated
+    ``search_vector`` column with a GIN index on PostgreSQL (see the
+    migration and ``core.search``). The scoping columns let role checks run
+    inside the search query.
+    """
+    DOC_TYPES = (
+        ('appointment', 'Appointment'),
+        ('exercise', 'Exercise'),
+        ('user', 'User'),
+    )
+    VISIBILITY_CHOICES = (
+        ('public', 'Any authenticated user'),
+        ('participants', 'Patient and physiotherapist'),
+        ('staff', 'Physiotherapists and admins'),
+    )
+
+    doc_type = models.CharField(max_length=20, choices=DOC_TYPES)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    summary = models.CharField(max_length=255, blank=True, help_text="Short description shown with results")
+    extra = models.JSONField(default=dict, blank=True)
+    visibility = models.CharField(max_length=20, choices=VISIBILITY_CHOICES)
+    patient_id = models.BigIntegerField(blank=True, null=True)
+    physiotherapist_id = models.BigIntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'search_documents'
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.doc_type} {self.object_id}: {self.title}"
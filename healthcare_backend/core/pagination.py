@@ -0,0 +1,180 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are read with ``WHERE (key, id) < (cursor key, cursor id)`` on an
+index ordered by ``(key, id)`` descending, so fetching the next page costs
+the same regardless of how deep the client has scrolled. Cursors are opaque
+url-safe strings encoding the last row's key and id.
+
+``KeysetPagination`` exposes this to DRF views with ``before`` and
+``after`` cursors for scrolling in either direction. It never counts rows:
+``has_more`` comes from reading one row past the page.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from urllib.parse import urlencode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key, pk):
+    if isinstance(key, (date, datetime)):
+        key = key.isoformat()
+    raw = json.dumps([key, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(key, pk)`` from a cursor string, raising InvalidCursor if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return key, int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _parse_key(key, field):
+    """Convert a decoded key back to the type of the ordering field"""
+    internal_type = field.get_internal_type()
+    if isinstance(key, str) and internal_type == 'DateTimeField':
+        key = parse_datetime(key)
+    elif isinstance(key, str) and internal_type == 'DateField':
+        key = parse_date(key)
+    if key is None:
+        raise InvalidCursor('Invalid cursor')
+    return key
+
+
+def _seek(queryset, key_field, cursor, older=True):
+    """Rows strictly older (or newer) than the cursor position"""
+    key, pk = decode_cursor(cursor)
+    key = _parse_key(key, queryset.model._meta.get_field(key_field))
+    lookup, bound = ('lt', 'lte') if older else ('gt', 'gte')
+    # The redundant bound on the key alone lets the database seek into the
+    # (key, id) index instead of filtering rows while scanning from the top
+    return queryset.filter(**{f'{key_field}__{bound}': key}).filter(
+        Q(**{f'{key_field}__{lookup}': key}) | Q(**{f'pk__{lookup}': pk})
+    )
+
+
+def keyset_page(queryset, key_field, cursor=None, limit=20):
+    """
+    Return ``(rows, next_cursor)`` for one page ordered by ``key_field`` then
+    id, newest first. ``next_cursor`` is None on the last page.
+    """
+    queryset = queryset.order_by(f'-{key_field}', '-pk')
+    if cursor:
+        queryset = _seek(queryset, key_field, cursor)
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, key_field), last.pk)
+    return rows, next_cursor
+
+
+def keyset_window(queryset, key_field, before=None, after=None, limit=20):
+    """
+    Return ``(rows, has_more)`` for up to ``limit`` rows next to a cursor,
+    newest first.
+
+    With ``before`` the rows are the ones just older than the cursor, with
+    ``after`` the ones just newer, and with neither the newest rows.
+    ``has_more`` tells whether more rows lie beyond the page in the direction
+    read (older, unless ``after`` was given).
+    """
+    if before and after:
+        raise InvalidCursor('Pass either before or after, not both')
+    if after:
+        queryset = _seek(queryset, key_field, after, older=False).order_by(key_field, 'pk')
+    else:
+        queryset = queryset.order_by(f'-{key_field}', '-pk')
+        if before:
+            queryset = _seek(queryset, key_field, before)
+
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after:
+        rows.reverse()
+    return rows, has_more
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over ``(key_field, id)``.
+
+    Query parameters are ``before`` or ``after`` (cursors from a previous
+    response) and ``limit``. The response carries ``results``, ``has_more``,
+    the ``before`` cursor of the oldest row and the ``after`` cursor of the
+    newest row on the page, plus ``next`` and ``previous`` links.
+    ``newest_first = False`` returns each page in chronological order (chat
+    transcripts) without changing which rows a cursor selects.
+    """
+    key_field = 'created_at'
+    newest_first = True
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.page_size))
+        except ValueError:
+            raise ParseError('limit must be an integer')
+        return max(1, min(limit, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.before = request.query_params.get('before')
+        self.after = request.query_params.get('after')
+        try:
+            rows, self.has_more = keyset_window(
+                queryset, self.key_field, before=self.before, after=self.after, limit=self.limit
+            )
+        except InvalidCursor as exc:
+            raise ParseError(str(exc))
+
+        self.before_cursor = self.after_cursor = None
+        if rows:
+            newest, oldest = rows[0], rows[-1]
+            self.after_cursor = encode_cursor(getattr(newest, self.key_field), newest.pk)
+            self.before_cursor = encode_cursor(getattr(oldest, self.key_field), oldest.pk)
+        elif self.after:
+            # Nothing newer yet: keep polling from the same position
+            self.after_cursor = self.after
+        return rows if self.newest_first else rows[::-1]
+
+    def _link(self, **params):
+        return self.request.build_absolute_uri(
+            f"{self.request.path}?{urlencode({'limit': self.limit, **params})}"
+        )
+
+    def get_paginated_response(self, data):
+        # ``next`` continues in the direction read, ``previous`` goes back
+        # (the first page has no previous; poll it with the ``after`` cursor)
+        forward, backward = ('after', 'before') if self.after else ('before', 'after')
+        cursors = {'before': self.before_cursor, 'after': self.after_cursor}
+        has_previous = bool((self.before or self.after) and cursors[backward])
+        return Response({
+            'has_more': self.has_more,
+            'before': self.before_cursor,
+            'after': self.after_cursor,
+            'next': self._link(**{forward: cursors[forward]}) if self.has_more else None,
+            'previous': self._link(**{backward: cursors[backward]}) if has_previous else None,
+            'results': data,
+        })
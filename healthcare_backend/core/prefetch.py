@@ -0,0 +1,44 @@
+"""
+Per-action prefetch plans.
+
+Each viewset states, per action, the ``select_related`` and
+``prefetch_related`` lookups its serializer reads, so a page of any size is
+rendered in a fixed number of queries. ``get_queryset`` implementations pass
+their queryset through ``self.plan_queryset``; actions without an entry use
+the ``'default'`` plan. Sparse fieldsets (``core.fieldsets``) then drop whatever
+the requested fields do not need.
+
+The query budgets in the apps' tests hold every list and detail endpoint to
+a constant number of queries as rows are added.
+"""
+
+
+class PrefetchPlan:
+    """The related lookups one action loads"""
+
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+# For actions that serialize nothing (deletes, counts)
+NOTHING = PrefetchPlan()
+
+
+class PrefetchPlanMixin:
+    """ViewSet mixin applying ``prefetch_plans[action]`` (or ``['default']``)"""
+    prefetch_plans = {}
+
+    def get_prefetch_plan(self):
+        plans = self.prefetch_plans
+        return plans.get(getattr(self, 'action', None), plans.get('default', NOTHING))
+
+    def plan_queryset(self, queryset):
+        return self.get_prefetch_plan().apply(queryset)
@@ -0,0 +1,361 @@
+"""
+Global full-text search.
+
+Appointments, exercises and users are copied into SearchDocument rows when
+they are saved. The text index over those rows is database specific:
+
+* SQLite: an external-content FTS5 table (``search_documents_fts``) kept in
+  sync by triggers, ranked with ``bm25()`` and excerpted with ``snippet()``.
+* PostgreSQL: a generated, weighted ``search_vector`` tsvector column with a
+  GIN index, ranked with ``ts_rank_cd()`` and excerpted with ``ts_headline()``.
+  PostgreSQL has no built-in BM25; cover density ranking normalized by
+  document length is the closest equivalent it ships.
+
+Other backends fall back to ``icontains`` over the documents. Role scoping
+(participants for appointments, staff for users) is part of the WHERE clause
+so out-of-scope rows never reach the ranking step.
+
+Snippets are HTML: the indexed text is escaped and only the ``<mark>`` tags
+around matches are markup. The databases delimit matches with control
+characters, which cannot come through escaping, and those are swapped for
+the tags afterwards.
+
+Schema changes to ``search_documents`` on SQLite rebuild the table and drop
+its triggers; ``manage.py rebuild_search_index`` reinstalls them. Migration
+0007 indexed the rows that existed before the index did.
+"""
+
+import html
+import json
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from appointments.models import Appointment
+from authentication.models import User
+from exercises.models import Exercise
+
+from .models import SearchDocument
+
+RESULTS_PER_TYPE = 5
+MAX_TERMS = 8
+TYPE_ORDER = ('appointment', 'exercise', 'user')
+STAFF_TYPES = ('physiotherapist', 'admin')
+
+# Match delimiters the databases put in snippets, replaced by <mark> tags after escaping
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SQLITE_INSTALL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5(
+        title, body,
+        content='search_documents', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE OF title, body ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+)
+
+SQLITE_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS search_documents_au',
+    'DROP TRIGGER IF EXISTS search_documents_ad',
+    'DROP TRIGGER IF EXISTS search_documents_ai',
+    'DROP TABLE IF EXISTS search_documents_fts',
+)
+
+POSTGRES_INSTALL = (
+    """
+    ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS search_documents_vector_idx ON search_documents USING GIN (search_vector)',
+)
+
+POSTGRES_UNINSTALL = (
+    'DROP INDEX IF EXISTS search_documents_vector_idx',
+    'ALTER TABLE search_documents DROP COLUMN IF EXISTS search_vector',
+)
+
+# FTS5 auxiliary functions cannot run under a window function, so the per-type
+# top N is a UNION ALL of one ranked, limited branch per document type
+SQLITE_SEARCH_BRANCH = """
+    SELECT * FROM (
+        SELECT d.doc_type, d.object_id, d.title, d.summary, d.extra,
+               snippet(search_documents_fts, 1, %s, %s, '...', 12) AS snippet,
+               -bm25(search_documents_fts, 10.0, 1.0) AS score
+        FROM search_documents_fts
+        JOIN search_documents d ON d.id = search_documents_fts.rowid
+        WHERE search_documents_fts MATCH %s AND d.doc_type = %s AND ({scope})
+        ORDER BY bm25(search_documents_fts, 10.0, 1.0)
+        LIMIT %s
+    )
+"""
+
+POSTGRES_SEARCH = """
+    SELECT doc_type, object_id, title, summary, extra,
+           ts_headline('english', body, to_tsquery('english', %s), %s) AS snippet,
+           score
+    FROM (
+        SELECT d.doc_type, d.object_id, d.title, d.summary, d.extra, d.body,
+               ts_rank_cd(d.search_vector, query, 32) AS score,
+               ROW_NUMBER() OVER (
+                   PARTITION BY d.doc_type ORDER BY ts_rank_cd(d.search_vector, query, 32) DESC
+               ) AS position
+        FROM search_documents d, to_tsquery('english', %s) query
+        WHERE d.search_vector @@ query AND ({scope})
+    ) ranked
+    WHERE position <= %s
+"""
+
+
+def install_index(schema_editor=None):
+    """Create the vendor-specific index objects (idempotent)"""
+    conn = schema_editor.connection if schema_editor else connection
+    statements = {'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRES_INSTALL}.get(conn.vendor, ())
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    statements = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL}.get(conn.vendor, ())
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _full_name(user):
+    # get_full_name() spelled out, so migrations' historical users work too
+    return f'{user.first_name} {user.last_name}'.strip()
+
+
+def _name(user):
+    return _full_name(user) or user.username
+
+
+def appointment_document(appointment):
+    patient_name = _name(appointment.patient)
+    physiotherapist_name = _name(appointment.physiotherapist)
+    return {
+        'title': f'Appointment on {appointment.date}',
+        'body': ' '.join(filter(None, [
+            appointment.reason, appointment.notes,
+            appointment.get_status_display(), appointment.get_appointment_type_display(),
+            patient_name, physiotherapist_name,
+        ])),
+        'summary': '',
+        'extra': {'patient_name': patient_name, 'physiotherapist_name': physiotherapist_name},
+        'visibility': 'participants',
+        'patient_id': appointment.patient_id,
+        'physiotherapist_id': appointment.physiotherapist_id,
+    }
+
+
+def exercise_document(exercise):
+    description = exercise.description or ''
+    return {
+        'title': exercise.name,
+        'body': description,
+        'summary': description[:100] + '...' if len(description) > 100 else description,
+        'extra': {},
+        'visibility': 'public',
+        'patient_id': None,
+        'physiotherapist_id': None,
+    }
+
+
+def user_document(user):
+    return {
+        'title': _full_name(user),
+        'body': ' '.join(filter(None, [user.first_name, user.last_name, user.username, user.email])),
+        'summary': f'{user.user_type.title()} - {user.email}',
+        'extra': {},
+        'visibility': 'staff',
+        'patient_id': None,
+        'physiotherapist_id': None,
+    }
+
+
+# Source model -> (document type, builder, related objects the builder reads)
+SOURCES = {
+    Appointment: ('appointment', appointment_document, ('patient', 'physiotherapist')),
+    Exercise: ('exercise', exercise_document, ()),
+    User: ('user', user_document, ()),
+}
+
+
+def index(instance):
+    """Write or refresh the search document of a source row"""
+    doc_type, build, _ = SOURCES[type(instance)]
+    SearchDocument.objects.update_or_create(
+        doc_type=doc_type, object_id=instance.pk, defaults=build(instance)
+    )
+
+
+def index_new(instances):
+    """Search documents of rows inserted with ``bulk_create``, in one insert"""
+    documents = []
+    for instance in instances:
+        doc_type, build, _ = SOURCES[type(instance)]
+        documents.append(SearchDocument(doc_type=doc_type, object_id=instance.pk, **build(instance)))
+    SearchDocument.objects.bulk_create(documents)
+
+
+def unindex(instance):
+    doc_type, _, _ = SOURCES[type(instance)]
+    SearchDocument.objects.filter(doc_type=doc_type, object_id=instance.pk).delete()
+
+
+def rebuild(batch_size=2000, apps=None):
+    """
+    Recreate every search document from the source tables; returns the row
+    count. Migrations pass their ``apps`` to use historical models.
+    """
+    document_model = apps.get_model('core', 'SearchDocument') if apps else SearchDocument
+    total = 0
+    with transaction.atomic():
+        install_index()
+        document_model.objects.all().delete()
+        for model, (doc_type, build, related) in SOURCES.items():
+            source = apps.get_model(model._meta.label) if apps else model
+            batch = []
+            for instance in source.objects.select_related(*related).iterator(chunk_size=batch_size):
+                batch.append(document_model(doc_type=doc_type, object_id=instance.pk, **build(instance)))
+                if len(batch) >= batch_size:
+                    document_model.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            document_model.objects.bulk_create(batch)
+            total += len(batch)
+    return total
+
+
+def search_terms(query):
+    """Split user input into at most MAX_TERMS plain word tokens"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _scope(user):
+    """SQL condition (and params) limiting documents to what the user may see"""
+    clauses = [
+        "d.visibility = 'public'",
+        "(d.visibility = 'participants' AND (d.patient_id = %s OR d.physiotherapist_id = %s))",
+    ]
+    params = [user.pk, user.pk]
+    if user.user_type in STAFF_TYPES:
+        clauses.append("(d.visibility = 'staff' AND NOT (d.doc_type = 'user' AND d.object_id = %s))")
+        params.append(user.pk)
+    return ' OR '.join(clauses), params
+
+
+def _scope_q(user):
+    scope = Q(visibility='public') | Q(visibility='participants', patient_id=user.pk) | \
+        Q(visibility='participants', physiotherapist_id=user.pk)
+    if user.user_type in STAFF_TYPES:
+        scope |= Q(visibility='staff') & ~Q(doc_type='user', object_id=user.pk)
+    return scope
+
+
+def _raw_search(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _fallback_search(user, terms, per_type):
+    documents = SearchDocument.objects.filter(_scope_q(user))
+    for term in terms:
+        documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    rows = []
+    for doc_type in TYPE_ORDER:
+        for document in documents.filter(doc_type=doc_type)[:per_type]:
+            rows.append({
+                'doc_type': document.doc_type, 'object_id': document.object_id,
+                'title': document.title, 'summary': document.summary, 'extra': document.extra,
+                'snippet': document.body[:120], 'score': None,
+            })
+    return rows
+
+
+def search(user, query, per_type=RESULTS_PER_TYPE):
+    """
+    Run a ranked search as ``user``; returns result dicts grouped by type
+    (appointments, exercises, users), best match first within each group.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    scope, scope_params = _scope(user)
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        branch = SQLITE_SEARCH_BRANCH.format(scope=scope)
+        params = []
+        for doc_type in TYPE_ORDER:
+            params += [MARK_START, MARK_END, match, doc_type, *scope_params, per_type]
+        rows = _raw_search(' UNION ALL '.join([branch] * len(TYPE_ORDER)), params)
+    elif connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        rows = _raw_search(
+            POSTGRES_SEARCH.format(scope=scope), [
+                tsquery, f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=20, MinWords=5',
+                tsquery, *scope_params, per_type
+            ]
+        )
+    else:
+        rows = _fallback_search(user, terms, per_type)
+
+    rows.sort(key=lambda row: (TYPE_ORDER.index(row['doc_type']), -(row['score'] or 0)))
+    return [_result(user, row) for row in rows]
+
+
+def highlight(snippet):
+    """HTML for a snippet: the text escaped, its delimited matches in <mark> tags"""
+    return html.escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def _result(user, row):
+    extra = row['extra']
+    if isinstance(extra, str):
+        extra = json.loads(extra)
+
+    doc_type = row['doc_type']
+    description = row['summary']
+    if doc_type == 'appointment':
+        other = extra.get('physiotherapist_name') if user.user_type == 'patient' else extra.get('patient_name')
+        description = f'With {other}'
+
+    urls = {'appointment': '/appointments/{}/', 'exercise': '/exercises/{}/', 'user': '/users/{}/'}
+    return {
+        'type': doc_type,
+        'id': row['object_id'],
+        'title': row['title'],
+        'description': description,
+        'snippet': highlight(row['snippet']),
+        'score': round(row['score'], 6) if row['score'] is not None else None,
+        'url': urls[doc_type].format(row['object_id']),
+    }
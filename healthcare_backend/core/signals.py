@@ -0,0 +1,214 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from appointments import availability, rollups
+from appointments.models import Appointment, AppointmentDocument, AppointmentFeedback
+from authentication.models import PhysiotherapistProfile, User
+from exercises.models import Exercise, ExercisePlan, ExerciseProgress
+
+from . import activity, counters, dashboard, search
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=ExercisePlan)
+@receiver(post_delete, sender=ExercisePlan)
+def invalidate_dashboard_for_participants(sender, instance, **kwargs):
+    """Appointments and plans affect both the patient's and the physiotherapist's dashboard"""
+    dashboard.invalidate(instance.patient_id, instance.physiotherapist_id)
+
+
+@receiver(post_save, sender=ExerciseProgress)
+@receiver(post_delete, sender=ExerciseProgress)
+def invalidate_dashboard_for_patient(sender, instance, **kwargs):
+    dashboard.invalidate(instance.patient_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def invalidate_admin_dashboard(sender, instance, **kwargs):
+    """Users and exercises only appear in the shared admin numbers"""
+    dashboard.invalidate()
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_save, sender=Exercise)
+def remember_counted_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the stored values of an edited row so its counters can be moved"""
+    instance._counter_previous = None
+    instance._counter_skip = False
+    if raw or instance.pk is None:
+        return
+    tracked = counters.TRACKED_FIELDS[sender]
+    if update_fields is not None and not tracked.intersection(update_fields):
+        # e.g. the last_login update on every sign-in
+        instance._counter_skip = True
+        return
+    instance._counter_previous = sender.objects.filter(pk=instance.pk).values(*tracked).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Exercise)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw or getattr(instance, '_counter_skip', False):
+        return
+    previous = None if created else getattr(instance, '_counter_previous', None)
+    counters.replace(sender, previous, counters.snapshot(instance))
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Exercise)
+def update_counters_on_delete(sender, instance, **kwargs):
+    counters.replace(sender, counters.snapshot(instance), None)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=ExerciseProgress)
+@receiver(post_save, sender=AppointmentFeedback)
+@receiver(post_save, sender=AppointmentDocument)
+def publish_activity(sender, instance, raw=False, **kwargs):
+    """Fan the change out to the activity feeds of everyone involved"""
+    if raw:
+        return
+    activity.publish(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=ExerciseProgress)
+@receiver(post_delete, sender=AppointmentFeedback)
+@receiver(post_delete, sender=AppointmentDocument)
+def retract_activity(sender, instance, **kwargs):
+    activity.retract(instance)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Exercise)
+@receiver(post_save, sender=User)
+def update_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if sender is User and update_fields is not None and not {
+        'first_name', 'last_name', 'username', 'email', 'user_type'
+    }.intersection(update_fields):
+        return
+    search.index(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Exercise)
+@receiver(post_delete, sender=User)
+def remove_search_document(sender, instance, **kwargs):
+    search.unindex(instance)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_schedule(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the stored physiotherapist and date of an edited appointment, whose old day frees up"""
+    instance._availability_previous = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not availability.SCHEDULE_FIELDS.intersection(update_fields):
+        return
+    instance._availability_previous = sender.objects.filter(pk=instance.pk).values_list(
+        'physiotherapist_id', 'date'
+    ).first()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_availability(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not availability.SCHEDULE_FIELDS.intersection(update_fields):
+        return
+    days = {instance.date}
+    previous = getattr(instance, '_availability_previous', None)
+    if previous is not None:
+        physiotherapist_id, day = previous
+        if physiotherapist_id == instance.physiotherapist_id:
+            days.add(day)
+        else:
+            availability.refresh_on_commit(physiotherapist_id, [day])
+    availability.refresh_on_commit(instance.physiotherapist_id, days)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_rollup_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the stored rollup values of an edited appointment so its month can be moved"""
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not rollups.TRACKED_FIELDS.intersection(update_fields):
+        return
+    instance._rollup_previous = sender.objects.filter(pk=instance.pk).values(*rollups.FIELDS).first()
+
+
+@receiver(post_save, sender=Appointment)
+def update_rollups_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not rollups.TRACKED_FIELDS.intersection(update_fields):
+        return
+    previous = None if created else getattr(instance, '_rollup_previous', None)
+    rollups.replace(previous, rollups.snapshot(instance))
+
+
+@receiver(post_delete, sender=Appointment)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.replace(rollups.snapshot(instance), None)
+
+
+@receiver(pre_save, sender=PhysiotherapistProfile)
+def remember_working_hours(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the stored working hours of an edited profile, so other edits leave the days alone"""
+    instance._availability_previous = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'working_hours' not in update_fields:
+        instance._availability_previous = instance.working_hours
+        return
+    instance._availability_previous = sender.objects.filter(pk=instance.pk).values_list(
+        'working_hours', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=PhysiotherapistProfile)
+def forget_availability_on_save(sender, instance, created, raw=False, **kwargs):
+    """New or changed working hours; the days are recomputed when next needed"""
+    if raw:
+        return
+    if created or getattr(instance, '_availability_previous', None) != instance.working_hours:
+        availability.forget(instance.user_id)
+
+
+@receiver(post_delete, sender=PhysiotherapistProfile)
+def forget_availability_on_delete(sender, instance, **kwargs):
+    """Without a profile the default hours apply"""
+    availability.forget(instance.user_id)
+
+
+def bulk_created(instances):
+    """
+    What the post_save receivers above do, for appointments inserted with
+    ``bulk_create`` (which sends no signals), in a constant number of queries.
+    """
+    if not instances:
+        return
+    counters.add(Appointment, instances)
+    rollups.add(instances)
+    activity.publish_new(instances)
+    search.index_new(instances)
+    days = {}
+    for instance in instances:
+        days.setdefault(instance.physiotherapist_id, set()).add(instance.date)
+    for physiotherapist_id, dates in days.items():
+        availability.refresh_on_commit(physiotherapist_id, dates)
+    dashboard.invalidate(*{
+        user_id for instance in instances
+        for user_id in (instance.patient_id, instance.physiotherapist_id)
+    })
@@ -0,0 +1,57 @@
+"""
+Test helpers for the apps' test suites.
+
+``QueryBudgetTestCase.assertQueryBudget`` requests an endpoint after seeding
+1, 10 and 100 rows and fails when any request runs more than the budgeted
+number of SQL queries or when the count changes with the number of rows,
+which is how an N+1 shows up. The cache is cleared before each request, so
+budgets are for a cold cache.
+"""
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from authentication.models import User
+
+SIZES = (1, 10, 100)
+
+
+def create_user(username, user_type='patient', **fields):
+    """A user without a usable password; hashing one per row would dominate the test time"""
+    user = User(username=username, email=f'{username}@example.com', user_type=user_type, **fields)
+    user.set_unusable_password()
+    user.save()
+    return user
+
+
+class QueryBudgetTestCase(APITestCase):
+
+    def detail_url(self, prefix, model):
+        """URL of the oldest row of ``model``, resolved when requested"""
+        return lambda: f'{prefix}{model.objects.earliest("id").pk}/'
+
+    def assertQueryBudget(self, budget, url, seed, user=None):
+        """
+        Call ``seed(count)`` to add rows until 1, 10 and 100 exist, fetching
+        ``url`` (a string, or a callable returning one) after each step.
+        """
+        self.client.force_authenticate(user or self.user)
+        counts = {}
+        seeded = 0
+        for size in SIZES:
+            seed(size - seeded)
+            seeded = size
+            path = url() if callable(url) else url
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, f'{path}: {response.content[:200]!r}')
+            counts[size] = len(queries)
+            self.assertLessEqual(
+                counts[size], budget,
+                f'{path} ran {counts[size]} queries with {size} rows (budget {budget}):\n'
+                + '\n'.join(query['sql'] for query in queries.captured_queries)
+            )
+        self.assertEqual(len(set(counts.values())), 1, f'{path} query count grows with rows: {counts}')
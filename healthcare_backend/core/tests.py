@@ -0,0 +1,634 @@
+import json
+from datetime import date, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from appointments.models import Appointment, AppointmentFeedback
+from appointments.serializers import APPOINTMENT_SHAPE, AppointmentSerializer, with_schedule
+from authentication.models import User
+from core.testing import create_user
+from exercises.models import Exercise, ExerciseCategory, ExercisePlan, ExercisePlanItem, ExerciseProgress
+from exercises.serializers import EXERCISE_SHAPE, ExerciseSerializer
+from notifications.models import Notification
+from notifications.serializers import NOTIFICATION_SHAPE, NotificationSerializer
+
+from . import activity, counters, dashboard, health, metrics, search
+from .fastpath import ORJSONRenderer
+from .pagination import KeysetPagination, encode_cursor
+from .models import ActivityEvent, GlobalCounter, SearchDocument
+
+
+class FastPathParityTests(TestCase):
+    """The fast list path must render exactly the bytes the serializers do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(
+            username='parity_patient', email='patient@parity.local', password='x',
+            user_type='patient', first_name='Zoë', last_name='Ångström \u2028\u2029',
+            date_of_birth=date(1950, 2, 28), address='Line one\nLine "two" \\ </script>',
+            profile_picture='profile_pictures/zoë.png'
+        )
+        cls.physio = User.objects.create_user(
+            username='parity_physio', email='physio@parity.local', password='x',
+            user_type='physiotherapist'
+        )
+        today = timezone.now().date()
+        cls.appointments = [
+            Appointment.objects.create(
+                patient=cls.patient, physiotherapist=cls.physio, date=today + timedelta(days=400),
+                start_time=time(9, 30), end_time=time(10, 15, 30), reason='Knee \u2028— 膝',
+                cost=Decimal('1234.5'), symptoms='', cancellation_reason=''
+            ),
+            Appointment.objects.create(
+                patient=cls.patient, physiotherapist=cls.physio, date=date(1999, 12, 31),
+                start_time=time(23, 0), end_time=time(23, 59, 59, 999999), reason='Past',
+                status='completed', cancelled_by=cls.physio
+            ),
+            Appointment.objects.create(
+                patient=cls.patient, physiotherapist=cls.physio, date=today + timedelta(days=1),
+                start_time=time(0, 0), end_time=time(0, 1), reason='Soon', cost=Decimal('0.01')
+            ),
+        ]
+        AppointmentFeedback.objects.create(
+            appointment=cls.appointments[1], rating=5, punctuality_rating=4,
+            professionalism_rating=4, treatment_effectiveness=3, comments='😀 great'
+        )
+        category = ExerciseCategory.objects.create(name='Strength & “balance”')
+        cls.exercises = [
+            Exercise.objects.create(
+                name='Squat', description='Bend\tknees', category=category, duration=30,
+                video_url='https://example.com/v?a=1&b=2', image='exercise_images/squat.jpg'
+            ),
+            Exercise.objects.create(name='Plank', description='', category=category, duration=60),
+        ]
+        Notification.objects.create(
+            recipient=cls.patient, notification_type='system', title='Hello \u2028',
+            message='Ünïcödé', related_object_id=7, related_object_type='appointment'
+        )
+        Notification.objects.create(
+            recipient=cls.patient, notification_type='appointment', title='Read', message='',
+            is_read=True
+        )
+
+    def request(self):
+        request = Request(APIRequestFactory().get('/api/'))
+        request.user = self.patient
+        return request
+
+    def assertSameBytes(self, serializer_class, shape, queryset):
+        context = {'request': self.request()}
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+        actual = ORJSONRenderer().render(shape.render(shape.queryset(queryset, context), context))
+        self.assertEqual(actual, expected)
+
+    def test_appointment_shape(self):
+        self.assertSameBytes(
+            AppointmentSerializer, APPOINTMENT_SHAPE, with_schedule(Appointment.objects.order_by('id'))
+        )
+
+    def test_exercise_shape(self):
+        self.assertSameBytes(ExerciseSerializer, EXERCISE_SHAPE, Exercise.objects.order_by('id'))
+
+    def test_notification_shape(self):
+        self.assertSameBytes(NotificationSerializer, NOTIFICATION_SHAPE, Notification.objects.order_by('id'))
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_datetimes_in_other_time_zone(self):
+        self.assertSameBytes(NotificationSerializer, NOTIFICATION_SHAPE, Notification.objects.order_by('id'))
+
+    def test_list_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        for url in ('/api/appointments/', '/api/exercises/', '/api/notifications/'):
+            with self.subTest(url=url):
+                fast = client.get(url)
+                # Requesting a fieldset routes the list through the serializer
+                slow = client.get(url, {'omit': ''})
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'a\u2028b\u2029c "quoted" </tag> é 😀', 'none': None, 'decimal': Decimal('1.50'),
+            'date': date(2024, 1, 2), 'float': 2.5, 'nested': [{1: True}], 'empty': [],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class SparseFieldsetsTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('sparse_patient', first_name='Maria')
+        self.physiotherapist = create_user('sparse_physio', 'physiotherapist')
+        Appointment.objects.create(
+            patient=self.patient, physiotherapist=self.physiotherapist,
+            date=timezone.now().date() + timedelta(days=2), start_time=time(9), end_time=time(10),
+            reason='Sparse', notes='Private'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def appointment(self, **params):
+        response = self.client.get('/api/appointments/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['results'][0]
+
+    def test_fields_omit_and_expand(self):
+        self.assertEqual(self.appointment(fields='id,reason').keys(), {'id', 'reason'})
+        self.assertEqual(self.appointment(fields='id,patient.first_name')['patient'], {'first_name': 'Maria'})
+
+        row = self.appointment(omit='notes,patient.email')
+        self.assertNotIn('notes', row)
+        self.assertNotIn('email', row['patient'])
+        self.assertEqual(row['patient']['username'], 'sparse_patient')
+
+        row = self.appointment(expand='patient')
+        self.assertEqual(row['patient']['id'], self.patient.pk)
+        self.assertEqual(row['physiotherapist'], self.physiotherapist.pk)
+        self.assertEqual(self.appointment(expand='')['patient'], self.patient.pk)
+
+    def test_unknown_names_are_rejected(self):
+        for params in ({'fields': 'id,nonexistent'}, {'omit': 'secret'}, {'expand': 'doctor'}):
+            response = self.client.get('/api/appointments/', params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertIn('Unknown field(s): doctor. Valid fields: id, patient, ', response.data['expand'])
+
+        # Nested names are checked against the nested serializer, with or without rows
+        Appointment.objects.all().delete()
+        response = self.client.get('/api/appointments/', {'fields': 'patient.nonexistent'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('first_name', response.data['fields'])
+
+        response = self.client.get('/api/exercises/', {'fields': 'nonexistent'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Valid fields: id, name', response.data['fields'])
+
+    def test_joins_follow_the_fields(self):
+        def page_sql(**params):
+            with CaptureQueriesContext(connection) as queries:
+                self.appointment(**params)
+            return queries[-1]['sql']
+
+        self.assertEqual(page_sql().count('JOIN'), 3)
+        self.assertEqual(page_sql(fields='id,reason').count('JOIN'), 0)
+        # Only the patient is embedded, so only the patient is joined
+        self.assertEqual(page_sql(fields='id,patient,physiotherapist', expand='patient').count('JOIN'), 1)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username='metrics_staff', email='staff@metrics.local', password='x', is_staff=True
+        )
+        cls.patient = User.objects.create_user(
+            username='metrics_patient', email='patient@metrics.local', password='x', user_type='patient'
+        )
+        Notification.objects.create(
+            recipient=cls.patient, notification_type='system', title='Metrics', message='Recorded'
+        )
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.client = APIClient()
+
+    def route(self, report, name, method='GET'):
+        return next(route for route in report['routes'] if (route['route'], route['method']) == (name, method))
+
+    def test_records_requests_per_route(self):
+        self.client.force_authenticate(self.patient)
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+            self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+        self.client.force_authenticate(self.staff)
+        report = self.client.get('/api/metrics/').json()
+        notifications = self.route(report, 'notification-list')
+        self.assertEqual(notifications['requests'], 2)
+        self.assertEqual(notifications['latency_seconds']['buckets'][-1], {'le': '+Inf', 'count': 2})
+        self.assertGreater(notifications['sql_queries'], 0)
+        self.assertGreater(notifications['serialization_seconds'], 0)
+        self.assertGreater(self.route(report, 'user-me')['serialization_seconds'], 0)
+        self.assertLessEqual(
+            notifications['sql_seconds'] + notifications['serialization_seconds'],
+            notifications['latency_seconds']['sum']
+        )
+
+    def test_prometheus_format(self):
+        self.client.force_authenticate(self.staff)
+        self.client.get('/api/notifications/')
+        response = self.client.get('/api/metrics/', {'format': 'prometheus'})
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE api_request_duration_seconds histogram', text)
+        self.assertIn(
+            'api_request_duration_seconds_bucket{route="notification-list",method="GET",le="+Inf"} 1', text
+        )
+        self.assertIn('api_sql_queries_total{route="notification-list",method="GET"} ', text)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.patient)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', {'format': 'prometheus'}).status_code, 403)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('keyset_patient')
+        notifications = [
+            Notification.objects.create(
+                recipient=self.patient, notification_type='system', title=str(number), message=''
+            )
+            for number in range(7)
+        ]
+        # Two runs of tied timestamps, so pages must break ties on the id
+        now = timezone.now()
+        Notification.objects.filter(pk__in=[row.pk for row in notifications[:4]]).update(
+            created_at=now - timedelta(minutes=1)
+        )
+        Notification.objects.filter(pk__in=[row.pk for row in notifications[4:]]).update(created_at=now)
+        self.newest_first = [row.pk for row in reversed(notifications)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def page(self, **params):
+        response = self.client.get('/api/notifications/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def follow(self, link):
+        return self.page(**{name: values[0] for name, values in parse_qs(urlsplit(link).query).items()})
+
+    def ids(self, page):
+        return [row['id'] for row in page['results']]
+
+    def test_walks_both_ways_across_ties(self):
+        pages = [self.page(limit=3)]
+        while pages[-1]['has_more']:
+            pages.append(self.follow(pages[-1]['next']))
+        self.assertEqual([self.ids(page) for page in pages], [
+            self.newest_first[:3], self.newest_first[3:6], self.newest_first[6:]
+        ])
+        self.assertIsNone(pages[-1]['next'])
+        self.assertNotIn('count', pages[0])
+
+        # Back up from the last page through the previous links
+        self.assertIsNone(pages[0]['previous'])
+        back = self.follow(pages[2]['previous'])
+        self.assertEqual(self.ids(back), self.newest_first[3:6])
+        self.assertTrue(back['has_more'])
+        self.assertEqual(self.ids(self.follow(back['next'])), self.newest_first[:3])
+
+        self.assertEqual(self.ids(self.page(limit=3, before=pages[0]['before'])), self.newest_first[3:6])
+        self.assertEqual(self.ids(self.page(limit=3, after=pages[1]['after'])), self.newest_first[:3])
+
+    def test_empty_poll_keeps_its_cursor(self):
+        newest = self.page()['after']
+        poll = self.page(after=newest)
+        self.assertEqual((poll['results'], poll['after'], poll['has_more'], poll['next']), ([], newest, False, None))
+
+        Notification.objects.create(recipient=self.patient, notification_type='system', title='New', message='')
+        poll = self.page(after=newest)
+        self.assertEqual([row['title'] for row in poll['results']], ['New'])
+        self.assertNotEqual(poll['after'], newest)
+
+    def test_bad_parameters(self):
+        cursor = encode_cursor(timezone.now(), 1)
+        for params in ({'before': 'not-a-cursor'}, {'after': encode_cursor('yesterday', 1)},
+                       {'before': cursor, 'after': cursor}, {'limit': 'ten'}):
+            self.assertEqual(self.client.get('/api/notifications/', params).status_code, 400, params)
+
+    def test_limit_is_clamped(self):
+        page = self.page(limit=-5)
+        self.assertEqual(len(page['results']), 1)
+        self.assertEqual(parse_qs(urlsplit(page['next']).query)['limit'], ['1'])
+        with mock.patch.object(KeysetPagination, 'max_page_size', 5):
+            page = self.page(limit=1000)
+        self.assertEqual(len(page['results']), 5)
+        self.assertEqual(parse_qs(urlsplit(page['next']).query)['limit'], ['5'])
+
+
+class DashboardStatsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.patient = create_user('dashboard_patient')
+        self.physiotherapist = create_user('dashboard_physio', 'physiotherapist')
+        self.admin = create_user('dashboard_admin', 'admin', is_staff=True)
+        self.appointment(self.today + timedelta(days=1))
+        self.plan = ExercisePlan.objects.create(
+            name='Dashboard plan', description='Dashboard', patient=self.patient,
+            physiotherapist=self.physiotherapist, start_date=self.today,
+            end_date=self.today + timedelta(days=28), status='active'
+        )
+        self.item = ExercisePlanItem.objects.create(
+            exercise_plan=self.plan, day_of_week=0, exercise=Exercise.objects.create(
+                name='Dashboard exercise', description='Dashboard',
+                category=ExerciseCategory.objects.create(name='Dashboard'), duration=10
+            )
+        )
+        ExerciseProgress.objects.create(patient=self.patient, exercise_plan_item=self.item, date_completed=self.today)
+
+    def appointment(self, day, **fields):
+        return Appointment.objects.create(
+            patient=self.patient, physiotherapist=self.physiotherapist, date=day,
+            start_time=time(9), end_time=time(10), reason='Dashboard', **fields
+        )
+
+    def test_one_query_per_role_then_cached(self):
+        expected = {
+            self.patient: {
+                'upcoming_appointments': 1, 'active_exercise_plans': 1, 'completed_exercises_today': 1,
+                'total_progress_entries': 1, 'exercise_streak': 1, 'longest_exercise_streak': 1,
+                'user_type': 'patient',
+            },
+            self.physiotherapist: {
+                'today_appointments': 0, 'total_patients': 1, 'pending_appointments': 1,
+                'active_exercise_plans': 1, 'user_type': 'physiotherapist',
+            },
+            self.admin: {
+                'total_users': 3, 'total_patients': 1, 'total_physiotherapists': 1,
+                'total_appointments': 1, 'total_exercises': 1, 'user_type': 'admin',
+            },
+        }
+        for user, stats in expected.items():
+            with self.assertNumQueries(1):
+                self.assertEqual(dashboard.get_dashboard_stats(user), stats)
+            with self.assertNumQueries(0):
+                self.assertEqual(dashboard.get_dashboard_stats(user), stats)
+
+    def test_writes_drop_the_cache_on_commit(self):
+        def stats():
+            return {
+                'patient': dashboard.get_dashboard_stats(self.patient),
+                'physiotherapist': dashboard.get_dashboard_stats(self.physiotherapist),
+                'admin': dashboard.get_dashboard_stats(self.admin),
+            }
+
+        stats()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.appointment(self.today, status='scheduled')
+        # Until the write commits the cached numbers stand
+        self.assertEqual(stats()['physiotherapist']['today_appointments'], 0)
+        for callback in callbacks:
+            callback()
+        current = stats()
+        self.assertEqual(current['physiotherapist']['today_appointments'], 1)
+        self.assertEqual(current['patient']['upcoming_appointments'], 2)
+        self.assertEqual(current['admin']['total_appointments'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseProgress.objects.create(
+                patient=self.patient, exercise_plan_item=self.item, date_completed=self.today - timedelta(days=1)
+            )
+        self.assertEqual(stats()['patient']['total_progress_entries'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.status = 'completed'
+            self.plan.save()
+        current = stats()
+        self.assertEqual(current['patient']['active_exercise_plans'], 0)
+        self.assertEqual(current['physiotherapist']['active_exercise_plans'], 0)
+
+
+class GlobalCounterTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('counter_patient')
+        self.physiotherapist = create_user('counter_physio', 'physiotherapist')
+        self.exercise = Exercise.objects.create(
+            name='Counter exercise', description='Counter',
+            category=ExerciseCategory.objects.create(name='Counter'), duration=10
+        )
+
+    def counts(self):
+        return counters.get_counts(*counters.DEFINITIONS)
+
+    def assertMoved(self, before, **deltas):
+        after = self.counts()
+        moved = {name.replace('.', '__'): after[name] - before[name] for name in after if after[name] != before[name]}
+        self.assertEqual(moved, deltas)
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+    def test_saves_deletes_and_changes(self):
+        before = self.counts()
+        create_user('counter_other', is_verified=True)
+        self.assertMoved(before, users__total=1, users__patient=1, users__active=1, users__verified=1)
+
+        before = self.counts()
+        appointment = Appointment.objects.create(
+            patient=self.patient, physiotherapist=self.physiotherapist,
+            date=timezone.now().date() + timedelta(days=1), start_time=time(9), end_time=time(10), reason='Counter'
+        )
+        self.assertMoved(before, appointments__total=1, appointments__scheduled=1)
+
+        before = self.counts()
+        appointment.status = 'completed'
+        appointment.save()
+        self.assertMoved(before, appointments__scheduled=-1, appointments__completed=1)
+
+        # Saves of untracked fields leave the counters alone without reading them
+        before = self.counts()
+        with self.assertNumQueries(1):
+            self.patient.save(update_fields=['last_login'])
+        appointment.notes = 'Edited'
+        appointment.save()
+        self.assertMoved(before)
+
+        before = self.counts()
+        appointment.delete()
+        self.exercise.is_active = False
+        self.exercise.save()
+        self.assertMoved(before, appointments__total=-1, appointments__completed=-1, exercises__active=-1)
+
+    def test_reconcile(self):
+        self.counts()
+        # Bulk updates bypass the signals
+        User.objects.filter(pk=self.physiotherapist.pk).update(user_type='admin')
+        GlobalCounter.objects.filter(name='exercises.total').delete()
+        expected = {'users.physiotherapist': (1, 0), 'users.admin': (0, 1), 'exercises.total': (None, 1)}
+        self.assertEqual(counters.reconcile(fix=False), expected)
+        self.assertEqual(counters.reconcile(fix=False), expected)
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Fixed 3 counters', out.getvalue())
+        self.assertEqual(counters.reconcile(fix=False), {})
+        self.assertEqual(self.counts()['users.admin'], 1)
+
+    def test_migration_seeds_counters(self):
+        GlobalCounter.objects.all().delete()
+        import_module('core.migrations.0002_seed_global_counters').seed_counters(
+            historical_apps('core', '0002_seed_global_counters'), None
+        )
+        self.assertEqual(set(GlobalCounter.objects.values_list('name', flat=True)), set(counters.DEFINITIONS))
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+
+def historical_apps(app_label, migration):
+    """The app registry as of ``migration``, as a RunPython function receives it"""
+    return MigrationLoader(connection).project_state((app_label, migration)).apps
+
+
+class ActivityFeedTests(TestCase):
+
+    def setUp(self):
+        self.patient = create_user('activity_patient', first_name='Pat', last_name='Doe')
+        self.physiotherapist = create_user('activity_physio', 'physiotherapist', first_name='Ada', last_name='Lee')
+        self.today = timezone.now().date()
+
+    def appointment(self, hour=10, **fields):
+        return Appointment.objects.create(
+            patient=self.patient, physiotherapist=self.physiotherapist, date=self.today + timedelta(days=3),
+            start_time=time(hour), end_time=time(hour + 1), reason='Activity', **fields
+        )
+
+    def events(self):
+        return set(ActivityEvent.objects.values_list('user_id', 'event_type', 'object_id', 'title', 'status'))
+
+    def test_appointment_events_follow_the_appointment(self):
+        appointment = self.appointment()
+        self.assertEqual(self.events(), {
+            (self.patient.pk, 'appointment', appointment.pk, 'Appointment with Ada Lee', 'scheduled'),
+            (self.physiotherapist.pk, 'appointment', appointment.pk, 'Appointment with Pat Doe', 'scheduled'),
+        })
+
+        appointment.status = 'confirmed'
+        appointment.save()
+        self.assertEqual({event[-1] for event in self.events()}, {'confirmed'})
+
+        # A reassigned appointment leaves the previous physiotherapist's feed
+        other = create_user('activity_other_physio', 'physiotherapist')
+        appointment.physiotherapist = other
+        appointment.save()
+        self.assertEqual({event[0] for event in self.events()}, {self.patient.pk, other.pk})
+
+        appointment.delete()
+        self.assertEqual(self.events(), set())
+
+    def test_progress_and_feedback_events(self):
+        plan = ExercisePlan.objects.create(
+            name='Activity plan', description='Activity', patient=self.patient,
+            physiotherapist=self.physiotherapist, start_date=self.today, end_date=self.today + timedelta(days=7)
+        )
+        exercise = Exercise.objects.create(
+            name='Squats', description='Activity', category=ExerciseCategory.objects.create(name='Activity'),
+            duration=10
+        )
+        item = ExercisePlanItem.objects.create(exercise_plan=plan, exercise=exercise, day_of_week=0)
+        progress = ExerciseProgress.objects.create(
+            patient=self.patient, exercise_plan_item=item, date_completed=self.today
+        )
+        feedback = AppointmentFeedback.objects.create(appointment=self.appointment(), rating=4)
+
+        self.assertIn((self.patient.pk, 'exercise', progress.pk, 'Completed Squats', 'completed'), self.events())
+        self.assertIn(
+            (self.physiotherapist.pk, 'feedback', feedback.pk, 'Feedback from Pat Doe: 4/5', ''), self.events()
+        )
+        items, _ = activity.get_feed(self.patient, limit=10)
+        self.assertEqual({item['type'] for item in items}, {'appointment', 'exercise', 'feedback'})
+
+    def test_migration_backfills_existing_rows(self):
+        self.appointment()
+        self.appointment(hour=14, status='completed')
+        expected = self.events()
+        ActivityEvent.objects.all().delete()
+
+        activity.rebuild(historical_apps('core', '0006_backfill_activity_feed'))
+
+        self.assertEqual(self.events(), expected)
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.staff = create_user('search_staff', 'admin', is_staff=True)
+        self.patient = create_user('search_patient', first_name='Maria', last_name='Gonzalez')
+        self.physiotherapist = create_user('search_physio', 'physiotherapist', first_name='Ada', last_name='Lee')
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, physiotherapist=self.physiotherapist,
+            date=timezone.now().date() + timedelta(days=3), start_time=time(10), end_time=time(11),
+            reason='Shoulder impingement'
+        )
+
+    def found(self, user, query):
+        return {(result['type'], result['id']) for result in search.search(user, query)}
+
+    def test_saves_are_indexed(self):
+        document = SearchDocument.objects.get(doc_type='appointment', object_id=self.appointment.pk)
+        self.assertIn('Shoulder impingement', document.body)
+        self.assertIn('Maria Gonzalez', document.body)
+        self.assertEqual(self.found(self.patient, 'shoulder'), {('appointment', self.appointment.pk)})
+        # Appointments are only visible to their participants
+        self.assertEqual(self.found(create_user('search_stranger'), 'shoulder'), set())
+
+    def test_rename_and_delete(self):
+        self.assertIn(('user', self.patient.pk), self.found(self.staff, 'gonzalez'))
+
+        self.patient.last_name = 'Fernandez'
+        self.patient.save()
+        self.assertEqual(self.found(self.staff, 'gonzalez'), set())
+        self.assertIn(('user', self.patient.pk), self.found(self.staff, 'fernandez'))
+
+        self.appointment.delete()
+        self.assertFalse(SearchDocument.objects.filter(doc_type='appointment').exists())
+        self.assertEqual(self.found(self.patient, 'shoulder'), set())
+
+    def test_snippets_escape_indexed_text(self):
+        self.appointment.reason = 'Shoulder <script>alert(1)</script> & pain'
+        self.appointment.save()
+
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        response = client.get('/api/search/', {'q': 'shoulder'})
+        snippet = response.data['results'][0]['snippet']
+        self.assertNotIn('<script>', snippet)
+        self.assertIn('&lt;script&gt;', snippet)
+        self.assertIn('&amp;', snippet)
+        self.assertIn('<mark>Shoulder</mark>', snippet)
+
+    def test_migration_indexes_existing_rows(self):
+        expected = set(SearchDocument.objects.values_list('doc_type', 'object_id', 'title', 'body'))
+        SearchDocument.objects.all().delete()
+
+        search.rebuild(apps=historical_apps('core', '0007_backfill_search_documents'))
+
+        self.assertEqual(
+            set(SearchDocument.objects.values_list('doc_type', 'object_id', 'title', 'body')), expected
+        )
+        self.assertIn(('appointment', self.appointment.pk), self.found(self.patient, 'impingement'))
+
+
+class ReadinessTests(TestCase):
+
+    def test_failures_are_logged_not_published(self):
+        def failing():
+            raise RuntimeError('could not connect to server at db-primary.internal:5432 as app_user')
+
+        with mock.patch.object(health, 'CHECKS', (('database', failing),)), \
+                self.assertLogs('core.health', level='ERROR') as logs:
+            report = health.run_checks()
+
+        self.assertEqual(report['status'], 'unavailable')
+        self.assertEqual(set(report['checks']['database']), {'status', 'latency_ms'})
+        self.assertNotIn('db-primary', json.dumps(report))
+        self.assertIn('db-primary', logs.output[0])
+
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     ExerciseCategory, Exercise, ExercisePlan, 
-    ExercisePlanItem, ExerciseProgress
+    ExercisePlanItem, ExerciseProgress, ExerciseStreak, ExerciseDailyRollup
 )
 
 @admin.register(ExerciseCategory)
@@ -103,4 +103,17 @@ class ExerciseProgressAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(ExerciseStreak)
+class ExerciseStreakAdmin(admin.ModelAdmin):
+    list_display = ('id', 'patient', 'current_streak', 'longest_streak', 'last_activity_date', 'updated_at')
+    search_fields = ('patient__username',)
+    readonly_fields = ('current_streak', 'longest_streak', 'last_activity_date', 'updated_at')
+
+@admin.register(ExerciseDailyRollup)
+class ExerciseDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('id', 'patient', 'date', 'session_count', 'completed_count', 'total_duration')
+    list_filter = ('date',)
+    search_fields = ('patient__username',)
+    date_hierarchy = 'date'
+
 # Admin classes are registered using decorators above
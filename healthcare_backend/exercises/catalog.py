@@ -0,0 +1,122 @@
+"""
+Exercise catalog versioning.
+
+Every write to an ``Exercise`` or ``ExerciseCategory`` bumps a catalog
+version kept in a ``core.GlobalCounter`` row (see ``exercises.signals``).
+Catalog reads carry an ETag built from that version, so a client revalidating
+with ``If-None-Match`` gets a 304 after a cache lookup, without the exercise
+tables being read. The version is cached for CATALOG_VERSION_CACHE_TIMEOUT
+seconds and the cached value is dropped whenever a bump commits.
+
+Bulk writes (``bulk_create``, ``QuerySet.update``) bypass the signals and
+must call ``bump`` themselves.
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+
+from core.models import GlobalCounter
+
+COUNTER_NAME = 'exercises.catalog_version'
+CACHE_KEY = 'exercises:catalog_version'
+
+
+def bump():
+    """Advance the catalog version in the writer's transaction"""
+    with transaction.atomic():
+        updated = GlobalCounter.objects.filter(name=COUNTER_NAME).update(value=F('value') + 1)
+        if not updated:
+            GlobalCounter.objects.get_or_create(name=COUNTER_NAME, defaults={'value': 1})
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def version():
+    """Return the current catalog version, from the cache when possible"""
+    current = cache.get(CACHE_KEY)
+    if current is None:
+        current = GlobalCounter.objects.filter(name=COUNTER_NAME).values_list('value', flat=True).first() or 0
+        cache.set(CACHE_KEY, current, settings.CATALOG_VERSION_CACHE_TIMEOUT)
+    return current
+
+
+def etag(request, catalog_version):
+    """
+    Strong ETag of a catalog response: the version plus everything else the
+    body depends on (path and query string, host for absolute image URLs,
+    and the negotiated media type).
+    """
+    variant = '\n'.join((
+        request.get_full_path(), request.get_host(), getattr(request, 'accepted_media_type', '') or ''
+    ))
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:16]
+    return f'"catalog-{catalog_version}-{digest}"'
+
+
+def parse_updated_since(params):
+    """The aware datetime of ``?updated_since=``, or None when absent"""
+    value = params.get('updated_since')
+    if value is None:
+        return None
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ParseError('updated_since must be an ISO 8601 date and time.')
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def sync_point():
+    """
+    The ``updated_since`` for a client's next delta. ``updated_at`` is
+    stamped when a row is saved but the row is only seen once its transaction
+    commits, so a write saved just before the read and committed just after
+    it would fall behind a ``now()`` cursor. Setting the cursor back by
+    CATALOG_SYNC_MARGIN_SECONDS reports such writes on the next sync, at the
+    cost of repeating recent changes.
+    """
+    return timezone.now() - timedelta(seconds=settings.CATALOG_SYNC_MARGIN_SECONDS)
+
+
+def changed_since(queryset, since):
+    """
+    Exercises whose own row or whose category changed after ``since``,
+    active or not (a category rename changes every exercise's category_name).
+    """
+    return queryset.filter(Q(updated_at__gt=since) | Q(category__updated_at__gt=since))
+
+
+class CatalogETagMixin:
+    """
+    ViewSet mixin answering conditional GETs of ``list`` and ``retrieve``
+    from the catalog version. Other reads go through ``conditional``.
+    """
+
+    def conditional(self, handler, request, *args, **kwargs):
+        tag = etag(request, version())
+        response = get_conditional_response(request, etag=tag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = tag
+        # Responses depend on the credentials, so shared caches must not store them
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
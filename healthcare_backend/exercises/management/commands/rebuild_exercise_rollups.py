@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from authentication.models import User
+from exercises import rollups
+from exercises.streaks import refresh_streak
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily exercise rollups and streak records from ExerciseProgress'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--patient', type=int, action='append', dest='patients',
+            help='Only rebuild the given patient id (repeatable)'
+        )
+        parser.add_argument(
+            '--skip-streaks', action='store_true',
+            help='Rebuild rollups only'
+        )
+
+    def handle(self, *args, **options):
+        patient_ids = options['patients']
+
+        count = rollups.rebuild(patient_ids)
+        self.stdout.write(f'Rebuilt {count} daily rollup rows')
+
+        if options['skip_streaks']:
+            return
+
+        patients = User.objects.filter(user_type='patient')
+        if patient_ids:
+            patients = patients.filter(id__in=patient_ids)
+        refreshed = 0
+        for patient_id in patients.values_list('id', flat=True).iterator():
+            refresh_streak(patient_id)
+            refreshed += 1
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {refreshed} streak records'))
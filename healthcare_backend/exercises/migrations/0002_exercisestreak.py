@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseStreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_streak', models.PositiveIntegerField(default=0, help_text='Consecutive active days ending on last_activity_date')),
+                ('longest_streak', models.PositiveIntegerField(default=0, help_text='Longest run of consecutive active days')),
+                ('last_activity_date', models.DateField(blank=True, help_text='Most recent day with recorded exercise progress', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.OneToOneField(limit_choices_to={'user_type': 'patient'}, on_delete=django.db.models.deletion.CASCADE, related_name='exercise_streak', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'exercise_streaks',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0002_exercisestreak'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Day the sessions were performed')),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0, help_text="Sessions with completion status 'completed'")),
+                ('total_duration', models.PositiveIntegerField(default=0, help_text='Sum of actual durations in minutes')),
+                ('difficulty_sum', models.PositiveIntegerField(default=0)),
+                ('difficulty_count', models.PositiveIntegerField(default=0)),
+                ('pain_before_sum', models.PositiveIntegerField(default=0)),
+                ('pain_before_count', models.PositiveIntegerField(default=0)),
+                ('pain_after_sum', models.PositiveIntegerField(default=0)),
+                ('pain_after_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(limit_choices_to={'user_type': 'patient'}, on_delete=django.db.models.deletion.CASCADE, related_name='exercise_daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'exercise_daily_rollups',
+                'ordering': ['date'],
+                'unique_together': {('patient', 'date')},
+            },
+        ),
+    ]
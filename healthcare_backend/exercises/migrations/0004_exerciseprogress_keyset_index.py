@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0003_exercisedailyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exerciseprogress',
+            index=models.Index(fields=['patient', 'created_at', 'id'], name='exercise_pr_patient_f7abe8_idx'),
+        ),
+    ]
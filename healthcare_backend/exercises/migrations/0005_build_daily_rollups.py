@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+def build_rollups(apps, schema_editor):
+    ExerciseProgress = apps.get_model('exercises', 'ExerciseProgress')
+    ExerciseDailyRollup = apps.get_model('exercises', 'ExerciseDailyRollup')
+
+    totals = ExerciseProgress.objects.values('patient_id', 'date_completed').annotate(
+        session_count=Count('id'),
+        completed_count=Count('id', filter=Q(completion_status='completed')),
+        total_duration=Sum('actual_duration'),
+        difficulty_sum=Sum('difficulty_rating'),
+        difficulty_count=Count('difficulty_rating'),
+        pain_before_sum=Sum('pain_level_before'),
+        pain_before_count=Count('pain_level_before'),
+        pain_after_sum=Sum('pain_level_after'),
+        pain_after_count=Count('pain_level_after'),
+    ).order_by()
+
+    ExerciseDailyRollup.objects.all().delete()
+    ExerciseDailyRollup.objects.bulk_create(
+        [
+            ExerciseDailyRollup(
+                patient_id=row.pop('patient_id'), date=row.pop('date_completed'),
+                **{field: value or 0 for field, value in row.items()}
+            )
+            for row in totals.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0004_exerciseprogress_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
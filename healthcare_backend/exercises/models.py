@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
@@ -496,12 +496,23 @@ class ExerciseProgress(models.Model):
             models.Index(fields=['patient', 'date_completed']),
             models.Index(fields=['exercise_plan_item', 'date_completed']),
             models.Index(fields=['completion_status']),
+            # Keyset pagination of a patient's progress history
+            models.Index(fields=['patient', 'created_at', 'id']),
         ]
         unique_together = ['patient', 'exercise_plan_item', 'date_completed']
     
     def __str__(self):
         return f"Progress for {self.exercise_plan_item.exercise.name} on {self.date_completed}"
     
+    def save(self, *args, **kwargs):
+        # Derived rollups are written from post_save; keep them in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
     @property
     def completion_percentage(self):
         """Calculate completion percentage based on target vs actual"""
@@ -517,3 +528,90 @@ class ExerciseProgress(models.Model):
     def pain_improvement(self):
         """Calculate pain improvement (positive = improvement)"""
         return self.pain_level_before - self.pain_level_after
+
+class ExerciseStreak(models.Model):
+    """Denormalized per-patient streak record, kept in sync with ExerciseProgress"""
+    patient = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='exercise_streak',
+        limit_choices_to={'user_type': 'patient'}
+    )
+    current_streak = models.PositiveIntegerField(
+        default=0,
+        help_text="Consecutive active days ending on last_activity_date"
+    )
+    longest_streak = models.PositiveIntegerField(
+        default=0,
+        help_text="Longest run of consecutive active days"
+    )
+    last_activity_date = models.DateField(
+        null=True,
+        blank=True,
+        help_text="Most recent day with recorded exercise progress"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'exercise_streaks'
+    
+    def __str__(self):
+        return f"Streak for {self.patient.username}: {self.current_streak} days"
+    
+    def streak_on(self, day):
+        """Return the active streak as seen on the given day"""
+        if self.last_activity_date == day:
+            return self.current_streak
+        return 0
+
+class ExerciseDailyRollup(models.Model):
+    """Per-patient, per-day aggregate of ExerciseProgress used by the analytics endpoints"""
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='exercise_daily_rollups',
+        limit_choices_to={'user_type': 'patient'}
+    )
+    date = models.DateField(
+        help_text="Day the sessions were performed"
+    )
+    session_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Sessions with completion status 'completed'"
+    )
+    total_duration = models.PositiveIntegerField(
+        default=0,
+        help_text="Sum of actual durations in minutes"
+    )
+    difficulty_sum = models.PositiveIntegerField(default=0)
+    difficulty_count = models.PositiveIntegerField(default=0)
+    pain_before_sum = models.PositiveIntegerField(default=0)
+    pain_before_count = models.PositiveIntegerField(default=0)
+    pain_after_sum = models.PositiveIntegerField(default=0)
+    pain_after_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'exercise_daily_rollups'
+        ordering = ['date']
+        unique_together = ['patient', 'date']
+    
+    def __str__(self):
+        return f"{self.session_count} sessions for {self.patient_id} on {self.date}"
+    
+    @staticmethod
+    def _average(total, count):
+        return total / count if count else 0
+    
+    @property
+    def avg_difficulty(self):
+        return self._average(self.difficulty_sum, self.difficulty_count)
+    
+    @property
+    def avg_pain_before(self):
+        return self._average(self.pain_before_sum, self.pain_before_count)
+    
+    @property
+    def avg_pain_after(self):
+        return self._average(self.pain_after_sum, self.pain_after_count)
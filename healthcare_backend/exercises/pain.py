@@ -0,0 +1,168 @@
+"""
+Pain trend analytics.
+
+Daily pain levels come from the ExerciseDailyRollup pain sums and counts,
+read for any number of patients in one query. The series are laid out as a
+patients x days matrix so the rolling mean and least-squares slope are
+computed for the whole caseload in a single vectorized pass.
+"""
+
+import warnings
+from datetime import timedelta
+
+import numpy as np
+
+from .models import ExerciseDailyRollup
+
+MAX_DAYS = 730
+ROLLING_WINDOW = 7
+
+# Weekly change (in pain scale points) beyond which a trend is not "stable"
+TREND_THRESHOLD = 0.25
+
+# ExerciseProgress.PAIN_LEVEL_CHOICES: 3 = Severe, 4 = Very Severe
+HIGH_PAIN_LEVEL = 3
+
+
+def load_pain_matrix(patients, start_date, end_date):
+    """
+    Read daily pain averages for the given patients (ids or a queryset).
+
+    Returns ``(patient_ids, pain_before, pain_after)`` where both matrices
+    have one row per patient and one column per day, NaN on inactive days.
+    """
+    num_days = (end_date - start_date).days + 1
+    rows = ExerciseDailyRollup.objects.filter(
+        patient__in=patients,
+        date__gte=start_date,
+        date__lte=end_date
+    ).values_list(
+        'patient_id', 'date',
+        'pain_before_sum', 'pain_before_count',
+        'pain_after_sum', 'pain_after_count'
+    ).order_by()
+    rows = list(rows)
+
+    patient_ids = sorted({row[0] for row in rows})
+    position = {patient_id: index for index, patient_id in enumerate(patient_ids)}
+    pain_before = np.full((len(patient_ids), num_days), np.nan)
+    pain_after = np.full((len(patient_ids), num_days), np.nan)
+    if not rows:
+        return patient_ids, pain_before, pain_after
+
+    data = np.array(
+        [
+            (position[row[0]], (row[1] - start_date).days, row[2], row[3], row[4], row[5])
+            for row in rows
+        ],
+        dtype=float
+    )
+    row_index = data[:, 0].astype(int)
+    col_index = data[:, 1].astype(int)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pain_before[row_index, col_index] = np.where(data[:, 3] > 0, data[:, 2] / data[:, 3], np.nan)
+        pain_after[row_index, col_index] = np.where(data[:, 5] > 0, data[:, 4] / data[:, 5], np.nan)
+    return patient_ids, pain_before, pain_after
+
+
+def rolling_mean(matrix, window=ROLLING_WINDOW):
+    """NaN-aware trailing rolling mean along the day axis"""
+    valid = ~np.isnan(matrix)
+    values = np.where(valid, matrix, 0.0)
+    pad = np.zeros((matrix.shape[0], 1))
+    sums = np.cumsum(np.hstack([pad, values]), axis=1)
+    counts = np.cumsum(np.hstack([pad, valid.astype(float)]), axis=1)
+    lagged = np.maximum(np.arange(1, matrix.shape[1] + 1) - window, 0)
+    window_sums = sums[:, 1:] - sums[:, lagged]
+    window_counts = counts[:, 1:] - counts[:, lagged]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+
+def fit_slopes(matrix):
+    """
+    Least-squares slope (points per day) of every row, ignoring NaN days.
+
+    Returns ``(slopes, points)``; rows with fewer than two points get a 0 slope.
+    """
+    valid = ~np.isnan(matrix)
+    x = np.arange(matrix.shape[1], dtype=float)
+    y = np.where(valid, matrix, 0.0)
+    xs = np.where(valid, x, 0.0)
+
+    n = valid.sum(axis=1).astype(float)
+    sum_x = xs.sum(axis=1)
+    sum_y = y.sum(axis=1)
+    sum_xx = (xs * xs).sum(axis=1)
+    sum_xy = (xs * y).sum(axis=1)
+
+    denominator = n * sum_xx - sum_x ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+    return slopes, n.astype(int)
+
+
+def trend_labels(slopes, threshold=TREND_THRESHOLD):
+    """Map daily slopes to improving / stable / worsening (lower pain is better)"""
+    weekly = slopes * 7
+    return np.where(
+        weekly <= -threshold, 'improving',
+        np.where(weekly >= threshold, 'worsening', 'stable')
+    )
+
+
+def _rounded(value, digits=2):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def analyze(patients, start_date, end_date, include_daily=False):
+    """
+    Build pain trend reports for a set of patients.
+
+    The trend is fitted on the 7-day rolling mean of the pain level reported
+    before exercising, which tracks the underlying condition rather than the
+    short-term relief of a session. Returns a dict keyed by patient id.
+    """
+    patient_ids, pain_before, pain_after = load_pain_matrix(patients, start_date, end_date)
+    if not patient_ids:
+        return {}
+
+    smoothed = rolling_mean(pain_before)
+    slopes, points = fit_slopes(smoothed)
+    labels = trend_labels(slopes)
+
+    active = ~np.isnan(pain_before)
+    with warnings.catch_warnings():
+        # All-NaN rows (no pain reported in the window) average to NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        average_pain = np.nanmean(pain_before, axis=1)
+        average_after = np.nanmean(pain_after, axis=1)
+    pain_free_days = (active & (pain_before == 0) & (np.nan_to_num(pain_after) == 0)).sum(axis=1)
+    high_pain_days = (active & (pain_before >= HIGH_PAIN_LEVEL)).sum(axis=1)
+
+    reports = {}
+    for index, patient_id in enumerate(patient_ids):
+        report = {
+            'summary': {
+                'average_pain_level': _rounded(average_pain[index]),
+                'average_pain_after_exercise': _rounded(average_after[index]),
+                'pain_free_days': int(pain_free_days[index]),
+                'high_pain_days': int(high_pain_days[index]),
+                'days_with_data': int(active[index].sum()),
+                'improvement_trend': str(labels[index]),
+                'trend_slope_per_week': round(float(slopes[index]) * 7, 3),
+                'trend_points': int(points[index]),
+            }
+        }
+        if include_daily:
+            report['daily_data'] = [
+                {
+                    'date': (start_date + timedelta(days=day)).isoformat(),
+                    'pain_level': _rounded(pain_before[index, day]),
+                    'pain_after': _rounded(pain_after[index, day]),
+                    'rolling_average': _rounded(smoothed[index, day]),
+                }
+                for day in np.flatnonzero(active[index]).tolist()
+            ]
+        reports[patient_id] = report
+    return reports
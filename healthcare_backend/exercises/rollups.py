@@ -0,0 +1,117 @@
+"""
+Daily exercise rollups.
+
+Every ExerciseProgress row contributes to exactly one ExerciseDailyRollup
+(patient, day). Saves and deletes apply the row's contribution as a delta
+with F() expressions, so the analytics endpoints read one row per active day
+instead of every session in the window.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import ExerciseDailyRollup, ExerciseProgress
+
+# ExerciseProgress fields a rollup depends on
+TRACKED_FIELDS = (
+    'patient_id', 'date_completed', 'completion_status', 'actual_duration',
+    'difficulty_rating', 'pain_level_before', 'pain_level_after',
+)
+
+COUNTER_FIELDS = (
+    'session_count', 'completed_count', 'total_duration',
+    'difficulty_sum', 'difficulty_count',
+    'pain_before_sum', 'pain_before_count',
+    'pain_after_sum', 'pain_after_count',
+)
+
+
+def snapshot(progress):
+    """Return the rollup-relevant values of a progress instance"""
+    return {field: getattr(progress, field) for field in TRACKED_FIELDS}
+
+
+def contribution(values):
+    """Translate tracked progress values into rollup counter increments"""
+    difficulty = values['difficulty_rating']
+    pain_before = values['pain_level_before']
+    pain_after = values['pain_level_after']
+    return {
+        'session_count': 1,
+        'completed_count': 1 if values['completion_status'] == 'completed' else 0,
+        'total_duration': values['actual_duration'] or 0,
+        'difficulty_sum': difficulty or 0,
+        'difficulty_count': 0 if difficulty is None else 1,
+        'pain_before_sum': pain_before or 0,
+        'pain_before_count': 0 if pain_before is None else 1,
+        'pain_after_sum': pain_after or 0,
+        'pain_after_count': 0 if pain_after is None else 1,
+    }
+
+
+def apply(values, sign=1):
+    """Add (sign=1) or remove (sign=-1) one session's contribution"""
+    deltas = contribution(values)
+    patient_id, day = values['patient_id'], values['date_completed']
+
+    with transaction.atomic():
+        rollups = ExerciseDailyRollup.objects.filter(patient_id=patient_id, date=day)
+        updates = {field: F(field) + sign * delta for field, delta in deltas.items() if delta}
+        if rollups.update(**updates):
+            if sign < 0:
+                rollups.filter(session_count=0).delete()
+            return
+        if sign < 0:
+            # Nothing to subtract from; the rollup was never built for this day
+            return
+        try:
+            with transaction.atomic():
+                ExerciseDailyRollup.objects.create(patient_id=patient_id, date=day, **deltas)
+        except IntegrityError:
+            # Created concurrently by another session; fold into that row
+            rollups.update(**updates)
+
+
+def replace(previous, current):
+    """Move a session's contribution after it was edited"""
+    with transaction.atomic():
+        if previous:
+            apply(previous, sign=-1)
+        apply(current, sign=1)
+
+
+def aggregate_queryset(queryset):
+    """Aggregate progress rows into rollup field values, grouped per patient and day"""
+    return queryset.values('patient_id', 'date_completed').annotate(
+        session_count=Count('id'),
+        completed_count=Count('id', filter=Q(completion_status='completed')),
+        total_duration=Sum('actual_duration'),
+        difficulty_sum=Sum('difficulty_rating'),
+        difficulty_count=Count('difficulty_rating'),
+        pain_before_sum=Sum('pain_level_before'),
+        pain_before_count=Count('pain_level_before'),
+        pain_after_sum=Sum('pain_level_after'),
+        pain_after_count=Count('pain_level_after'),
+    ).order_by()
+
+
+def rebuild(patient_ids=None, batch_size=1000):
+    """Rebuild rollups from ExerciseProgress, optionally for a subset of patients"""
+    progress = ExerciseProgress.objects.all()
+    rollups = ExerciseDailyRollup.objects.all()
+    if patient_ids is not None:
+        progress = progress.filter(patient_id__in=patient_ids)
+        rollups = rollups.filter(patient_id__in=patient_ids)
+
+    with transaction.atomic():
+        rollups.delete()
+        rows = [
+            ExerciseDailyRollup(
+                patient_id=row['patient_id'],
+                date=row['date_completed'],
+                **{field: row[field] or 0 for field in COUNTER_FIELDS}
+            )
+            for row in aggregate_queryset(progress).iterator()
+        ]
+        ExerciseDailyRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
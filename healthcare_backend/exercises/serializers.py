@@ -1,16 +1,18 @@
 from rest_framework import serializers
+from core.fastpath import DateTime, FileURL, Shape
+from core.fieldsets import DynamicFieldsMixin
 from .models import (
     ExerciseCategory, Exercise, ExercisePlan, 
     ExercisePlanItem, ExerciseProgress
 )
 from authentication.serializers import UserSerializer
 
-class ExerciseCategorySerializer(serializers.ModelSerializer):
+class ExerciseCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ExerciseCategory
         fields = ['id', 'name', 'description']
 
-class ExerciseSerializer(serializers.ModelSerializer):
+class ExerciseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     
     class Meta:
@@ -20,7 +22,24 @@ class ExerciseSerializer(serializers.ModelSerializer):
                   'video_url', 'image', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
-class ExercisePlanItemSerializer(serializers.ModelSerializer):
+# ExerciseSerializer output for core.fastpath list endpoints; keep the two in step
+EXERCISE_SHAPE = Shape([
+    ('id', 'id'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('category', 'category'),
+    ('category_name', 'category__name'),
+    ('difficulty', 'difficulty'),
+    ('duration', 'duration'),
+    ('repetitions', 'repetitions'),
+    ('sets', 'sets'),
+    ('video_url', 'video_url'),
+    ('image', FileURL('image', Exercise._meta.get_field('image').storage)),
+    ('created_at', DateTime('created_at')),
+    ('updated_at', DateTime('updated_at')),
+])
+
+class ExercisePlanItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     exercise = ExerciseSerializer(read_only=True)
     exercise_id = serializers.PrimaryKeyRelatedField(
         queryset=Exercise.objects.all(),
@@ -33,7 +52,7 @@ class ExercisePlanItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'exercise', 'exercise_id', 'day_of_week', 
                   'custom_repetitions', 'custom_sets', 'notes']
 
-class ExercisePlanSerializer(serializers.ModelSerializer):
+class ExercisePlanSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     patient = UserSerializer(read_only=True)
     physiotherapist = UserSerializer(read_only=True)
     plan_items = ExercisePlanItemSerializer(many=True, read_only=True)
@@ -68,21 +87,21 @@ class ExercisePlanCreateSerializer(serializers.ModelSerializer):
         
         return exercise_plan
 
-class ExerciseProgressSerializer(serializers.ModelSerializer):
+class ExerciseProgressSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     exercise_name = serializers.CharField(source='exercise_plan_item.exercise.name', read_only=True)
     
     class Meta:
         model = ExerciseProgress
         fields = ['id', 'patient', 'exercise_plan_item', 'exercise_name', 
                   'date_completed', 'completed_repetitions', 'completed_sets', 
-                  'difficulty_rating', 'pain_level', 'notes', 'created_at']
+                  'difficulty_rating', 'pain_level_before', 'pain_level_after', 'notes', 'created_at']
         read_only_fields = ['created_at']
 
 class ExerciseProgressCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExerciseProgress
         fields = ['exercise_plan_item', 'date_completed', 'completed_repetitions', 
-                  'completed_sets', 'difficulty_rating', 'pain_level', 'notes']
+                  'completed_sets', 'difficulty_rating', 'pain_level_before', 'pain_level_after', 'notes']
     
     def create(self, validated_data):
         # Set the patient to the current user
@@ -0,0 +1,63 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import catalog, rollups
+from .models import Exercise, ExerciseCategory, ExerciseProgress
+from .streaks import record_activity, refresh_streak
+
+
+@receiver(pre_save, sender=ExerciseProgress)
+def remember_previous_progress(sender, instance, raw=False, **kwargs):
+    """Keep the stored values of an edited row so its rollup can be moved"""
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._rollup_previous = sender.objects.filter(pk=instance.pk).values(
+        *rollups.TRACKED_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=ExerciseProgress)
+def update_rollup_on_progress_save(sender, instance, created, raw=False, **kwargs):
+    """Apply the session to its daily rollup"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_rollup_previous', None)
+    rollups.replace(previous, rollups.snapshot(instance))
+
+
+@receiver(post_save, sender=ExerciseProgress)
+def update_streak_on_progress_save(sender, instance, created, raw=False, **kwargs):
+    """Keep the patient's streak record in sync with new or edited progress"""
+    if raw:
+        return
+    if created:
+        record_activity(instance.patient_id, instance.date_completed)
+    else:
+        previous = getattr(instance, '_rollup_previous', None)
+        if previous and previous['patient_id'] != instance.patient_id:
+            refresh_streak(previous['patient_id'], create=False)
+        refresh_streak(instance.patient_id)
+
+
+@receiver(post_delete, sender=ExerciseProgress)
+def update_rollup_on_progress_delete(sender, instance, **kwargs):
+    """Remove the session from its daily rollup"""
+    rollups.apply(rollups.snapshot(instance), sign=-1)
+
+
+@receiver(post_delete, sender=ExerciseProgress)
+def update_streak_on_progress_delete(sender, instance, **kwargs):
+    """Recompute the streak once a progress entry is removed"""
+    refresh_streak(instance.patient_id, create=False)
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+@receiver(post_save, sender=ExerciseCategory)
+@receiver(post_delete, sender=ExerciseCategory)
+def bump_catalog_version(sender, instance, raw=False, **kwargs):
+    """Any catalog write invalidates the ETags handed out so far"""
+    if raw:
+        return
+    catalog.bump()
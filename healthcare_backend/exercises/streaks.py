@@ -0,0 +1,133 @@
+"""
+Exercise streak engine.
+
+Streaks are computed with a single gaps-and-islands query over the distinct
+``date_completed`` values of a patient: consecutive days share the same
+``day - ROW_NUMBER()`` value, so grouping by it yields one row per run.
+The result is stored in ``ExerciseStreak`` and kept up to date from the
+ExerciseProgress signals, so dashboards read it without scanning progress.
+"""
+
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ExerciseProgress, ExerciseStreak
+
+# Vendor specific "day number minus row number" expression used as the island key
+ISLAND_KEY_SQL = {
+    'sqlite': "julianday(d) - ROW_NUMBER() OVER (ORDER BY d)",
+    'postgresql': "d - CAST(ROW_NUMBER() OVER (ORDER BY d) AS integer)",
+}
+
+STREAK_SQL = """
+    WITH days AS (
+        SELECT DISTINCT date_completed AS d
+        FROM {table}
+        WHERE patient_id = %s
+    ),
+    islands AS (
+        SELECT d, {island_key} AS grp
+        FROM days
+    ),
+    runs AS (
+        SELECT MAX(d) AS run_end, COUNT(*) AS run_length
+        FROM islands
+        GROUP BY grp
+    )
+    SELECT
+        (SELECT run_end FROM runs ORDER BY run_end DESC LIMIT 1),
+        (SELECT run_length FROM runs ORDER BY run_end DESC LIMIT 1),
+        (SELECT MAX(run_length) FROM runs)
+"""
+
+
+def _as_date(value):
+    """Normalize raw cursor date values (SQLite returns ISO strings)"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def compute_streaks(patient_id):
+    """
+    Compute streak figures for a patient in one query.
+
+    Returns a tuple ``(last_activity_date, current_streak, longest_streak)``
+    where ``current_streak`` is the length of the run ending on
+    ``last_activity_date``.
+    """
+    sql = STREAK_SQL.format(
+        table=ExerciseProgress._meta.db_table,
+        island_key=ISLAND_KEY_SQL.get(connection.vendor, ISLAND_KEY_SQL['postgresql']),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [patient_id])
+        run_end, run_length, longest = cursor.fetchone()
+    return _as_date(run_end), run_length or 0, longest or 0
+
+
+def refresh_streak(patient_id, create=True):
+    """
+    Recompute and store the streak record for a patient.
+
+    With ``create=False`` only an existing record is updated, which keeps
+    cascading patient deletes from re-inserting a row for a removed user.
+    """
+    last_activity_date, current_streak, longest_streak = compute_streaks(patient_id)
+    values = {
+        'last_activity_date': last_activity_date,
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+    }
+    if not create:
+        ExerciseStreak.objects.filter(patient_id=patient_id).update(
+            updated_at=timezone.now(), **values
+        )
+        return None
+    streak, _ = ExerciseStreak.objects.update_or_create(patient_id=patient_id, defaults=values)
+    return streak
+
+
+def record_activity(patient_id, day):
+    """
+    Fold a newly created progress entry into the stored streak.
+
+    Appending to (or starting after) the latest run is handled in place;
+    back-filled days may merge runs, so those fall back to a recompute.
+    """
+    day = _as_date(day)
+    with transaction.atomic():
+        streak = ExerciseStreak.objects.select_for_update().filter(patient_id=patient_id).first()
+        if streak is None or streak.last_activity_date is None:
+            return refresh_streak(patient_id)
+
+        last = streak.last_activity_date
+        if day == last:
+            return streak
+        if day < last:
+            return refresh_streak(patient_id)
+
+        if day == last + timedelta(days=1):
+            streak.current_streak += 1
+        else:
+            streak.current_streak = 1
+        streak.last_activity_date = day
+        streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+        streak.save(update_fields=['current_streak', 'longest_streak', 'last_activity_date', 'updated_at'])
+        return streak
+
+
+def get_streak(patient):
+    """Return the stored streak record, building it on first access"""
+    try:
+        return patient.exercise_streak
+    except ExerciseStreak.DoesNotExist:
+        return refresh_streak(patient.pk)
+
+
+def get_current_streak(patient, today=None):
+    """Return the patient's active streak as of today"""
+    today = today or timezone.now().date()
+    return get_streak(patient).streak_on(today)
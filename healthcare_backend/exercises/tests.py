@@ -1,3 +1,347 @@
+from datetime import timedelta
+from importlib import import_module
+
+import numpy as np
+from django.apps import apps
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.testing import QueryBudgetTestCase, create_user
+
+from . import catalog, pain, rollups, streaks
+from .models import (
+    Exercise, ExerciseCategory, ExerciseDailyRollup, ExercisePlan, ExercisePlanItem, ExerciseProgress,
+    ExerciseStreak
+)
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.user = create_user('budget_patient')
+        self.physiotherapist = create_user('budget_physio', 'physiotherapist')
+        self.category = ExerciseCategory.objects.create(name='Budget')
+        self.plan = self.create_plan()
+
+    def create_plan(self):
+        today = timezone.now().date()
+        return ExercisePlan.objects.create(
+            name='Budget plan', description='Budget', patient=self.user,
+            physiotherapist=self.physiotherapist, start_date=today, end_date=today + timedelta(days=28)
+        )
+
+    def add_rows(self, number):
+        """
+        Per row: a new exercise and category, a plan holding it with one
+        progress entry, and the same exercise added to ``self.plan`` (so its
+        nested items grow too).
+        """
+        for _ in range(number):
+            category = ExerciseCategory.objects.create(name=f'Category {ExerciseCategory.objects.count()}')
+            exercise = Exercise.objects.create(
+                name=f'Exercise {Exercise.objects.count()}', description='Budget', category=category,
+                duration=10
+            )
+            ExercisePlanItem.objects.create(exercise_plan=self.plan, exercise=exercise, day_of_week=0)
+            item = ExercisePlanItem.objects.create(
+                exercise_plan=self.create_plan(), exercise=exercise, day_of_week=0
+            )
+            ExerciseProgress.objects.create(
+                patient=self.user, exercise_plan_item=item, date_completed=timezone.now().date()
+            )
+
+    def test_category_list(self):
+        self.assertQueryBudget(3, '/api/exercise-categories/', self.add_rows)
+
+    def test_category_detail(self):
+        self.assertQueryBudget(2, self.detail_url('/api/exercise-categories/', ExerciseCategory), self.add_rows)
+
+    def test_exercise_list(self):
+        self.assertQueryBudget(3, '/api/exercises/', self.add_rows)
+
+    def test_exercise_detail(self):
+        self.assertQueryBudget(2, self.detail_url('/api/exercises/', Exercise), self.add_rows)
+
+    def test_plan_list(self):
+        self.assertQueryBudget(3, '/api/exercise-plans/', self.add_rows)
+
+    def test_plan_detail(self):
+        self.assertQueryBudget(2, f'/api/exercise-plans/{self.plan.pk}/', self.add_rows)
+
+    def test_plan_item_list(self):
+        self.assertQueryBudget(2, '/api/exercise-plan-items/', self.add_rows)
+
+    def test_plan_item_detail(self):
+        self.assertQueryBudget(1, self.detail_url('/api/exercise-plan-items/', ExercisePlanItem), self.add_rows)
+
+    def test_progress_list(self):
+        self.assertQueryBudget(1, '/api/exercise-progress/', self.add_rows)
+
+    def test_progress_detail(self):
+        self.assertQueryBudget(1, self.detail_url('/api/exercise-progress/', ExerciseProgress), self.add_rows)
+
+
+class ProgressTestCase(TestCase):
+    """A patient on a plan with two items to log progress against"""
+
+    def setUp(self):
+        self.patient = create_user('rollup_patient')
+        physiotherapist = create_user('rollup_physio', 'physiotherapist')
+        self.today = timezone.now().date()
+        plan = ExercisePlan.objects.create(
+            name='Rollup plan', description='Rollup', patient=self.patient, physiotherapist=physiotherapist,
+            start_date=self.today, end_date=self.today + timedelta(days=28)
+        )
+        exercise = Exercise.objects.create(
+            name='Rollup exercise', description='Rollup',
+            category=ExerciseCategory.objects.create(name='Rollup'), duration=10
+        )
+        # Progress is unique per plan item and day, so same-day sessions use both
+        self.items = [
+            ExercisePlanItem.objects.create(exercise_plan=plan, exercise=exercise, day_of_week=day)
+            for day in (0, 1)
+        ]
+
+    def progress(self, day, item=0, **fields):
+        return ExerciseProgress.objects.create(
+            patient=self.patient, exercise_plan_item=self.items[item], date_completed=day, **fields
+        )
+
+
+class DailyRollupTests(ProgressTestCase):
+
+    def stored_rollups(self):
+        return list(ExerciseDailyRollup.objects.order_by('patient_id', 'date').values(
+            'patient_id', 'date', *rollups.COUNTER_FIELDS
+        ))
+
+    def assertMatchesRebuild(self):
+        stored = self.stored_rollups()
+        rollups.rebuild()
+        self.assertEqual(stored, self.stored_rollups())
+
+    def test_saves_add_to_the_day(self):
+        self.progress(self.today, completion_status='completed', actual_duration=20)
+        self.progress(self.today, item=1, completion_status='skipped')
+
+        rollup = ExerciseDailyRollup.objects.get(patient=self.patient, date=self.today)
+        self.assertEqual((rollup.session_count, rollup.completed_count, rollup.total_duration), (2, 1, 20))
+        self.assertMatchesRebuild()
+
+    def test_edit_moves_the_contribution(self):
+        progress = self.progress(self.today, completion_status='completed', actual_duration=20)
+        self.progress(self.today, item=1, actual_duration=5)
+        yesterday = self.today - timedelta(days=1)
+        progress.date_completed = yesterday
+        progress.completion_status = 'partial'
+        progress.actual_duration = 15
+        progress.save()
+
+        self.assertEqual(
+            ExerciseDailyRollup.objects.get(patient=self.patient, date=self.today).total_duration, 5
+        )
+        moved = ExerciseDailyRollup.objects.get(patient=self.patient, date=yesterday)
+        self.assertEqual((moved.session_count, moved.completed_count, moved.total_duration), (1, 0, 15))
+        self.assertMatchesRebuild()
+
+    def test_delete_removes_the_contribution(self):
+        kept = self.progress(self.today, actual_duration=10)
+        removed = self.progress(self.today, item=1, actual_duration=30)
+        removed.delete()
+        self.assertEqual(ExerciseDailyRollup.objects.get(date=self.today).total_duration, 10)
+
+        kept.delete()
+        self.assertFalse(ExerciseDailyRollup.objects.exists())
+
+    def test_migration_builds_rollups_for_existing_progress(self):
+        self.progress(self.today, completion_status='completed', actual_duration=20)
+        self.progress(self.today - timedelta(days=3), pain_level_after=2)
+        expected = self.stored_rollups()
+        ExerciseDailyRollup.objects.all().delete()
+
+        import_module('exercises.migrations.0005_build_daily_rollups').build_rollups(apps, None)
+
+        self.assertEqual(self.stored_rollups(), expected)
+
+
+class StreakTests(ProgressTestCase):
+
+    def stored_streak(self):
+        streak = ExerciseStreak.objects.get(patient=self.patient)
+        return streak.last_activity_date, streak.current_streak, streak.longest_streak
+
+    def assertMatchesQuery(self):
+        self.assertEqual(self.stored_streak(), streaks.compute_streaks(self.patient.pk))
+
+    def test_consecutive_days(self):
+        for offset in (2, 1, 0):
+            self.progress(self.today - timedelta(days=offset))
+        self.progress(self.today, item=1)
+
+        self.assertEqual(self.stored_streak(), (self.today, 3, 3))
+        self.assertMatchesQuery()
+        self.assertEqual(streaks.get_current_streak(self.patient, self.today), 3)
+        self.assertEqual(streaks.get_current_streak(self.patient, self.today + timedelta(days=2)), 0)
+
+    def test_broken_streak(self):
+        for offset in (6, 5, 4, 1, 0):
+            self.progress(self.today - timedelta(days=offset))
+
+        self.assertEqual(self.stored_streak(), (self.today, 2, 3))
+        self.assertMatchesQuery()
+
+        # Filling the gap merges the runs
+        for offset in (3, 2):
+            self.progress(self.today - timedelta(days=offset))
+        self.assertEqual(self.stored_streak(), (self.today, 7, 7))
+        self.assertMatchesQuery()
+
+    def test_deleted_and_moved_progress(self):
+        for offset in (2, 1):
+            self.progress(self.today - timedelta(days=offset))
+        latest = self.progress(self.today)
+
+        self.progress(self.today - timedelta(days=1), item=1).delete()
+        self.assertEqual(self.stored_streak(), (self.today, 3, 3))
+
+        ExerciseProgress.objects.get(date_completed=self.today - timedelta(days=1)).delete()
+        self.assertEqual(self.stored_streak(), (self.today, 1, 1))
+        self.assertMatchesQuery()
+
+        latest.date_completed = self.today - timedelta(days=1)
+        latest.save()
+        self.assertEqual(self.stored_streak(), (self.today - timedelta(days=1), 2, 2))
+        self.assertMatchesQuery()
+
+        ExerciseProgress.objects.all().delete()
+        self.assertEqual(self.stored_streak(), (None, 0, 0))
+
+    def test_built_on_first_read(self):
+        self.progress(self.today)
+        ExerciseStreak.objects.all().delete()
+
+        self.patient.refresh_from_db()
+        self.assertEqual(streaks.get_streak(self.patient).current_streak, 1)
+        self.assertEqual(self.stored_streak(), (self.today, 1, 1))
+
+
+class CatalogTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = ExerciseCategory.objects.create(name='Mobility')
+        self.stretch, self.squat = [
+            Exercise.objects.create(name=name, description=name, category=self.category, duration=10)
+            for name in ('Stretch', 'Squat')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('catalog_patient'))
+
+    def test_etag_revalidation(self):
+        for url in ('/api/exercises/', f'/api/exercises/{self.stretch.pk}/', '/api/exercise-categories/'):
+            response = self.client.get(url)
+            tag = response['ETag']
+            with self.assertNumQueries(0):  # the version is cached
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+            self.assertEqual(response.status_code, 304, url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.squat.name = 'Deep squat'
+            self.squat.save()
+        response = self.client.get('/api/exercises/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], tag)
+        self.assertIn('Deep squat', [row['name'] for row in response.data['results']])
+
+    def test_delta_sync(self):
+        start = (timezone.now() - timedelta(hours=1)).isoformat()
+        first = self.client.get('/api/exercises/', {'updated_since': start}).data
+        self.assertEqual({row['id'] for row in first['changed']}, {self.stretch.pk, self.squat.pk})
+        self.assertEqual(first['deactivated'], [])
+
+        # Saved before the read but committed after it: the next sync still sees it
+        Exercise.objects.filter(pk=self.stretch.pk).update(
+            name='Long stretch', updated_at=timezone.now() - timedelta(seconds=1)
+        )
+        Exercise.objects.filter(pk=self.squat.pk).update(is_active=False, updated_at=timezone.now())
+        second = self.client.get('/api/exercises/', {'updated_since': first['synced_at']}).data
+        self.assertEqual([row['name'] for row in second['changed']], ['Long stretch'])
+        self.assertEqual(second['deactivated'], [self.squat.pk])
+
+        # A category rename changes the category name of its exercises
+        ExerciseCategory.objects.filter(pk=self.category.pk).update(
+            name='Flexibility', updated_at=timezone.now() + timedelta(minutes=5)
+        )
+        third = self.client.get('/api/exercises/', {
+            'updated_since': (timezone.now() + timedelta(minutes=1)).isoformat()
+        }).data
+        self.assertEqual([row['id'] for row in third['changed']], [self.stretch.pk])
+
+        response = self.client.get('/api/exercises/', {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_version_bumps_on_writes(self):
+        before = catalog.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseCategory.objects.create(name='Strength')
+        self.assertEqual(catalog.version(), before + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stretch.delete()
+        self.assertEqual(catalog.version(), before + 2)
+
+
+class PainTrendTests(TestCase):
+
+    def test_rolling_mean_skips_missing_days(self):
+        matrix = np.array([[4.0, np.nan, 2.0, np.nan, np.nan]])
+        np.testing.assert_allclose(pain.rolling_mean(matrix, window=2), [[4.0, 4.0, 2.0, 2.0, np.nan]])
+
+    def test_slopes_and_labels(self):
+        nan = np.nan
+        matrix = np.array([
+            [4.0, 3.0, 2.0, 1.0],      # falling one point a day
+            [1.0, nan, 3.0, nan],      # rising, with gaps
+            [2.0, 2.0, 2.0, 2.0],
+            [3.0, nan, nan, nan],      # a single point has no trend
+        ])
+        slopes, points = pain.fit_slopes(matrix)
+        np.testing.assert_allclose(slopes, [-1.0, 1.0, 0.0, 0.0])
+        self.assertEqual(points.tolist(), [4, 2, 4, 1])
+        self.assertEqual(
+            pain.trend_labels(slopes).tolist(), ['improving', 'worsening', 'stable', 'stable']
+        )
+
+    def test_reports_from_rollups(self):
+        patient = create_user('pain_patient')
+        other = create_user('pain_other')
+        physiotherapist = create_user('pain_physio', 'physiotherapist')
+        today = timezone.now().date()
+        start = today - timedelta(days=13)
+        # Pain before exercising falls from 4 to 1 over two weeks for the first patient
+        ExerciseDailyRollup.objects.bulk_create([
+            ExerciseDailyRollup(
+                patient=patient, date=start + timedelta(days=day), session_count=1,
+                pain_before_sum=4 - day * 3 // 13, pain_before_count=1, pain_after_sum=0, pain_after_count=1
+            )
+            for day in range(14)
+        ] + [
+            ExerciseDailyRollup(patient=other, date=today, session_count=1, pain_before_sum=3, pain_before_count=1)
+        ])
+
+        reports = pain.analyze([patient.pk, other.pk], start, today, include_daily=True)
+
+        summary = reports[patient.pk]['summary']
+        self.assertEqual(summary['improvement_trend'], 'improving')
+        self.assertEqual(summary['days_with_data'], 14)
+        self.assertEqual(summary['high_pain_days'], 9)  # five days at 4, four at 3
+        self.assertEqual(len(reports[patient.pk]['daily_data']), 14)
+        self.assertEqual(reports[other.pk]['summary']['improvement_trend'], 'stable')
+
+        client = APIClient()
+        client.force_authenticate(physiotherapist)
+        response = client.get('/api/analytics/pain/?patient_id=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'patient_id must be an integer'})
 
-# Create your tests here.
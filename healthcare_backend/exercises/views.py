@@ -1,18 +1,26 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import serializers, viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
-from django.db.models import Q, Count, Avg, Sum
+from django.db.models import Q, Count, Avg, Sum, Prefetch
 from datetime import datetime, timedelta
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetsMixin
+from core.pagination import KeysetPagination
+from core.prefetch import NOTHING, PrefetchPlan, PrefetchPlanMixin
+from . import catalog
 from .models import ExerciseCategory, Exercise, ExercisePlan, ExercisePlanItem, ExerciseProgress
 from .serializers import (
     ExerciseCategorySerializer, ExerciseSerializer, ExercisePlanSerializer,
     ExercisePlanItemSerializer, ExerciseProgressSerializer,
-    ExercisePlanCreateSerializer, ExerciseProgressCreateSerializer
+    ExercisePlanCreateSerializer, ExerciseProgressCreateSerializer, EXERCISE_SHAPE
 )
 
-class ExerciseCategoryViewSet(viewsets.ModelViewSet):
+# Plan items render their exercise, which renders its category's name
+PLAN_ITEM_PLAN = PrefetchPlan(select_related=['exercise__category'])
+
+class ExerciseCategoryViewSet(catalog.CatalogETagMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing exercise categories
     """
@@ -22,15 +30,32 @@ class ExerciseCategoryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return ExerciseCategory.objects.filter(is_active=True).order_by('sort_order', 'name')
 
-class ExerciseViewSet(viewsets.ModelViewSet):
+class ExerciseViewSet(catalog.CatalogETagMixin, PrefetchPlanMixin, FastListMixin, SparseFieldsetsMixin,
+                      viewsets.ModelViewSet):
     """
     ViewSet for managing exercises
+
+    ``?updated_since=<ISO datetime>`` turns the list into a delta for
+    offline catalogs: the exercises changed since then plus the ids of
+    those deactivated since then. Consecutive deltas overlap (see
+    ``catalog.sync_point``), so clients apply them as upserts.
     """
     serializer_class = ExerciseSerializer
     permission_classes = [IsAuthenticated]
+    fast_shape = EXERCISE_SHAPE
+    prefetch_plans = {
+        'default': PrefetchPlan(select_related=['category']),
+        'destroy': NOTHING,
+    }
     
     def get_queryset(self):
-        queryset = Exercise.objects.filter(is_active=True).select_related('category', 'created_by')
+        queryset = self.plan_queryset(Exercise.objects.all())
+        since = catalog.parse_updated_since(self.request.query_params) if self.action == 'list' else None
+        if since is None:
+            queryset = queryset.filter(is_active=True)
+        else:
+            # Deactivated exercises are reported too, so clients can drop them
+            queryset = catalog.changed_since(queryset, since)
         
         # Filter by category
         category = self.request.query_params.get('category')
@@ -53,6 +78,23 @@ class ExerciseViewSet(viewsets.ModelViewSet):
         
         return queryset.order_by('name')
     
+    def list(self, request, *args, **kwargs):
+        if catalog.parse_updated_since(request.query_params) is None:
+            return super().list(request, *args, **kwargs)
+        return self.conditional(self.delta, request)
+    
+    def delta(self, request):
+        """Exercises changed since ``?updated_since=``, split into changed and deactivated"""
+        synced_at = catalog.sync_point()
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({
+            'version': catalog.version(),
+            # Pass back as updated_since on the next sync
+            'synced_at': serializers.DateTimeField().to_representation(synced_at),
+            'changed': self.fast_data(queryset.filter(is_active=True)),
+            'deactivated': list(queryset.filter(is_active=False).values_list('id', flat=True)),
+        })
+    
     @action(detail=False, methods=['get'])
     def popular(self, request):
         """Get most popular exercises based on usage in plans"""
@@ -66,6 +108,9 @@ class ExerciseViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def by_body_part(self, request):
         """Get exercises grouped by target body parts"""
+        return self.conditional(self._by_body_part, request)
+    
+    def _by_body_part(self, request):
         body_part = request.query_params.get('body_part')
         if not body_part:
             return Response({'error': 'body_part parameter required'}, 
@@ -77,11 +122,19 @@ class ExerciseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(exercises, many=True)
         return Response(serializer.data)
 
-class ExercisePlanViewSet(viewsets.ModelViewSet):
+class ExercisePlanViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing exercise plans
     """
     permission_classes = [IsAuthenticated]
+    prefetch_plans = {
+        'default': PrefetchPlan(
+            select_related=['patient', 'physiotherapist'],
+            prefetch_related=[Prefetch('plan_items', queryset=PLAN_ITEM_PLAN.apply(ExercisePlanItem.objects.all()))]
+        ),
+        'destroy': NOTHING,
+        'progress_summary': NOTHING,
+    }
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -90,9 +143,7 @@ class ExercisePlanViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = ExercisePlan.objects.select_related(
-            'patient', 'physiotherapist'
-        ).prefetch_related('items__exercise', 'progress_records')
+        queryset = self.plan_queryset(ExercisePlan.objects.all())
         
         if user.user_type == 'patient':
             queryset = queryset.filter(patient=user)
@@ -158,7 +209,7 @@ class ExercisePlanViewSet(viewsets.ModelViewSet):
         """Get progress summary for the plan"""
         plan = self.get_object()
         
-        total_items = plan.items.count()
+        total_items = plan.plan_items.count()
         completed_progress = ExerciseProgress.objects.filter(
             exercise_plan_item__exercise_plan=plan,
             completion_status='completed'
@@ -169,7 +220,7 @@ class ExercisePlanViewSet(viewsets.ModelViewSet):
         # Get recent progress
         recent_progress = ExerciseProgress.objects.filter(
             exercise_plan_item__exercise_plan=plan
-        ).order_by('-date_completed')[:5]
+        ).select_related('exercise_plan_item__exercise').order_by('-date_completed')[:5]
         
         progress_data = ExerciseProgressSerializer(recent_progress, many=True).data
         
@@ -180,18 +231,17 @@ class ExercisePlanViewSet(viewsets.ModelViewSet):
             'recent_progress': progress_data
         })
 
-class ExercisePlanItemViewSet(viewsets.ModelViewSet):
+class ExercisePlanItemViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing exercise plan items
     """
     serializer_class = ExercisePlanItemSerializer
     permission_classes = [IsAuthenticated]
+    prefetch_plans = {'default': PLAN_ITEM_PLAN, 'destroy': NOTHING}
     
     def get_queryset(self):
         user = self.request.user
-        queryset = ExercisePlanItem.objects.select_related(
-            'exercise_plan__patient', 'exercise_plan__physiotherapist', 'exercise'
-        )
+        queryset = self.plan_queryset(ExercisePlanItem.objects.all())
         
         if user.user_type == 'patient':
             queryset = queryset.filter(exercise_plan__patient=user)
@@ -227,11 +277,21 @@ class ExercisePlanItemViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-class ExerciseProgressViewSet(viewsets.ModelViewSet):
+class ExerciseProgressViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing exercise progress
+
+    The list is keyset paginated by recording time (``created_at``), newest
+    first; see ``core.pagination.KeysetPagination``.
     """
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    prefetch_plans = {
+        # For exercise_name
+        'default': PrefetchPlan(select_related=['exercise_plan_item__exercise']),
+        'destroy': NOTHING,
+        'statistics': NOTHING,
+    }
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -240,9 +300,7 @@ class ExerciseProgressViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = ExerciseProgress.objects.select_related(
-            'patient', 'exercise_plan_item__exercise', 'exercise_plan_item__exercise_plan'
-        )
+        queryset = self.plan_queryset(ExerciseProgress.objects.all())
         
         if user.user_type == 'patient':
             queryset = queryset.filter(patient=user)
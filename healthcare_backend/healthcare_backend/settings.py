@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,9 +49,11 @@ INSTALLED_APPS = [
     'chat',
     'exercises',
     'notifications',
+    'core',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -104,10 +108,63 @@ if os.environ.get('USE_SQLITE', 'True').lower() == 'true':
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'TEST': {
+                # A file rather than shared-cache memory, whose table locks fail
+                # concurrent connections instead of waiting (see the booking tests)
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
 
+# Cache
+# Dashboard stats, unread notification counts and the exercise catalog version
+# are dropped from the cache on writes, so every worker process must share it:
+# set REDIS_URL outside DEBUG. Local memory is only per-process; a single-process
+# deployment may opt into it with ALLOW_LOCAL_CACHE=True.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'healthcare-backend',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+elif not DEBUG and os.environ.get('ALLOW_LOCAL_CACHE', 'False').lower() != 'true':
+    raise ImproperlyConfigured(
+        'REDIS_URL must be set when DEBUG is off: cache invalidation on writes only '
+        'reaches other workers through a shared cache (set ALLOW_LOCAL_CACHE=True '
+        'to run a single process on the local memory cache)'
+    )
+
+# Seconds a per-user dashboard_stats entry may live (entries are also invalidated on writes)
+DASHBOARD_STATS_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_STATS_CACHE_TIMEOUT', 300))
+
+# Seconds a cached unread notification count may live (entries are also dropped on writes)
+NOTIFICATION_COUNT_CACHE_TIMEOUT = int(os.environ.get('NOTIFICATION_COUNT_CACHE_TIMEOUT', 300))
+
+# Hours before an appointment that send_appointment_reminders notifies the patient
+APPOINTMENT_REMINDER_LEAD_HOURS = int(os.environ.get('APPOINTMENT_REMINDER_LEAD_HOURS', 24))
+
+# Seconds the exercise catalog version may be served from the cache (it is also dropped on writes)
+CATALOG_VERSION_CACHE_TIMEOUT = int(os.environ.get('CATALOG_VERSION_CACHE_TIMEOUT', 60))
+
+# Seconds the synced_at of an exercise delta is set back, so writes that commit
+# after the read are reported on the next sync (longer transactions can be missed)
+CATALOG_SYNC_MARGIN_SECONDS = int(os.environ.get('CATALOG_SYNC_MARGIN_SECONDS', 60))
+
+# Seconds /readyz reuses its last result, so probe bursts cost one real check
+HEALTH_CHECK_CACHE_SECONDS = int(os.environ.get('HEALTH_CHECK_CACHE_SECONDS', 5))
+
+# Per-route latency, SQL and serialization metrics served at /api/metrics/ (core.metrics)
+API_METRICS_ENABLED = os.environ.get('API_METRICS_ENABLED', 'True').lower() == 'true'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -184,6 +241,9 @@ CORS_ALLOW_CREDENTIALS = True
 
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
 
+# Pagination headers the frontend needs to read
+CORS_EXPOSE_HEADERS = ['Link', 'X-Next-Cursor']
+
 # X-Frame-Options
 X_FRAME_OPTIONS = 'ALLOWALL'
 
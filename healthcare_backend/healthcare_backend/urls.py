@@ -20,7 +20,13 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.authtoken.views import obtain_auth_token
 
+from api_views import liveness, readiness
+
 urlpatterns = [
+    # Load balancer probes (unauthenticated)
+    path('healthz', liveness, name='healthz'),
+    path('readyz', readiness, name='readyz'),
+
     # Admin interface
     path('admin/', admin.site.urls),
     
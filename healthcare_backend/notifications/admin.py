@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, NotificationPreference
+from .models import Notification, NotificationCounter, NotificationPreference
 
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('id', 'recipient', 'notification_type', 'title', 'is_read', 'created_at')
@@ -16,5 +16,11 @@ class NotificationPreferenceAdmin(admin.ModelAdmin):
                    'exercise_reminders', 'system_notifications')
     search_fields = ('user__username',)
 
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ('user', 'unread', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('unread', 'updated_at')
+
 admin.site.register(Notification, NotificationAdmin)
+admin.site.register(NotificationCounter, NotificationCounterAdmin)
 admin.site.register(NotificationPreference, NotificationPreferenceAdmin)
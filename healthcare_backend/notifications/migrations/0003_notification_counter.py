@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_counters(apps, schema_editor):
+    """One counter row per user with unread notifications; others are seeded on first read"""
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationCounter = apps.get_model('notifications', 'NotificationCounter')
+    unread = Notification.objects.filter(is_read=False).values('recipient_id').annotate(
+        total=Count('id')
+    ).order_by()
+    NotificationCounter.objects.bulk_create([
+        NotificationCounter(user_id=row['recipient_id'], unread=row['total']) for row in unread
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_physiotherapistprofile_certificate'),
+        ('notifications', '0002_notification_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient', 'created_at'], name='notification_unread_idx'),
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -23,6 +23,33 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a user's notifications
+            models.Index(fields=['recipient', 'created_at', 'id']),
+            # Only unread rows: the unread list and counter recounts
+            models.Index(
+                fields=['recipient', 'created_at'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx'
+            ),
+        ]
+
+class NotificationCounter(models.Model):
+    """
+    Number of unread notifications per user, maintained by
+    ``notifications.state`` so unread badges never count notification rows.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter'
+    )
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.unread} unread notifications for {self.user_id}"
 
 class NotificationPreference(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notification_preferences')
@@ -0,0 +1,113 @@
+"""
+Appointment reminders.
+
+``dispatch`` notifies patients of their appointments starting within the
+lead time (``APPOINTMENT_REMINDER_LEAD_HOURS``) and sets
+``Appointment.reminder_sent``. Due appointments are read in chunks, in start
+order, through the (reminder_sent, date, start_time) index, with the
+patient's ``appointment_reminders`` preference checked in the same query.
+Each chunk is one transaction: one UPDATE flags its appointments and one
+bulk insert writes its notifications.
+
+Several dispatchers can run at once. On PostgreSQL each claims its chunk
+with ``SELECT ... FOR UPDATE SKIP LOCKED`` and so works on different rows;
+the flagging UPDATE only touches still-unsent rows, and a chunk that lost
+any of them to another dispatcher is rolled back and read again.
+
+Appointments of patients who turned reminders off are flagged too, so every
+appointment is looked at once.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from appointments.models import Appointment
+
+from . import state
+from .models import Notification, NotificationPreference
+
+REMINDED_STATUSES = ('scheduled', 'confirmed')
+
+CHUNK_SIZE = 1000
+
+TITLE = 'Appointment reminder'
+
+
+def due(now=None, lead=None):
+    """Unsent reminders of active appointments starting between now and now + lead"""
+    now = timezone.localtime(now)
+    until = now + (lead if lead is not None else timedelta(hours=settings.APPOINTMENT_REMINDER_LEAD_HOURS))
+    return Appointment.objects.filter(
+        # reminder_sent=False compiles to NOT reminder_sent, which SQLite cannot
+        # match against the index; IN (false) is an equality it can
+        reminder_sent__in=[False],
+        date__range=(now.date(), until.date()),
+        status__in=REMINDED_STATUSES,
+    ).filter(
+        Q(date__gt=now.date()) | Q(start_time__gte=now.time()),
+        Q(date__lt=until.date()) | Q(start_time__lte=until.time()),
+    ).annotate(
+        wants_reminder=~Exists(NotificationPreference.objects.filter(
+            user_id=OuterRef('patient_id'), appointment_reminders=False
+        ))
+    )
+
+
+def _message(first_name, last_name, username, day, start_time):
+    name = f'{first_name} {last_name}'.strip() or username
+    return f'Your appointment with {name} is on {day:%A %d %B} at {start_time:%H:%M}.'
+
+
+def _dispatch_chunk(queryset, chunk_size):
+    """
+    Claim and notify up to ``chunk_size`` due appointments. Returns
+    (appointments, notifications), or None if another dispatcher took some
+    of the rows first.
+    """
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update(skip_locked=True, of=('self',)).order_by(
+                'date', 'start_time', 'id'
+            ).values_list(
+                'id', 'patient_id', 'date', 'start_time', 'physiotherapist__first_name',
+                'physiotherapist__last_name', 'physiotherapist__username', 'wants_reminder'
+            )[:chunk_size]
+        )
+        if not rows:
+            return 0, 0
+        ids = [row[0] for row in rows]
+        if Appointment.objects.filter(pk__in=ids, reminder_sent=False).update(reminder_sent=True) != len(ids):
+            transaction.set_rollback(True)
+            return None
+
+        notifications = [
+            Notification(
+                recipient_id=patient_id, notification_type='appointment', title=TITLE,
+                message=_message(first_name, last_name, username, day, start_time),
+                related_object_id=appointment_id, related_object_type='appointment',
+            )
+            for appointment_id, patient_id, day, start_time, first_name, last_name, username, wanted in rows
+            if wanted
+        ]
+        Notification.objects.bulk_create(notifications)
+        state.add_unread([notification.recipient_id for notification in notifications])
+    return len(rows), len(notifications)
+
+
+def dispatch(now=None, lead=None, chunk_size=CHUNK_SIZE):
+    """Send every due reminder; returns how many appointments were handled and notified"""
+    queryset = due(now, lead)
+    totals = {'appointments': 0, 'notifications': 0}
+    while True:
+        result = _dispatch_chunk(queryset, chunk_size)
+        if result is None:
+            continue
+        appointments, notifications = result
+        totals['appointments'] += appointments
+        totals['notifications'] += notifications
+        if appointments < chunk_size:
+            return totals
@@ -1,8 +1,10 @@
 from rest_framework import serializers
+from core.fastpath import DateTime, Nested, Shape
+from core.fieldsets import DynamicFieldsMixin
 from .models import Notification, NotificationPreference
-from authentication.serializers import UserSerializer
+from authentication.serializers import UserSerializer, USER_SHAPE
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     recipient = UserSerializer(read_only=True)
     
     class Meta:
@@ -11,7 +13,20 @@ class NotificationSerializer(serializers.ModelSerializer):
                   'related_object_id', 'related_object_type', 'is_read', 'created_at']
         read_only_fields = ['created_at']
 
-class NotificationPreferenceSerializer(serializers.ModelSerializer):
+# NotificationSerializer output for core.fastpath list endpoints; keep the two in step
+NOTIFICATION_SHAPE = Shape([
+    ('id', 'id'),
+    ('recipient', Nested(USER_SHAPE, 'recipient')),
+    ('notification_type', 'notification_type'),
+    ('title', 'title'),
+    ('message', 'message'),
+    ('related_object_id', 'related_object_id'),
+    ('related_object_type', 'related_object_type'),
+    ('is_read', 'is_read'),
+    ('created_at', DateTime('created_at')),
+])
+
+class NotificationPreferenceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
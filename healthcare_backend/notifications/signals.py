@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import state
+from .models import Notification
+
+
+@receiver(pre_save, sender=Notification)
+def remember_read_flag(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the stored read flag of an edited notification so the counter can be moved"""
+    instance._was_read = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'is_read' not in update_fields:
+        return
+    instance._was_read = sender.objects.filter(pk=instance.pk).values_list('is_read', flat=True).first()
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        if not instance.is_read:
+            state.adjust(instance.recipient_id, 1)
+        return
+    was_read = getattr(instance, '_was_read', None)
+    if was_read is not None and was_read != instance.is_read:
+        state.adjust(instance.recipient_id, -1 if instance.is_read else 1)
+
+
+@receiver(pre_delete, sender=Notification)
+def remember_read_flag_on_delete(sender, instance, **kwargs):
+    # The instance being deleted may be stale; the stored flag decides
+    instance._was_read = sender.objects.filter(pk=instance.pk).values_list('is_read', flat=True).first()
+
+
+@receiver(post_delete, sender=Notification)
+def count_unread_on_delete(sender, instance, **kwargs):
+    if getattr(instance, '_was_read', None) is False:
+        # The user may be going away in the same cascade; never recreate their counter
+        state.adjust(instance.recipient_id, -1, seed=False)
@@ -0,0 +1,93 @@
+"""
+Unread notification counts.
+
+``NotificationCounter.unread`` is moved with single UPDATE statements when
+notifications are created, read, marked unread or deleted. Saves are picked
+up by the handlers in ``notifications.signals``; bulk ``update()`` calls must
+go through ``mark_read`` / ``mark_all_read`` here. ``unread_count`` serves
+the value from the cache, falling back to the counter row, so polling for
+the unread badge never reads the notifications table.
+"""
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Notification, NotificationCounter
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def invalidate(user_id):
+    """Drop the cached count once the surrounding transaction commits"""
+    transaction.on_commit(lambda: cache.delete(cache_key(user_id)))
+
+
+def recount(user_id):
+    """Store and return the true unread count of a user"""
+    unread = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    NotificationCounter.objects.update_or_create(user_id=user_id, defaults={'unread': unread})
+    invalidate(user_id)
+    return unread
+
+
+def adjust(user_id, delta, seed=True):
+    """
+    Move a user's counter by ``delta``. A missing counter row is seeded
+    from a recount unless ``seed`` is false (cascade deletes of the user).
+    """
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta)
+    if updated:
+        invalidate(user_id)
+    elif seed:
+        recount(user_id)
+
+
+def add_unread(recipient_ids):
+    """
+    Count notifications created with ``bulk_create`` (one per entry, so
+    repeated ids count again) with one UPDATE per distinct amount. Missing
+    counter rows are left to ``unread_count`` to seed.
+    """
+    amounts = defaultdict(list)
+    per_user = Counter(recipient_ids)
+    for user_id, amount in per_user.items():
+        amounts[amount].append(user_id)
+    for amount, user_ids in amounts.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(unread=F('unread') + amount)
+    if per_user:
+        keys = [cache_key(user_id) for user_id in per_user]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def unread_count(user):
+    """Return the user's unread notification count, from the cache when possible"""
+    key = cache_key(user.pk)
+    unread = cache.get(key)
+    if unread is None:
+        unread = NotificationCounter.objects.filter(user=user).values_list('unread', flat=True).first()
+        if unread is None:
+            unread = recount(user.pk)
+        cache.set(key, unread, settings.NOTIFICATION_COUNT_CACHE_TIMEOUT)
+    return unread
+
+
+def mark_read(notification):
+    """Mark one notification read without a read-modify-write of the row"""
+    with transaction.atomic():
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            adjust(notification.recipient_id, -1)
+    notification.is_read = True
+
+
+def mark_all_read(user):
+    """Mark every notification of the user read and zero the counter"""
+    with transaction.atomic():
+        Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        NotificationCounter.objects.update_or_create(user=user, defaults={'unread': 0})
+        invalidate(user.pk)
@@ -1,3 +1,197 @@
+from datetime import date, datetime, time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from appointments.models import Appointment
+from core.testing import QueryBudgetTestCase, create_user
+
+from . import reminders, state
+from .models import Notification, NotificationCounter, NotificationPreference
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.user = create_user('budget_patient')
+        NotificationPreference.objects.create(user=self.user)
+
+    def add_notifications(self, number):
+        for _ in range(number):
+            Notification.objects.create(
+                recipient=self.user, notification_type='system', title='Budget', message='Budget'
+            )
+
+    def add_preferences(self, number):
+        """Preferences of other users; a user only ever sees their own row"""
+        for _ in range(number):
+            NotificationPreference.objects.create(
+                user=create_user(f'budget_other_{NotificationPreference.objects.count()}')
+            )
+
+    def test_notification_list(self):
+        self.assertQueryBudget(1, '/api/notifications/', self.add_notifications)
+
+    def test_notification_detail(self):
+        self.assertQueryBudget(1, self.detail_url('/api/notifications/', Notification), self.add_notifications)
+
+    def test_unread_notifications(self):
+        self.assertQueryBudget(1, '/api/notifications/unread/', self.add_notifications)
+
+    def test_preference_list(self):
+        self.assertQueryBudget(2, '/api/notification-preferences/', self.add_preferences)
+
+    def test_preference_detail(self):
+        self.assertQueryBudget(
+            1, self.detail_url('/api/notification-preferences/', NotificationPreference), self.add_preferences
+        )
+
+
+class UnreadCounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('counter_patient')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def notify(self, number=1, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notification.objects.create(
+                    recipient=self.user, notification_type='system', title='Counter', message='', **fields
+                )
+                for _ in range(number)
+            ]
+
+    def assertUnread(self, expected):
+        """The endpoint (cached), the counter row and the notifications table agree"""
+        self.assertEqual(self.client.get('/api/notification-count/unread/').data['unread_count'], expected)
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, expected)
+        self.assertEqual(Notification.objects.filter(recipient=self.user, is_read=False).count(), expected)
+
+    def test_create_read_unread_and_delete(self):
+        self.assertUnread(0)  # seeds the counter and caches it
+        first, second, third, fourth = self.notify(4)
+        self.notify(is_read=True)
+        self.assertUnread(4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/notifications/{first.pk}/', {'is_read': True}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertUnread(3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{second.pk}/mark_read/')
+            # Reading it again changes nothing
+            self.client.post(f'/api/notifications/{second.pk}/mark_read/')
+        self.assertUnread(2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/notifications/{first.pk}/', {'is_read': False}, format='json')
+        self.assertUnread(3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/notifications/{third.pk}/').status_code, 204)
+            self.client.delete(f'/api/notifications/{second.pk}/')  # already read
+        self.assertUnread(2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_all_read/')
+        self.assertUnread(0)
+
+    def test_queryset_delete_then_recount(self):
+        notifications = self.notify(5)
+        self.assertUnread(5)
+        state.mark_read(notifications[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(pk__in=[row.pk for row in notifications[:3]]).delete()
+        self.assertUnread(2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(state.recount(self.user.pk), 2)
+        self.assertUnread(2)
+
+    def test_missing_counter_is_seeded(self):
+        self.notify(3)
+        NotificationCounter.objects.all().delete()
+        cache.clear()
+        self.assertUnread(3)
+
+        # Without a counter row, a new notification seeds it from a recount
+        NotificationCounter.objects.all().delete()
+        self.notify()
+        self.assertUnread(4)
+
+
+class ReminderTests(TestCase):
+    now = timezone.make_aware(datetime(2030, 1, 7, 9, 0))
+
+    def setUp(self):
+        cache.clear()
+        self.physiotherapist = create_user('reminder_physio', 'physiotherapist', first_name='Ada', last_name='Lee')
+        self.patient = create_user('reminder_patient')
+        self.opted_out = create_user('reminder_opted_out')
+        NotificationPreference.objects.create(user=self.opted_out, appointment_reminders=False)
+
+    def appointment(self, day, hour, patient=None, **fields):
+        return Appointment.objects.create(
+            patient=patient or self.patient, physiotherapist=self.physiotherapist, date=day,
+            start_time=time(hour), end_time=time(hour, 30), reason='Reminder', **fields
+        )
+
+    def test_notifies_due_appointments_once(self):
+        state.unread_count(self.patient)  # seeds the counter row
+        due = self.appointment(date(2030, 1, 7), 12)
+        opted_out = self.appointment(date(2030, 1, 8), 8, patient=self.opted_out)
+        skipped = [
+            self.appointment(date(2030, 1, 7), 8),  # already started
+            self.appointment(date(2030, 1, 8), 10),  # beyond the lead time
+            self.appointment(date(2030, 1, 7), 13, status='cancelled'),
+            self.appointment(date(2030, 1, 7), 14, reminder_sent=True),
+        ]
+
+        totals = reminders.dispatch(now=self.now, chunk_size=1)
+
+        self.assertEqual(totals, {'appointments': 2, 'notifications': 1})
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.patient)
+        self.assertEqual(notification.related_object_id, due.pk)
+        self.assertEqual(notification.message, 'Your appointment with Ada Lee is on Monday 07 January at 12:00.')
+        self.assertEqual(NotificationCounter.objects.get(user=self.patient).unread, 1)
+        sent = set(Appointment.objects.filter(reminder_sent=True).values_list('pk', flat=True))
+        self.assertEqual(sent, {due.pk, opted_out.pk, skipped[-1].pk})
+
+        self.assertEqual(reminders.dispatch(now=self.now), {'appointments': 0, 'notifications': 0})
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_chunk_losing_rows_is_rolled_back_and_retried(self):
+        state.unread_count(self.patient)
+        appointments = [self.appointment(date(2030, 1, 7), hour) for hour in (10, 11, 12)]
+        update = QuerySet.update
+        flags = []
+
+        def flag_fewer(queryset, **fields):
+            # Another dispatcher flags one of the first chunk's rows between its read and its UPDATE
+            if queryset.model is Appointment and 'reminder_sent' in fields:
+                flags.append(fields)
+                if len(flags) == 1:
+                    queryset = queryset.exclude(pk=queryset.order_by('pk').values_list('pk', flat=True)[0])
+            return update(queryset, **fields)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=flag_fewer):
+            totals = reminders.dispatch(now=self.now, chunk_size=2)
 
-# Create your tests here.
+        self.assertEqual(totals, {'appointments': 3, 'notifications': 3})
+        # The lost chunk, its retry and the last chunk
+        self.assertEqual(len(flags), 3)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('related_object_id', flat=True)),
+            [appointment.pk for appointment in appointments]
+        )
+        self.assertEqual(NotificationCounter.objects.get(user=self.patient).unread, 3)
+        self.assertEqual(Appointment.objects.filter(reminder_sent=False).count(), 0)
@@ -5,11 +5,17 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
+from django.db.models import Count, Q
 from datetime import timedelta
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetsMixin
+from core.pagination import KeysetPagination
+from core.prefetch import NOTHING, PrefetchPlan, PrefetchPlanMixin
+from . import state
 from .models import Notification, NotificationPreference
 from .serializers import (
     NotificationSerializer, NotificationPreferenceSerializer,
-    NotificationPreferenceUpdateSerializer
+    NotificationPreferenceUpdateSerializer, NOTIFICATION_SHAPE
 )
 
 class NotificationListView(APIView):
@@ -63,7 +69,7 @@ class MarkAllNotificationsReadView(APIView):
     
     def post(self, request):
         # Mark all notifications for the current user as read
-        Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        state.mark_all_read(request.user)
         return Response({'message': 'All notifications marked as read'})
 
 class NotificationPreferenceView(APIView):
@@ -87,15 +93,24 @@ class NotificationPreferenceView(APIView):
 
 # ViewSets for comprehensive API management
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(PrefetchPlanMixin, FastListMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing notifications
     """
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    fast_shape = NOTIFICATION_SHAPE
+    prefetch_plans = {
+        'default': PrefetchPlan(select_related=['recipient']),
+        'destroy': NOTHING,
+        'statistics': NOTHING,
+    }
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        return self.plan_queryset(
+            Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        )
     
     @action(detail=False, methods=['get'])
     def unread(self, request):
@@ -107,53 +122,54 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read"""
-        self.get_queryset().filter(is_read=False).update(is_read=True)
+        state.mark_all_read(request.user)
         return Response({'message': 'All notifications marked as read'})
     
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark specific notification as read"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        state.mark_read(notification)
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get notification statistics"""
-        queryset = self.get_queryset()
-        
-        total = queryset.count()
-        unread = queryset.filter(is_read=False).count()
-        
-        # Recent notifications (last 7 days)
         week_ago = timezone.now() - timedelta(days=7)
-        recent = queryset.filter(created_at__gte=week_ago).count()
+        types = [notification_type for notification_type, _ in Notification.NOTIFICATION_TYPES]
         
-        # By type
-        by_type = {}
-        for notification_type, _ in Notification.NOTIFICATION_TYPES:
-            count = queryset.filter(notification_type=notification_type).count()
-            by_type[notification_type] = count
+        # One pass over the user's notifications with conditional counts
+        stats = self.get_queryset().order_by().aggregate(
+            total=Count('id'),
+            unread=Count('id', filter=Q(is_read=False)),
+            recent_week=Count('id', filter=Q(created_at__gte=week_ago)),
+            **{
+                f'type_{notification_type}': Count('id', filter=Q(notification_type=notification_type))
+                for notification_type in types
+            }
+        )
         
         return Response({
-            'total': total,
-            'unread': unread,
-            'read': total - unread,
-            'recent_week': recent,
-            'by_type': by_type
+            'total': stats['total'],
+            'unread': stats['unread'],
+            'read': stats['total'] - stats['unread'],
+            'recent_week': stats['recent_week'],
+            'by_type': {
+                notification_type: stats[f'type_{notification_type}'] for notification_type in types
+            }
         })
 
-class NotificationPreferenceViewSet(viewsets.ModelViewSet):
+class NotificationPreferenceViewSet(PrefetchPlanMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing notification preferences
     """
     serializer_class = NotificationPreferenceSerializer
     permission_classes = [IsAuthenticated]
+    prefetch_plans = {'default': PrefetchPlan(select_related=['user']), 'destroy': NOTHING}
     
     def get_queryset(self):
-        return NotificationPreference.objects.filter(user=self.request.user)
+        return self.plan_queryset(NotificationPreference.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)